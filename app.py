@@ -10,26 +10,75 @@ from config.settings import (
     PROMPT_TYPES,
     DEFAULT_PROMPT_TYPE,
     get_prompts,
-    CLAUDE_37_SONNET_CONFIG
+    CLAUDE_37_SONNET_CONFIG,
+    JOB_CONFIG,
+    MULTI_DOCUMENT_CONFIG
 )
-from utils.api_handler import process_in_chunks, process_images
 from utils.pdf_processor import extract_from_pdf, extract_text_input
+from utils.document_pipeline import process_document, process_documents
+from utils.job_queue import submit_job, get_job, list_jobs, cancel_job, ensure_workers, is_active, STATUS_LABELS
+from utils.ocr_router import ocr_available
 from utils.file_manager import save_processed_text
-from utils.tts_handler import generate_tts
-from utils.elevenlabs_handler import generate_elevenlabs_tts, list_elevenlabs_voices, ELEVENLABS_MODELS, ELEVENLABS_API_KEY, POPULAR_VOICES, RECOMMENDED_SETTINGS_PT
+from utils.tts_handler import generate_tts, generate_tts_stream
+from utils.audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from utils.local_tts_handler import generate_local_tts, generate_with_fallback, local_tts_available
+from utils.artifact_store import new_artifact, save_artifact, writing_artifact, artifact_url, artifact_exists
+from utils.elevenlabs_handler import generate_elevenlabs_tts, plan_elevenlabs_tts, list_elevenlabs_voices, invalidate_voices_cache, ELEVENLABS_MODELS, ELEVENLABS_API_KEY, POPULAR_VOICES, RECOMMENDED_SETTINGS_PT
 import os
+import time
+import hashlib
 import logging
+import tempfile
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# O Streamlit executa o script inteiro a cada interação; estes caches evitam refazer
+# a extração dos PDFs e a listagem de vozes quando apenas um controle muda
+@st.cache_resource(max_entries=16, show_spinner="Extraindo texto e imagens do PDF...")
+def extract_pdf_cached(content_hash, ocr, _data):
+    """
+    Extrai um PDF enviado; a chave do cache é o hash do conteúdo (_data não é usado na chave).
+
+    cache_resource devolve o mesmo objeto a cada execução, sem serializar as imagens das
+    páginas; o resultado é compartilhado entre sessões e não deve ser modificado.
+    """
+    # Arquivo temporário exclusivo: sessões diferentes podem extrair o mesmo PDF ao mesmo tempo
+    fd, file_path = tempfile.mkstemp(suffix=".pdf", prefix="upload_")
+    with os.fdopen(fd, "wb") as f:
+        f.write(_data)
+    try:
+        return extract_from_pdf(file_path, ocr=ocr)
+    finally:
+        # Limpar o arquivo temporário após o processamento
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+@st.cache_data(ttl=60, max_entries=1, show_spinner=False)
+def list_voices_cached():
+    # TTL curto: a lista em si já tem cache próprio, atualizado em segundo plano
+    return list_elevenlabs_voices()
+
+def refresh_voices():
+    invalidate_voices_cache()
+    list_voices_cached.clear()
+
+def separate_output_names(uploaded_files):
+    """Arquivo de saída de cada PDF processado separadamente; nomes repetidos recebem sufixo."""
+    names, seen = [], {}
+    for uploaded_file in uploaded_files:
+        stem = os.path.splitext(uploaded_file.name)[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(f"{stem}_processado.txt" if seen[stem] == 1 else f"{stem}_{seen[stem]}_processado.txt")
+    return names
+
 st.title("Processador de Documentos com Visão")
 
 # Opção para usar apenas o TTS
 app_mode = st.radio(
     "Escolha o modo do aplicativo",
-    ["Processador de Documentos", "Apenas TTS (Text-to-Speech)", "Apenas TTS (ElevenLabs)"]
+    ["Processador de Documentos", "Apenas TTS (Text-to-Speech)", "Apenas TTS (ElevenLabs)", "Apenas TTS (Local)"]
 )
 
 if app_mode == "Apenas TTS (Text-to-Speech)":
@@ -64,6 +113,21 @@ if app_mode == "Apenas TTS (Text-to-Speech)":
         - **tts-1-hd**: Modelo de alta definição, melhor qualidade de áudio
         """)
     
+    audio_format = st.selectbox(
+        "Formato de saída",
+        list(AUDIO_FORMATS.keys()),
+        index=list(AUDIO_FORMATS.keys()).index(DEFAULT_AUDIO_FORMAT),
+        format_func=lambda key: AUDIO_FORMATS[key]["name"],
+        help="Opus e AAC são convertidos localmente com o ffmpeg e ocupam bem menos espaço que o MP3 padrão."
+    )
+    audio_info = AUDIO_FORMATS[audio_format]
+    
+    stream_mode = st.checkbox(
+        "Ouvir enquanto gera (streaming)",
+        value=False,
+        help="O áudio é gravado em disco à medida que chega e pode ser ouvido assim que o primeiro trecho fica pronto."
+    )
+    
     # Verificar se a chave da API está configurada
     if not OPENAI_API_KEY:
         st.warning("Configure a chave OPENAI_API_KEY em .env para usar o TTS.")
@@ -95,16 +159,40 @@ if app_mode == "Apenas TTS (Text-to-Speech)":
                     
                     # Função de callback para atualizar o progresso da geração de áudio
                     def audio_progress_callback(current_chunk, total_chunks, message):
-                        progress = current_chunk / total_chunks
+                        progress = current_chunk / total_chunks if total_chunks else 0
                         audio_progress.progress(progress)
                         audio_status.write(message)
                     
-                    # Gerar o áudio
-                    audio_bytes = generate_tts(texto, voice, model_tts, callback=audio_progress_callback)
-                    
-                    st.success("Áudio gerado com sucesso!")
-                    st.audio(audio_bytes, format="audio/mp3")
-                    st.download_button("Baixar Áudio", audio_bytes, file_name="audiobook.mp3")
+                    if stream_mode:
+                        # O áudio é gravado direto em disco e tocado pelo servidor local, sem passar pela sessão
+                        artifact = new_artifact(audio_info["extension"], f"audiobook.{audio_info['extension']}")
+                        audio_player = st.empty()
+                        
+                        # O player é criado uma única vez, quando o primeiro trecho fica pronto; a resposta do
+                        # servidor acompanha o arquivo enquanto ele cresce, então o áudio toca até o fim
+                        def on_audio(path, ready_chunks, total_chunks):
+                            if audio_format != "pcm" and ready_chunks == 1:
+                                audio_player.audio(artifact_url(artifact), format=audio_info["mime"])
+                        
+                        with writing_artifact(artifact):
+                            generate_tts_stream(texto, artifact["path"], voice, model_tts, callback=audio_progress_callback, on_audio=on_audio, output_format=audio_format)
+                        
+                        st.success("Áudio gerado com sucesso!")
+                        st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
+                    else:
+                        # Gerar o áudio
+                        # Se a API falhar, o áudio é gerado com o TTS local (quando instalado)
+                        audio_bytes, audio_format = generate_with_fallback(
+                            lambda: generate_tts(texto, voice, model_tts, callback=audio_progress_callback, output_format=audio_format),
+                            texto, callback=audio_progress_callback, output_format=audio_format
+                        )
+                        audio_info = AUDIO_FORMATS[audio_format]
+                        
+                        st.success("Áudio gerado com sucesso!")
+                        artifact = save_artifact(audio_bytes, audio_info["extension"], f"audiobook.{audio_info['extension']}")
+                        if audio_format != "pcm":
+                            st.audio(artifact_url(artifact), format=audio_info["mime"])
+                        st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
                 except Exception as e:
                     st.error(f"Erro ao gerar áudio: {str(e)}")
 
@@ -134,8 +222,12 @@ elif app_mode == "Apenas TTS (ElevenLabs)":
     # Carregar vozes disponíveis
     if ELEVENLABS_API_KEY:
         try:
+            # A lista de vozes vem do cache; o botão força uma nova consulta à API
+            if st.button("Atualizar lista de vozes"):
+                refresh_voices()
+            
             with st.spinner("Carregando vozes disponíveis..."):
-                voices = list_elevenlabs_voices()
+                voices = list_voices_cached()
                 
             if voices:
                 # Criar um dicionário de vozes para seleção
@@ -248,6 +340,31 @@ elif app_mode == "Apenas TTS (ElevenLabs)":
                     Para textos em português, recomendamos o modelo **eleven_flash_v2_5** que oferece bom equilíbrio entre qualidade e velocidade.
                     """)
                 
+                audio_format = st.selectbox(
+                    "Formato de saída",
+                    list(AUDIO_FORMATS.keys()),
+                    index=list(AUDIO_FORMATS.keys()).index(DEFAULT_AUDIO_FORMAT),
+                    format_func=lambda key: AUDIO_FORMATS[key]["name"],
+                    key="audio_format_elevenlabs",
+                    help="Opus e AAC são convertidos localmente com o ffmpeg e ocupam bem menos espaço que o MP3 padrão."
+                )
+                audio_info = AUDIO_FORMATS[audio_format]
+                
+                # Estimativa de caracteres cobrados antes de gerar o áudio
+                fit_to_quota = st.checkbox(
+                    "Gerar apenas a parte que cabe na cota atual",
+                    value=False,
+                    key="fit_to_quota_elevenlabs",
+                    help="O restante pode ser gerado depois da renovação da cota, reaproveitando o áudio já gerado."
+                )
+                if st.button("Estimar caracteres cobrados") and elevenlabs_text.strip():
+                    with st.spinner("Consultando a cota da ElevenLabs..."):
+                        plan = plan_elevenlabs_tts(elevenlabs_text.strip(), selected_voice_id, selected_model, custom_settings=custom_settings, output_format=audio_format)
+                    if plan["fits"]:
+                        st.info(plan["description"])
+                    else:
+                        st.warning(plan["description"])
+                
                 # Botão para gerar áudio
                 if st.button("Gerar Áudio com ElevenLabs"):
                     if not elevenlabs_text.strip():
@@ -273,23 +390,32 @@ elif app_mode == "Apenas TTS (ElevenLabs)":
                                 
                                 # Função de callback para atualizar o progresso da geração de áudio
                                 def audio_progress_callback(current, total, message):
-                                    progress = current / total
+                                    progress = current / total if total else 0
                                     audio_progress.progress(progress)
                                     audio_status.write(message)
                                 
                                 # Gerar o áudio com configurações personalizadas
-                                audio_bytes = generate_elevenlabs_tts(
-                                    texto, 
-                                    selected_voice_id, 
-                                    selected_model, 
-                                    callback=audio_progress_callback,
-                                    language="pt",  # Definir idioma como português
-                                    custom_settings=custom_settings  # Passar configurações personalizadas
+                                # Se a API falhar, o áudio é gerado com o TTS local (quando instalado)
+                                audio_bytes, audio_format = generate_with_fallback(
+                                    lambda: generate_elevenlabs_tts(
+                                        texto, 
+                                        selected_voice_id, 
+                                        selected_model, 
+                                        callback=audio_progress_callback,
+                                        language="pt",  # Definir idioma como português
+                                        custom_settings=custom_settings,  # Passar configurações personalizadas
+                                        output_format=audio_format,
+                                        fit_to_quota=fit_to_quota
+                                    ),
+                                    texto, callback=audio_progress_callback, output_format=audio_format
                                 )
+                                audio_info = AUDIO_FORMATS[audio_format]
                                 
                                 st.success("Áudio gerado com sucesso!")
-                                st.audio(audio_bytes, format="audio/mp3")
-                                st.download_button("Baixar Áudio", audio_bytes, file_name="elevenlabs_audio.mp3")
+                                artifact = save_artifact(audio_bytes, audio_info["extension"], f"elevenlabs_audio.{audio_info['extension']}")
+                                if audio_format != "pcm":
+                                    st.audio(artifact_url(artifact), format=audio_info["mime"])
+                                st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
                             except Exception as e:
                                 st.error(f"Erro ao gerar áudio com ElevenLabs: {str(e)}")
             else:
@@ -297,6 +423,62 @@ elif app_mode == "Apenas TTS (ElevenLabs)":
         except Exception as e:
             st.error(f"Erro ao carregar vozes da ElevenLabs: {str(e)}")
 
+elif app_mode == "Apenas TTS (Local)":
+    st.subheader("Conversor de Texto para Áudio (Local)")
+    
+    # Área de texto para entrada direta
+    local_text = st.text_area("Digite ou cole o texto para converter em áudio", height=300, key="local_tts_text")
+    
+    with st.expander("Sobre o TTS local"):
+        st.markdown("""
+        O áudio é sintetizado no próprio computador com o **Piper**, sem chamadas a APIs.
+        A qualidade é inferior à da OpenAI e da ElevenLabs, mas não há custo nem limite de taxa,
+        o que o torna útil para prévias, rascunhos de audiobooks e como alternativa quando as APIs falham.
+        O texto é dividido em frases e sintetizado em paralelo em todos os núcleos disponíveis.
+        """)
+    
+    if not local_tts_available():
+        st.warning("Instale o pacote piper-tts e baixe um modelo de voz em português (veja o README) para usar o TTS local.")
+    else:
+        audio_format = st.selectbox(
+            "Formato de saída",
+            list(AUDIO_FORMATS.keys()),
+            index=list(AUDIO_FORMATS.keys()).index("wav"),
+            format_func=lambda key: AUDIO_FORMATS[key]["name"],
+            key="audio_format_local",
+            help="WAV não exige o ffmpeg; os demais formatos são convertidos com ele."
+        )
+        audio_info = AUDIO_FORMATS[audio_format]
+        
+        if st.button("Gerar Áudio Localmente"):
+            if not local_text.strip():
+                st.error("Por favor, digite ou cole algum texto para converter em áudio.")
+            else:
+                texto = local_text.strip()
+                st.write(f"Tamanho do texto: {len(texto)} caracteres")
+                
+                with st.spinner("Gerando áudio localmente..."):
+                    try:
+                        # Criar barra de progresso para geração de áudio
+                        audio_progress = st.progress(0)
+                        audio_status = st.empty()
+                        
+                        # Função de callback para atualizar o progresso da geração de áudio
+                        def audio_progress_callback(current, total, message):
+                            progress = current / total if total else 0
+                            audio_progress.progress(progress)
+                            audio_status.write(message)
+                        
+                        audio_bytes = generate_local_tts(texto, callback=audio_progress_callback, output_format=audio_format)
+                        
+                        st.success("Áudio gerado com sucesso!")
+                        artifact = save_artifact(audio_bytes, audio_info["extension"], f"audiobook_local.{audio_info['extension']}")
+                        if audio_format != "pcm":
+                            st.audio(artifact_url(artifact), format=audio_info["mime"])
+                        st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
+                    except Exception as e:
+                        st.error(f"Erro ao gerar áudio localmente: {str(e)}")
+
 else:
     # Seleção do tipo de prompt (neurologia ou religioso)
     prompt_type = st.radio(
@@ -314,20 +496,40 @@ else:
 
     if option == "Upload de PDF":
         uploaded_files = st.file_uploader("Escolha um ou mais PDFs", type="pdf", accept_multiple_files=True)
-        if uploaded_files:
+        pipeline_mode = st.checkbox(
+            "Modo pipeline (extrair e processar ao mesmo tempo)",
+            value=False,
+            help="Os pedaços já extraídos são enviados ao modelo enquanto as páginas seguintes ainda estão sendo lidas. Recomendado para PDFs grandes."
+        )
+        separate_files = False
+        if uploaded_files and len(uploaded_files) > 1:
+            separate_files = st.checkbox(
+                "Processar cada PDF separadamente (em paralelo)",
+                value=False,
+                help=f"Cada PDF gera o próprio texto processado (e a própria narração), com até {MULTI_DOCUMENT_CONFIG['max_files']} arquivos ao mesmo tempo. As requisições aos modelos são divididas entre todos os arquivos."
+            )
+        use_ocr = False
+        if ocr_available():
+            use_ocr = st.checkbox(
+                "OCR local para páginas digitalizadas",
+                value=False,
+                help="Páginas sem camada de texto que sejam predominantemente texto são lidas com o Tesseract local; apenas figuras seguem para o modelo de visão."
+            )
+        if uploaded_files and separate_files:
+            # Cada PDF é extraído e processado por conta própria no momento do processamento
+            input_data = {"text": "", "images": [], "files": uploaded_files, "separate": True}
+        elif uploaded_files and pipeline_mode:
+            # A extração fica para o momento do processamento
+            input_data = {"text": "", "images": [], "files": uploaded_files}
+        elif uploaded_files:
             all_text = ""
             all_images = []
             for uploaded_file in uploaded_files:
-                file_path = f"temp_{uploaded_file.name}"
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                result = extract_from_pdf(file_path)
+                data = uploaded_file.getvalue()
+                result = extract_pdf_cached(hashlib.sha256(data).hexdigest(), use_ocr, data)
                 # Ensure the correct variable (all_text) is used here
                 all_text += result["text"] + "\n\n"
                 all_images.extend(result["images"])
-                # Limpar o arquivo temporário após o processamento
-                if os.path.exists(file_path):
-                    os.remove(file_path)
             # Assign the accumulated text and images to input_data
             input_data = {"text": all_text.strip(), "images": all_images}
     else:
@@ -368,6 +570,10 @@ else:
         - Recomendado para análises que exigem maior precisão
         """)
 
+    # Opções de pensamento estendido desta sessão; a configuração global fica intacta, pois é
+    # compartilhada por todas as sessões do Streamlit
+    thinking = {key: CLAUDE_37_SONNET_CONFIG[key] for key in ("extended_thinking", "thinking_tokens_limit")}
+
     # Mostrar informações sobre pensamento estendido se Claude 3.7 Sonnet for selecionado
     if vision_model_name == "Claude 3.7 Sonnet" or text_model_name == "Claude 3.7 Sonnet":
         with st.expander("Informações sobre pensamento estendido"):
@@ -386,8 +592,7 @@ else:
             help="Quando ativado, o Claude 3.7 Sonnet utilizará seu modo de pensamento estendido para análises mais profundas."
         )
         
-        # Atualizar a configuração com o valor escolhido pelo usuário
-        CLAUDE_37_SONNET_CONFIG['extended_thinking'] = enable_thinking
+        thinking["extended_thinking"] = enable_thinking
         
         # Mostrar o controle deslizante para o limite de tokens apenas se o pensamento estendido estiver ativado
         if enable_thinking:
@@ -399,72 +604,309 @@ else:
                 step=1000,
                 help="Defina o limite de tokens para o pensamento estendido do Claude 3.7 Sonnet. Valores maiores permitem análises mais profundas, mas podem aumentar o tempo de processamento e o custo."
             )
-            
-            # Atualizar a configuração com o valor escolhido pelo usuário
-            CLAUDE_37_SONNET_CONFIG['thinking_tokens_limit'] = thinking_tokens_limit
+            thinking["thinking_tokens_limit"] = thinking_tokens_limit
 
     prompt = st.text_area("Digite o prompt para texto", text_prompt, height=200)
     vision_prompt = st.text_area("Digite o prompt para visão", vision_prompt_value, height=100)
 
+    # Narração simultânea: o áudio é gerado enquanto o texto ainda está sendo processado
+    narrate = st.checkbox(
+        "Processar e narrar",
+        value=False,
+        help="Cada pedaço processado é enviado imediatamente para o TTS, sobrepondo a geração de áudio ao processamento do texto."
+    )
+    if narrate:
+        narrate_service = st.radio("Serviço de TTS para a narração", ["OpenAI", "ElevenLabs"], key="narrate_service")
+        col1, col2 = st.columns(2)
+        if narrate_service == "OpenAI":
+            with col1:
+                narrate_voice = st.selectbox("Voz da narração", ["alloy", "ash", "coral", "echo", "fable", "onyx", "nova", "sage", "shimmer"], key="narrate_voice")
+            with col2:
+                narrate_model = st.selectbox("Modelo TTS da narração", ["tts-1", "tts-1-hd"], key="narrate_model")
+        else:
+            with col1:
+                narrate_voice_name = st.selectbox("Voz da narração", list(POPULAR_VOICES.keys()), key="narrate_voice_elevenlabs")
+                narrate_voice = POPULAR_VOICES[narrate_voice_name]
+            with col2:
+                narrate_model = st.selectbox(
+                    "Modelo da narração",
+                    list(ELEVENLABS_MODELS.keys()),
+                    index=list(ELEVENLABS_MODELS.keys()).index("eleven_flash_v2_5"),
+                    format_func=lambda x: ELEVENLABS_MODELS[x],
+                    key="narrate_model_elevenlabs"
+                )
+
+    # Trabalhos em segundo plano continuam mesmo que a página seja recarregada ou fechada
+    run_in_background = st.checkbox(
+        "Executar em segundo plano",
+        value=False,
+        help="O processamento roda em um processo separado. É possível fechar a página e acompanhar o trabalho depois em \"Trabalhos recentes\"."
+    )
+
     def update_progress(current, total, message):
-        progress = current / total
+        progress = current / total if total else 0
         progress_bar.progress(progress)
         status_container.write(message)
 
+    def follow_job(job_id):
+        # O ID também vai para a URL, para reabrir o acompanhamento após recarregar a página
+        st.session_state["job_id"] = job_id
+        st.query_params["job"] = job_id
+        st.rerun()
+
     if st.button("Processar"):
         if not input_data:
             st.error("Por favor, forneça um PDF ou texto.")
         elif not OPENROUTER_API_KEY:
             st.error("Configure a chave OPENROUTER_API_KEY em .env.")
+        elif narrate and narrate_service == "OpenAI" and not OPENAI_API_KEY:
+            st.error("Configure a chave OPENAI_API_KEY em .env para narrar com a OpenAI.")
+        elif narrate and narrate_service == "ElevenLabs" and not ELEVENLABS_API_KEY:
+            st.error("Configure a chave ELEVENLABS_API_KEY em .env para narrar com a ElevenLabs.")
         else:
-            progress_bar = st.progress(0)
-            status_container = st.empty()
+            output_file = "temp_processado.txt" if option == "Upload de PDF" else "texto_colado_processado.txt"
+            params = {
+                "prompt_type": prompt_type,
+                "text_model": text_model_name,
+                "vision_model": vision_model_name,
+                "prompt": prompt,
+                "vision_prompt": vision_prompt,
+                "chunk_size": chunk_size,
+                "pipeline": bool(input_data.get("files")),
+                "ocr": option == "Upload de PDF" and use_ocr,
+                "thinking": thinking,
+                "narration": {"service": narrate_service, "voice": narrate_voice, "model": narrate_model} if narrate else None,
+                "output_file": output_file
+            }
             
-            with st.spinner("Iniciando processamento..."):
-                result = ""
-                input_text = input_data["text"]
-                input_images = input_data["images"]
-                
-                if input_text:
-                    total_words = len(input_text.split())
-                    status_container.write(f"Texto extraído. Total de palavras: {total_words}. Dividindo em pedaços de {chunk_size} palavras.")
-                    text_model = TEXT_MODELS[text_model_name]
-                    status_container.write(f"Processando texto com modelo {text_model_name}...")
-                    text_result = process_in_chunks(
-                        text_model, 
-                        prompt, 
-                        input_text, 
-                        chunk_size_words=chunk_size, 
-                        progress_callback=update_progress
+            if run_in_background and input_data.get("separate"):
+                # Um trabalho por PDF, cada um com o próprio arquivo de saída
+                for uploaded_file, output_name in zip(uploaded_files, separate_output_names(uploaded_files)):
+                    submit_job("document", dict(params, output_file=output_name), [(uploaded_file.name, uploaded_file.getvalue())])
+                ensure_workers()
+                st.success(f"{len(uploaded_files)} trabalhos adicionados à fila. Acompanhe cada um em \"Trabalhos recentes\".")
+            elif run_in_background:
+                # O processo de trabalho recebe os PDFs originais e faz a própria extração
+                if option == "Upload de PDF":
+                    files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+                else:
+                    files = None
+                    params["text"] = input_data["text"]
+                job_id = submit_job("document", params, files)
+                ensure_workers()
+                st.session_state.pop("processed_audio", None)
+                follow_job(job_id)
+            elif input_data.get("separate"):
+                st.session_state.pop("processed_audio", None)
+                output_names = separate_output_names(uploaded_files)
+                file_paths = []
+                file_progress = []
+                for uploaded_file in uploaded_files:
+                    # Progresso próprio para cada PDF
+                    st.write(f"**{uploaded_file.name}**")
+                    file_progress.append((st.progress(0), st.empty()))
+                audio_artifacts = [
+                    new_artifact("mp3", output_name.replace(".txt", "_narracao.mp3")) if narrate else None
+                    for output_name in output_names
+                ]
+
+                def update_file_progress(i, current, total, message):
+                    file_progress[i][0].progress(current / total if total else 0)
+                    file_progress[i][1].write(message)
+
+                def on_document(i, document):
+                    if document["error"]:
+                        file_progress[i][1].error(f"Erro ao processar {uploaded_files[i].name}: {document['error']}")
+                        return
+                    save_processed_text(output_names[i], document["text"])
+                    file_progress[i][0].progress(1.0)
+                    file_progress[i][1].write(f"Arquivo processado salvo como {output_names[i]}. Total de palavras processadas: {len(document['text'].split())}")
+
+                try:
+                    for uploaded_file in uploaded_files:
+                        # Arquivo temporário exclusivo: outras sessões podem enviar um PDF com o mesmo nome
+                        fd, file_path = tempfile.mkstemp(suffix=".pdf", prefix="upload_")
+                        file_paths.append(file_path)
+                        with os.fdopen(fd, "wb") as f:
+                            f.write(uploaded_file.getbuffer())
+                    documents = process_documents(
+                        params,
+                        file_paths,
+                        audio_paths=[artifact["path"] if artifact else None for artifact in audio_artifacts],
+                        progress_callback=update_file_progress,
+                        status_callback=lambda i, message: file_progress[i][1].write(message),
+                        document_callback=on_document
                     )
-                    result += text_result
-                
-                if input_images:
-                    selected_vision_model = VISION_MODELS[vision_model_name]
-                    status_container.write(f"Encontradas {len(input_images)} imagens. Analisando com {vision_model_name}...")
-                    
-                    # Adiciona informações específicas para o Claude 3.7 Sonnet
-                    if vision_model_name == "Claude 3.7 Sonnet":
-                        status_container.write("Utilizando modelo com capacidades avançadas de raciocínio e análise de imagens.")
-                    
+                finally:
+                    for file_path in file_paths:
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+
+                st.session_state["processed_documents"] = [
+                    {
+                        "name": uploaded_file.name,
+                        "output_file": output_name,
+                        "text": document["text"],
+                        "audio": artifact if document["audio_path"] else None,
+                        "error": document["error"],
+                        "narration_error": document["narration_error"]
+                    }
+                    for uploaded_file, output_name, artifact, document in zip(uploaded_files, output_names, audio_artifacts, documents)
+                ]
+                # A seção de áudio passa a usar o primeiro documento concluído (ver "Documentos processados")
+                st.session_state.pop("loaded_document", None)
+                failures = sum(1 for document in documents if document["error"])
+                if failures:
+                    st.warning(f"{len(documents) - failures} de {len(documents)} PDFs processados.")
+                else:
+                    st.success("Processamento concluído!")
+            else:
+                progress_bar = st.progress(0)
+                status_container = st.empty()
+                st.session_state.pop("processed_audio", None)
+            
+                with st.spinner("Iniciando processamento..."):
+                    file_paths = []
+                    audio_artifact = new_artifact("mp3", "narracao.mp3") if narrate else None
                     try:
-                        vision_result = process_images(selected_vision_model, vision_prompt, input_images, progress_callback=update_progress)
-                        result += f"\n\nAnálise das Imagens:\n{vision_result}"
-                    except Exception as e:
-                        result += f"\n\nAnálise das Imagens: [Erro: {str(e)}]"
-                
-                if input_text and ("Caso Clínico" in input_text or "Keypoints" in input_text):
-                    result += "\n\nCasos Clínicos e Keypoints foram mantidos integralmente, conforme o original."
+                        for uploaded_file in input_data.get("files", []):
+                            # Arquivo temporário exclusivo, como em extract_pdf_cached
+                            fd, file_path = tempfile.mkstemp(suffix=".pdf", prefix="upload_")
+                            file_paths.append(file_path)
+                            with os.fdopen(fd, "wb") as f:
+                                f.write(uploaded_file.getbuffer())
+                        document = process_document(
+                            params,
+                            file_paths=file_paths,
+                            text=input_data["text"],
+                            images=input_data["images"],
+                            progress_callback=update_progress,
+                            status_callback=status_container.write,
+                            audio_path=audio_artifact["path"] if audio_artifact else None
+                        )
+                    finally:
+                        # Limpar os arquivos temporários após o processamento
+                        for file_path in file_paths:
+                            if os.path.exists(file_path):
+                                os.remove(file_path)
+                    result = document["text"]
                 
-                output_file = "temp_processado.txt" if option == "Upload de PDF" else "texto_colado_processado.txt"
-                save_processed_text(output_file, result)
-                status_container.write(f"Arquivo processado salvo como {output_file}. Total de palavras processadas: {len(result.split())}")
+                    save_processed_text(output_file, result)
+                    status_container.write(f"Arquivo processado salvo como {output_file}. Total de palavras processadas: {len(result.split())}")
                 
-                st.success("Processamento concluído!")
-                st.session_state["processed_result"] = result
+                    st.success("Processamento concluído!")
+                    st.session_state["processed_result"] = result
+                    st.session_state.pop("processed_documents", None)
+            
+                if audio_artifact:
+                    if document["narration_error"]:
+                        st.error(f"Erro ao narrar o texto processado: {document['narration_error']}")
+                    else:
+                        st.session_state["processed_audio"] = audio_artifact
+                        st.success("Narração concluída!")
+
+    # Acompanhamento do trabalho em segundo plano (também ao reabrir a página com ?job=<id>)
+    job_polling = False
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    if job_id:
+        job = get_job(job_id)
+        if job is None:
+            st.warning(f"Trabalho {job_id} não encontrado.")
+            st.session_state.pop("job_id", None)
+            st.query_params.clear()
+        else:
+            st.subheader("Trabalho em segundo plano")
+            st.write(f"Trabalho `{job_id}`: **{STATUS_LABELS[job['status']]}**")
+            progress = job["progress"]
+            if is_active(job):
+                st.progress(progress["current"] / progress["total"] if progress["total"] else 0)
+                st.write(progress["message"])
+                for message in job["messages"][-3:]:
+                    st.caption(message)
+                if st.button("Cancelar trabalho", key="cancel_job"):
+                    cancel_job(job_id)
+                    st.rerun()
+                job_polling = True
+            elif job["status"] == "done":
+                job_result = job["result"]
+                # O resultado é carregado na sessão uma única vez, para não sobrescrever processamentos seguintes
+                if st.session_state.get("loaded_job") != job_id:
+                    st.session_state["loaded_job"] = job_id
+                    if job_result.get("text_path"):
+                        with open(job_result["text_path"], "r", encoding="utf-8") as f:
+                            st.session_state["processed_result"] = f.read()
+                        st.session_state["processed_audio"] = job_result["audio"]
+                        st.session_state.pop("processed_documents", None)
+                if job_result.get("narration_error"):
+                    st.error(f"Erro ao narrar o texto processado: {job_result['narration_error']}")
+                if job["kind"] == "tts" and artifact_exists(job_result["audio"]):
+                    audio_info = AUDIO_FORMATS[job_result["audio_format"]]
+                    if job_result["audio_format"] != "pcm":
+                        st.audio(artifact_url(job_result["audio"]), format=audio_info["mime"])
+                    st.markdown(f"[Baixar Áudio]({artifact_url(job_result['audio'], download=True)})")
+                st.success("Trabalho concluído!")
+            elif job["status"] == "failed":
+                st.error(f"Erro no trabalho: {job['error']}")
+            if not is_active(job) and st.button("Fechar", key="close_job"):
+                st.session_state.pop("job_id", None)
+                st.query_params.clear()
+                st.rerun()
+
+    with st.expander("Trabalhos recentes"):
+        recent_jobs = list_jobs(limit=10)
+        if not recent_jobs:
+            st.write("Nenhum trabalho registrado.")
+        for recent_job in recent_jobs:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                kind_label = "Processamento" if recent_job["kind"] == "document" else "Áudio"
+                created = time.strftime("%d/%m %H:%M", time.localtime(recent_job["created_at"]))
+                st.write(f"{created} · {kind_label} · {STATUS_LABELS[recent_job['status']]}")
+            with col2:
+                if st.button("Acompanhar", key=f"follow_{recent_job['id']}"):
+                    follow_job(recent_job["id"])
+
+    # Resultados dos PDFs processados separadamente
+    processed_documents = st.session_state.get("processed_documents")
+    if processed_documents:
+        st.subheader("Documentos processados")
+        for i, document in enumerate(processed_documents):
+            with st.expander(document["name"], expanded=bool(document["error"])):
+                if document["error"]:
+                    st.error(f"Erro ao processar: {document['error']}")
+                    continue
+                st.write(f"Salvo como {document['output_file']} ({len(document['text'].split())} palavras)")
+                if document["narration_error"]:
+                    st.error(f"Erro ao narrar o texto processado: {document['narration_error']}")
+                elif artifact_exists(document["audio"]):
+                    st.audio(artifact_url(document["audio"]), format="audio/mp3")
+                    st.markdown(f"[Baixar Narração]({artifact_url(document['audio'], download=True)})")
+                st.text_area("Texto processado", document["text"], height=200, key=f"document_text_{i}")
+        completed_documents = [document for document in processed_documents if not document["error"]]
+        if completed_documents:
+            # O arquivo de saída identifica o documento mesmo quando dois PDFs têm o mesmo nome
+            names = {document["output_file"]: document["name"] for document in completed_documents}
+            selected_output = st.selectbox(
+                "Documento usado na geração de áudio",
+                list(names.keys()),
+                format_func=lambda output_file: f"{names[output_file]} ({output_file})",
+                key="selected_document"
+            )
+            # Carrega o documento escolhido apenas quando a escolha muda
+            if st.session_state.get("loaded_document") != selected_output:
+                st.session_state["loaded_document"] = selected_output
+                selected = next(document for document in completed_documents if document["output_file"] == selected_output)
+                st.session_state["processed_result"] = selected["text"]
+                st.session_state["processed_audio"] = selected["audio"]
 
     # Seção de TTS separada
     if "processed_result" in st.session_state:
+        # A sessão guarda apenas a referência ao arquivo da narração
+        if artifact_exists(st.session_state.get("processed_audio")):
+            st.subheader("Narração")
+            st.audio(artifact_url(st.session_state["processed_audio"]), format="audio/mp3")
+            st.markdown(f"[Baixar Narração]({artifact_url(st.session_state['processed_audio'], download=True)})")
+        
         st.subheader("Gerar Áudio")
         
         # Opção para escolher o serviço de TTS
@@ -473,16 +915,51 @@ else:
             ["OpenAI", "ElevenLabs"]
         )
         
+        background_tts = st.checkbox(
+            "Gerar em segundo plano",
+            value=False,
+            key="background_tts_processed",
+            help="O áudio é gerado em um processo separado e fica disponível no painel do trabalho, mesmo que a página seja recarregada."
+        )
+        
         if tts_service == "OpenAI":
             # OpenAI TTS
             voice = st.selectbox("Escolha a voz", ["alloy", "ash", "coral", "echo", "fable", "onyx", "nova", "sage", "shimmer"])
             model_tts = st.selectbox("Escolha o modelo TTS", ["tts-1", "tts-1-hd"])
             
+            audio_format = st.selectbox(
+                "Formato de saída",
+                list(AUDIO_FORMATS.keys()),
+                index=list(AUDIO_FORMATS.keys()).index(DEFAULT_AUDIO_FORMAT),
+                format_func=lambda key: AUDIO_FORMATS[key]["name"],
+                key="audio_format_processed",
+                help="Opus e AAC são convertidos localmente com o ffmpeg e ocupam bem menos espaço que o MP3 padrão."
+            )
+            audio_info = AUDIO_FORMATS[audio_format]
+            
+            stream_mode = st.checkbox(
+                "Ouvir enquanto gera (streaming)",
+                value=False,
+                key="stream_mode_processed",
+                help="O áudio é gravado em disco à medida que chega e pode ser ouvido assim que o primeiro trecho fica pronto."
+            )
+            
             st.write(f"OPENAI_API_KEY carregada: {OPENAI_API_KEY[:4]}...{OPENAI_API_KEY[-4:]}" if OPENAI_API_KEY else "OPENAI_API_KEY não configurada")
             
             if st.button("Gerar Áudio com OpenAI"):
                 if not OPENAI_API_KEY:
                     st.error("Configure a chave OPENAI_API_KEY em .env.")
+                elif background_tts:
+                    job_id = submit_job("tts", {
+                        "service": "OpenAI",
+                        "text": st.session_state["processed_result"].strip(),
+                        "voice": voice,
+                        "model": model_tts,
+                        "output_format": audio_format,
+                        "download_name": "audiobook"
+                    })
+                    ensure_workers()
+                    follow_job(job_id)
                 else:
                     texto = st.session_state["processed_result"].strip()
                     st.write(f"Tamanho do texto: {len(texto)} caracteres")
@@ -503,16 +980,40 @@ else:
                             
                             # Função de callback para atualizar o progresso da geração de áudio
                             def audio_progress_callback(current_chunk, total_chunks, message):
-                                progress = current_chunk / total_chunks
+                                progress = current_chunk / total_chunks if total_chunks else 0
                                 audio_progress.progress(progress)
                                 audio_status.write(message)
                             
-                            # Modificar a função generate_tts para aceitar o callback
-                            audio_bytes = generate_tts(texto, voice, model_tts, callback=audio_progress_callback)
-                            
-                            st.success("Áudio gerado com sucesso!")
-                            st.audio(audio_bytes, format="audio/mp3")
-                            st.download_button("Baixar Áudio", audio_bytes, file_name="audiobook.mp3")
+                            if stream_mode:
+                                # O áudio é gravado direto em disco e tocado pelo servidor local, sem passar pela sessão
+                                artifact = new_artifact(audio_info["extension"], f"audiobook.{audio_info['extension']}")
+                                audio_player = st.empty()
+                                
+                                # O player é criado uma única vez, quando o primeiro trecho fica pronto; a resposta do
+                                # servidor acompanha o arquivo enquanto ele cresce, então o áudio toca até o fim
+                                def on_audio(path, ready_chunks, total_chunks):
+                                    if audio_format != "pcm" and ready_chunks == 1:
+                                        audio_player.audio(artifact_url(artifact), format=audio_info["mime"])
+                                
+                                with writing_artifact(artifact):
+                                    generate_tts_stream(texto, artifact["path"], voice, model_tts, callback=audio_progress_callback, on_audio=on_audio, output_format=audio_format)
+                                
+                                st.success("Áudio gerado com sucesso!")
+                                st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
+                            else:
+                                # Modificar a função generate_tts para aceitar o callback
+                                # Se a API falhar, o áudio é gerado com o TTS local (quando instalado)
+                                audio_bytes, audio_format = generate_with_fallback(
+                                    lambda: generate_tts(texto, voice, model_tts, callback=audio_progress_callback, output_format=audio_format),
+                                    texto, callback=audio_progress_callback, output_format=audio_format
+                                )
+                                audio_info = AUDIO_FORMATS[audio_format]
+                                
+                                st.success("Áudio gerado com sucesso!")
+                                artifact = save_artifact(audio_bytes, audio_info["extension"], f"audiobook.{audio_info['extension']}")
+                                if audio_format != "pcm":
+                                    st.audio(artifact_url(artifact), format=audio_info["mime"])
+                                st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
                         except Exception as e:
                             st.error(f"Erro ao gerar áudio: {str(e)}")
         else:
@@ -521,8 +1022,12 @@ else:
                 st.warning("Configure a chave ELEVENLABS_API_KEY em .env para usar o TTS da ElevenLabs.")
             else:
                 try:
+                    # A lista de vozes vem do cache; o botão força uma nova consulta à API
+                    if st.button("Atualizar lista de vozes", key="refresh_voices_processed"):
+                        refresh_voices()
+                    
                     with st.spinner("Carregando vozes disponíveis..."):
-                        voices = list_elevenlabs_voices()
+                        voices = list_voices_cached()
                     
                     if voices:
                         # Criar um dicionário de vozes para seleção
@@ -620,46 +1125,94 @@ else:
                                 "use_speaker_boost": use_speaker_boost
                             }
                         
+                        audio_format = st.selectbox(
+                            "Formato de saída",
+                            list(AUDIO_FORMATS.keys()),
+                            index=list(AUDIO_FORMATS.keys()).index(DEFAULT_AUDIO_FORMAT),
+                            format_func=lambda key: AUDIO_FORMATS[key]["name"],
+                            key="audio_format_elevenlabs_processed",
+                            help="Opus e AAC são convertidos localmente com o ffmpeg e ocupam bem menos espaço que o MP3 padrão."
+                        )
+                        audio_info = AUDIO_FORMATS[audio_format]
+                        
+                        # Estimativa de caracteres cobrados antes de gerar o áudio
+                        fit_to_quota = st.checkbox(
+                            "Gerar apenas a parte que cabe na cota atual",
+                            value=False,
+                            key="fit_to_quota_processed",
+                            help="O restante pode ser gerado depois da renovação da cota, reaproveitando o áudio já gerado."
+                        )
+                        if st.button("Estimar caracteres cobrados", key="estimate_quota_processed"):
+                            with st.spinner("Consultando a cota da ElevenLabs..."):
+                                plan = plan_elevenlabs_tts(st.session_state["processed_result"].strip(), selected_voice_id, selected_model, custom_settings=custom_settings, output_format=audio_format)
+                            if plan["fits"]:
+                                st.info(plan["description"])
+                            else:
+                                st.warning(plan["description"])
+                        
                         if st.button("Gerar Áudio com ElevenLabs"):
-                            texto = st.session_state["processed_result"].strip()
-                            st.write(f"Tamanho do texto: {len(texto)} caracteres")
-                            log_container = st.empty()
+                            if background_tts:
+                                job_id = submit_job("tts", {
+                                    "service": "ElevenLabs",
+                                    "text": st.session_state["processed_result"].strip(),
+                                    "voice": selected_voice_id,
+                                    "model": selected_model,
+                                    "output_format": audio_format,
+                                    "custom_settings": custom_settings,
+                                    "fit_to_quota": fit_to_quota,
+                                    "download_name": "elevenlabs_audiobook"
+                                })
+                                ensure_workers()
+                                follow_job(job_id)
+                            else:
+                                texto = st.session_state["processed_result"].strip()
+                                st.write(f"Tamanho do texto: {len(texto)} caracteres")
+                                log_container = st.empty()
                             
-                            with st.spinner("Gerando áudio com ElevenLabs..."):
-                                try:
-                                    class StreamlitHandler(logging.Handler):
-                                        def emit(self, record):
-                                            log_container.write(self.format(record))
+                                with st.spinner("Gerando áudio com ElevenLabs..."):
+                                    try:
+                                        class StreamlitHandler(logging.Handler):
+                                            def emit(self, record):
+                                                log_container.write(self.format(record))
                                     
-                                    handler = StreamlitHandler()
-                                    handler.setLevel(logging.INFO)
-                                    logger.handlers = [handler]
+                                        handler = StreamlitHandler()
+                                        handler.setLevel(logging.INFO)
+                                        logger.handlers = [handler]
                                     
-                                    # Criar barra de progresso para geração de áudio
-                                    audio_progress = st.progress(0)
-                                    audio_status = st.empty()
+                                        # Criar barra de progresso para geração de áudio
+                                        audio_progress = st.progress(0)
+                                        audio_status = st.empty()
                                     
-                                    # Função de callback para atualizar o progresso da geração de áudio
-                                    def audio_progress_callback(current, total, message):
-                                        progress = current / total
-                                        audio_progress.progress(progress)
-                                        audio_status.write(message)
+                                        # Função de callback para atualizar o progresso da geração de áudio
+                                        def audio_progress_callback(current, total, message):
+                                            progress = current / total if total else 0
+                                            audio_progress.progress(progress)
+                                            audio_status.write(message)
                                     
-                                    # Gerar o áudio com configurações personalizadas
-                                    audio_bytes = generate_elevenlabs_tts(
-                                        texto, 
-                                        selected_voice_id, 
-                                        selected_model, 
-                                        callback=audio_progress_callback,
-                                        language="pt",  # Definir idioma como português
-                                        custom_settings=custom_settings  # Passar configurações personalizadas
-                                    )
+                                        # Gerar o áudio com configurações personalizadas
+                                        # Se a API falhar, o áudio é gerado com o TTS local (quando instalado)
+                                        audio_bytes, audio_format = generate_with_fallback(
+                                            lambda: generate_elevenlabs_tts(
+                                                texto, 
+                                                selected_voice_id, 
+                                                selected_model, 
+                                                callback=audio_progress_callback,
+                                                language="pt",  # Definir idioma como português
+                                                custom_settings=custom_settings,  # Passar configurações personalizadas
+                                                output_format=audio_format,
+                                                fit_to_quota=fit_to_quota
+                                            ),
+                                            texto, callback=audio_progress_callback, output_format=audio_format
+                                        )
+                                        audio_info = AUDIO_FORMATS[audio_format]
                                     
-                                    st.success("Áudio gerado com sucesso!")
-                                    st.audio(audio_bytes, format="audio/mp3")
-                                    st.download_button("Baixar Áudio", audio_bytes, file_name="elevenlabs_audiobook.mp3")
-                                except Exception as e:
-                                    st.error(f"Erro ao gerar áudio com ElevenLabs: {str(e)}")
+                                        st.success("Áudio gerado com sucesso!")
+                                        artifact = save_artifact(audio_bytes, audio_info["extension"], f"elevenlabs_audiobook.{audio_info['extension']}")
+                                        if audio_format != "pcm":
+                                            st.audio(artifact_url(artifact), format=audio_info["mime"])
+                                        st.markdown(f"[Baixar Áudio]({artifact_url(artifact, download=True)})")
+                                    except Exception as e:
+                                        st.error(f"Erro ao gerar áudio com ElevenLabs: {str(e)}")
                     else:
                         st.error("Não foi possível carregar as vozes da ElevenLabs. Verifique sua chave de API.")
                 except Exception as e:
@@ -668,5 +1221,10 @@ else:
         # Mostrar o texto processado
         st.text_area("Texto Processado", st.session_state["processed_result"], height=300)
 
+    # Enquanto o trabalho estiver ativo, a página é atualizada periodicamente com o progresso gravado em disco
+    if job_polling:
+        time.sleep(JOB_CONFIG["ui_refresh"])
+        st.rerun()
+
 if __name__ == "__main__":
     st.write("Aplicativo rodando...")
\ No newline at end of file
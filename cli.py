@@ -0,0 +1,258 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config.settings import TEXT_MODELS, VISION_MODELS, PROMPT_TYPES, DEFAULT_PROMPT_TYPE, CLI_CONFIG, get_prompts
+from utils.audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from utils.document_pipeline import process_document, synthesize_text
+from utils.elevenlabs_handler import POPULAR_VOICES
+from utils.ocr_router import ocr_available
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+INPUT_EXTENSIONS = (".pdf", ".txt")
+
+# Padrões de voz e modelo por serviço de TTS
+TTS_DEFAULTS = {
+    "openai": {"service": "OpenAI", "voice": "alloy", "model": "tts-1"},
+    "elevenlabs": {"service": "ElevenLabs", "voice": "Rachel", "model": "eleven_flash_v2_5"},
+    "local": {"service": "Local", "voice": None, "model": None}
+}
+
+def find_inputs(patterns):
+    """Expande diretórios e padrões glob em uma lista ordenada de PDFs e textos, sem repetições."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.extend(sorted(path for path in matches if path.lower().endswith(INPUT_EXTENSIONS) and os.path.isfile(path)))
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+def output_names(paths):
+    """Nome base da saída de cada arquivo; nomes repetidos (em diretórios diferentes) recebem sufixo."""
+    names, seen = {}, {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names[path] = stem if seen[stem] == 1 else f"{stem}_{seen[stem]}"
+    return names
+
+def _fingerprint(path, params):
+    # Conteúdo do arquivo e opções: qualquer mudança em um dos dois refaz o arquivo
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def _marker_path(output_dir, name):
+    return os.path.join(output_dir, f"{name}.done.json")
+
+def is_done(path, name, params, output_dir):
+    """Indica se o arquivo já foi concluído em uma execução anterior com o mesmo conteúdo e opções."""
+    try:
+        with open(_marker_path(output_dir, name), "r", encoding="utf-8") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return False
+    outputs = [marker.get("text_path"), marker.get("audio_path")]
+    return marker.get("fingerprint") == _fingerprint(path, params) and all(os.path.exists(p) for p in outputs if p)
+
+def _write_atomic(path, data):
+    # O arquivo final só aparece completo; uma execução interrompida não deixa saídas pela metade
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def process_file(path, name, params, output_dir, progress_queue=None):
+    """
+    Processa um arquivo (executado em um processo do pool) e grava texto, áudio e o marcador de conclusão.
+
+    Returns:
+        dict: Caminhos das saídas, aviso de narração e duração em segundos
+    """
+    started = time.time()
+    last_report = [0.0]
+
+    def report(message, force=False):
+        if progress_queue is None:
+            return
+        if force or time.time() - last_report[0] >= CLI_CONFIG["progress_interval"]:
+            last_report[0] = time.time()
+            progress_queue.put((name, message))
+
+    def progress_callback(current, total, message):
+        report(f"{current}/{total} {message}" if total else message, force=(current == total))
+
+    document_params = dict(params["document"])
+    if path.lower().endswith(".pdf"):
+        result = process_document(document_params, file_paths=[path], progress_callback=progress_callback, status_callback=report)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            result = process_document(document_params, text=f.read().strip(), progress_callback=progress_callback, status_callback=report)
+
+    text_path = os.path.join(output_dir, f"{name}.txt")
+    _write_atomic(text_path, result["text"].encode("utf-8"))
+
+    audio_path = None
+    tts_warning = None
+    if params["tts"]:
+        report("Gerando áudio...", force=True)
+        audio_bytes, audio_format = synthesize_text(dict(params["tts"], text=result["text"]), callback=progress_callback)
+        if audio_format != params["tts"]["output_format"]:
+            tts_warning = f"áudio gerado com o TTS local em {AUDIO_FORMATS[audio_format]['name']}"
+        audio_path = os.path.join(output_dir, f"{name}.{AUDIO_FORMATS[audio_format]['extension']}")
+        _write_atomic(audio_path, audio_bytes)
+
+    marker = {
+        "source": path,
+        "fingerprint": _fingerprint(path, params),
+        "text_path": text_path,
+        "audio_path": audio_path,
+        "finished_at": time.time()
+    }
+    _write_atomic(_marker_path(output_dir, name), json.dumps(marker, ensure_ascii=False, indent=2).encode("utf-8"))
+    return {"text_path": text_path, "audio_path": audio_path, "warning": tts_warning, "seconds": time.time() - started}
+
+def build_params(args):
+    """Opções serializáveis repassadas a cada processo (e usadas na verificação de arquivos já concluídos)."""
+    text_prompt, vision_prompt = get_prompts(args.tipo)
+    params = {
+        "document": {
+            "prompt_type": args.tipo,
+            "text_model": args.modelo_texto,
+            "vision_model": args.modelo_visao,
+            "prompt": text_prompt,
+            "vision_prompt": vision_prompt,
+            "chunk_size": args.chunk_size,
+            "pipeline": args.pipeline,
+            "ocr": args.ocr
+        },
+        "tts": None
+    }
+    if args.tts:
+        defaults = TTS_DEFAULTS[args.tts]
+        voice = args.voz or defaults["voice"]
+        if args.tts == "elevenlabs":
+            # Aceita o nome de uma voz popular ou o ID da voz
+            voice = POPULAR_VOICES.get(voice, voice)
+        params["tts"] = {
+            "service": defaults["service"],
+            "voice": voice,
+            "model": args.modelo_tts or defaults["model"],
+            "output_format": args.formato
+        }
+    return params
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Processa em lote PDFs e arquivos de texto com os mesmos modelos e prompts do aplicativo. "
+                    "Arquivos já concluídos em execuções anteriores, com o mesmo conteúdo e as mesmas opções, são ignorados.",
+        epilog='Exemplo: python cli.py "aulas/*.pdf" notas.txt --tipo neurologia --tts openai --voz nova --saida processados',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("entradas", nargs="+", help="Arquivos, diretórios ou padrões glob (ex.: \"pdfs/**/*.pdf\")")
+    parser.add_argument("--tipo", choices=list(PROMPT_TYPES.keys()), default=DEFAULT_PROMPT_TYPE, help="Tipo de texto (define os prompts)")
+    parser.add_argument("--modelo-texto", choices=list(TEXT_MODELS.keys()), default=list(TEXT_MODELS.keys())[0])
+    parser.add_argument("--modelo-visao", choices=list(VISION_MODELS.keys()), default="Claude 3.5 Sonnet")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Tamanho do chunk em palavras")
+    parser.add_argument("--pipeline", action="store_true", help="Extrair e processar cada PDF ao mesmo tempo")
+    parser.add_argument("--ocr", action="store_true", help="OCR local para páginas digitalizadas")
+    parser.add_argument("--tts", choices=list(TTS_DEFAULTS.keys()), help="Gerar também o áudio do texto processado")
+    parser.add_argument("--voz", help="Voz do TTS (OpenAI: alloy, nova...; ElevenLabs: nome popular ou ID)")
+    parser.add_argument("--modelo-tts", help="Modelo do TTS (padrão: tts-1 ou eleven_flash_v2_5)")
+    parser.add_argument("--formato", choices=list(AUDIO_FORMATS.keys()), default=DEFAULT_AUDIO_FORMAT, help="Formato do áudio")
+    parser.add_argument("--saida", default=CLI_CONFIG["output_dir"], help="Diretório das saídas")
+    parser.add_argument("--processos", type=int, default=CLI_CONFIG["workers"], help="Arquivos processados simultaneamente")
+    parser.add_argument("--forcar", action="store_true", help="Reprocessar arquivos já concluídos")
+    return parser.parse_args(argv)
+
+def _drain(progress_queue):
+    # Mostra as mensagens de progresso enviadas pelos processos
+    while True:
+        try:
+            name, message = progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        print(f"  [{name}] {message}", flush=True)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.ocr and not ocr_available():
+        print("--ocr requer o pytesseract e o executável do Tesseract instalados.", file=sys.stderr)
+        return 2
+
+    paths = find_inputs(args.entradas)
+    if not paths:
+        print("Nenhum PDF ou arquivo .txt encontrado.", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.saida, exist_ok=True)
+    output_dir = os.path.abspath(args.saida)
+    params = build_params(args)
+    names = output_names(paths)
+
+    pending = [path for path in paths if args.forcar or not is_done(path, names[path], params, output_dir)]
+    skipped = len(paths) - len(pending)
+    print(f"{len(paths)} arquivo(s) encontrado(s); {skipped} já concluído(s), {len(pending)} a processar em {output_dir}", flush=True)
+    if not pending:
+        return 0
+
+    failures = 0
+    manager = multiprocessing.Manager()
+    progress_queue = manager.Queue()
+    executor = ProcessPoolExecutor(max_workers=max(1, min(args.processos, len(pending))))
+    try:
+        futures = {
+            executor.submit(process_file, path, names[path], params, output_dir, progress_queue): path
+            for path in pending
+        }
+        remaining = set(futures)
+        completed = 0
+        while remaining:
+            done = {future for future in remaining if future.done()}
+            _drain(progress_queue)
+            if not done:
+                time.sleep(0.2)
+                continue
+            for future in done:
+                remaining.discard(future)
+                completed += 1
+                name = names[futures[future]]
+                try:
+                    result = future.result()
+                    outputs = ", ".join(os.path.basename(p) for p in (result["text_path"], result["audio_path"]) if p)
+                    print(f"[{completed}/{len(pending)}] {name}: concluído em {result['seconds']:.1f}s ({outputs})", flush=True)
+                    if result["warning"]:
+                        print(f"  [{name}] Aviso: {result['warning']}", flush=True)
+                except Exception as e:
+                    failures += 1
+                    print(f"[{completed}/{len(pending)}] {name}: erro: {str(e)}", flush=True)
+        _drain(progress_queue)
+    except KeyboardInterrupt:
+        # Os arquivos já concluídos ficam marcados; a próxima execução continua dos restantes
+        print("Interrompido. Execute novamente para continuar de onde parou.", file=sys.stderr)
+        return 130
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        manager.shutdown()
+
+    print(f"Concluído: {len(pending) - failures} processado(s), {failures} com erro, {skipped} ignorado(s).", flush=True)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
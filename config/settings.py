@@ -268,4 +268,219 @@ def get_prompts(prompt_type):
     return (
         PROMPT_TYPES[prompt_type]["text_prompt"],
         PROMPT_TYPES[prompt_type]["vision_prompt"]
-    )
\ No newline at end of file
+    )
+
+# ===== CONFIGURAÇÃO DO PIPELINE =====
+
+# Modo pipeline: a extração do PDF e o processamento pelo LLM acontecem ao mesmo tempo
+PIPELINE_CONFIG = {
+    "llm_workers": 4,          # Requisições simultâneas ao modelo de texto
+    "max_pending_chunks": 8,   # Chunks em voo antes de pausar a extração (backpressure)
+    "page_queue_size": 16      # Páginas extraídas aguardando na fila
+}
+
+# Vários PDFs processados separadamente e ao mesmo tempo, com um orçamento comum de requisições
+MULTI_DOCUMENT_CONFIG = {
+    "max_files": 3,            # Documentos em andamento ao mesmo tempo
+    "shared_workers": 6        # Requisições simultâneas aos modelos (texto e visão), somando todos os documentos
+}
+
+# ===== CONFIGURAÇÃO DE LOTES DE VISÃO =====
+
+# As imagens são enviadas em lotes simultâneos, respeitando os limites por requisição da Anthropic
+VISION_BATCH_CONFIG = {
+    "max_images_per_batch": 20,             # Imagens por mensagem
+    "max_batch_bytes": 24 * 1024 * 1024,    # Tamanho máximo (base64) por mensagem; a API aceita até 32 MB
+    "max_concurrency": 3                    # Lotes enviados ao mesmo tempo
+}
+
+# ===== CONFIGURAÇÃO DE CODIFICAÇÃO DE IMAGENS =====
+
+# Política de codificação das imagens enviadas para a visão
+VISION_ENCODING_CONFIG = {
+    "lossy_format": "JPEG",             # Formato para fotografias e exames ("JPEG" ou "WEBP")
+    "quality_steps": [85, 75, 65, 50],  # Qualidades testadas em ordem até caber no orçamento
+    "max_image_bytes": 1_500_000,       # Orçamento por imagem (a API aceita até 5 MB)
+    "line_art_max_colors": 64,          # Até esse número de cores a imagem é tratada como diagrama (PNG)
+    "workers": 4                        # Threads de codificação
+}
+
+# ===== CONFIGURAÇÃO DO CACHE DE VISÃO =====
+
+# Análises e imagens codificadas ficam em disco, indexadas pelo conteúdo da imagem, prompt e modelo
+VISION_CACHE_CONFIG = {
+    "enabled": True,
+    "directory": os.path.join(".cache", "vision"),
+    "max_bytes": 512 * 1024 * 1024    # Acima disso, as entradas menos usadas são removidas
+}
+
+# ===== CONFIGURAÇÃO DO FILTRO DE IMAGENS =====
+
+# Imagens em branco, linhas separadoras e recortes quase vazios não são enviados para a visão
+IMAGE_FILTER_SETTINGS = {
+    "default": {
+        "enabled": True,
+        "action": "drop",            # "drop" descarta; "flag" apenas sinaliza e envia mesmo assim
+        "min_area": 64 * 64,         # Área mínima em pixels
+        "min_std": 6.0,              # Desvio padrão mínimo da intensidade (0-255)
+        "min_edge_density": 0.002    # Fração mínima de pixels de borda
+    },
+    "neurologia": {
+        # Exames de imagem têm fundo escuro e pouco contraste; limites mais permissivos
+        "min_std": 4.0,
+        "min_edge_density": 0.001
+    },
+    "religioso": {}
+}
+
+def get_image_filter_settings(prompt_type):
+    """Retorna os limites do filtro de imagens para o tipo de prompt, completados com os valores padrão."""
+    settings = IMAGE_FILTER_SETTINGS["default"].copy()
+    settings.update(IMAGE_FILTER_SETTINGS.get(prompt_type, {}))
+    return settings
+
+# ===== CONFIGURAÇÃO DO OCR LOCAL =====
+
+# Páginas digitalizadas com predominância de texto são lidas por OCR local (Tesseract) em vez da visão
+OCR_CONFIG = {
+    "language": "por",            # Idioma do Tesseract
+    "min_confidence": 60,         # Confiança mínima (0-100) para contar uma palavra
+    "min_words": 30,              # Palavras confiáveis mínimas para considerar a página como texto
+    "min_text_ink_ratio": 0.6     # Fração mínima da tinta da página dentro das palavras reconhecidas
+}
+
+# ===== CONFIGURAÇÃO DO TTS =====
+
+# Limite de caracteres por requisição do TTS da OpenAI; os chunks são empacotados até esse tamanho
+OPENAI_TTS_MAX_CHARS = 4096
+
+# Chunks sintetizados ao mesmo tempo por modelo de TTS da OpenAI (respeitando os limites de taxa da conta)
+TTS_CONCURRENCY = {
+    "tts-1": 4,
+    "tts-1-hd": 2,
+    "default": 2
+}
+
+# Modo streaming: cada chunk fica em memória até este tamanho antes de ir para um arquivo temporário
+TTS_STREAM_CONFIG = {
+    "spool_max_memory": 1024 * 1024
+}
+
+# Cache do áudio por chunk: só os trechos alterados são sintetizados novamente
+AUDIO_CACHE_CONFIG = {
+    "enabled": True,
+    "directory": os.path.join(".cache", "audio"),
+    "max_bytes": 2 * 1024 * 1024 * 1024    # Acima disso, os áudios menos usados são removidos
+}
+
+# ===== CONFIGURAÇÃO DOS ARTEFATOS DE ÁUDIO =====
+
+# O áudio gerado é gravado em disco e servido por um servidor HTTP local (com suporte a Range),
+# em vez de ficar em memória na sessão do Streamlit
+ARTIFACT_CONFIG = {
+    "directory": os.path.join(".cache", "artifacts"),
+    "host": os.getenv("ARTIFACT_HOST") or "127.0.0.1",
+    "port": int(os.getenv("ARTIFACT_PORT") or 8765),
+    "public_url": os.getenv("ARTIFACT_PUBLIC_URL") or "",   # URL vista pelo navegador, se diferente de host:porta
+    "max_age_hours": 24,                                    # Artefatos mais antigos são removidos
+    "stream_idle_timeout": 60                               # Segundos sem crescer até desistir de um áudio ainda em gravação
+}
+
+# ===== CONFIGURAÇÃO DO TTS DA ELEVENLABS =====
+
+# Limite de caracteres por requisição de cada modelo da ElevenLabs
+ELEVENLABS_MAX_CHARS = {
+    "eleven_multilingual_v2": 10000,
+    "eleven_flash_v2_5": 40000,
+    "eleven_flash_v2": 30000,
+    "default": 5000
+}
+
+# Textos longos são divididos em chunks menores que o limite do modelo, para serem sintetizados em paralelo
+ELEVENLABS_CHUNK_CONFIG = {
+    "chunk_chars": 2500,      # Tamanho alvo de cada chunk (limitado pelo máximo do modelo)
+    "context_chars": 500      # Texto vizinho enviado em previous_text/next_text para manter a entonação
+}
+
+# Requisições simultâneas permitidas por plano da ElevenLabs
+ELEVENLABS_CONCURRENCY = {
+    "free": 2,
+    "starter": 3,
+    "creator": 5,
+    "pro": 10,
+    "scale": 15,
+    "business": 15,
+    "default": 2
+}
+
+ELEVENLABS_TIER = (os.getenv("ELEVENLABS_TIER") or "default").lower()
+
+# Lista de vozes da ElevenLabs em cache (memória e disco); depois do TTL é atualizada em segundo plano
+VOICES_CACHE_CONFIG = {
+    "ttl_seconds": 3600,
+    "path": os.path.join(".cache", "elevenlabs_voices.json")
+}
+
+# Narração ao vivo: texto enviado à ElevenLabs por WebSocket à medida que o modelo escreve
+ELEVENLABS_STREAM_CONFIG = {
+    "base_url": os.getenv("ELEVENLABS_WS_URL") or "wss://api.elevenlabs.io",
+    "chunk_length_schedule": [120, 160, 250, 290],   # Caracteres acumulados pela API antes de cada geração
+    "max_buffer_chars": 600,                          # Sem fim de frase até aqui, o texto é enviado na última pausa
+    "receive_timeout": 30                             # Segundos sem áudio até considerar a conexão perdida
+}
+
+# Verificação da cota de caracteres da ElevenLabs antes de cada geração
+ELEVENLABS_QUOTA_CONFIG = {
+    "enabled": True,
+    "policy": "warn",             # "warn": avisa e gera mesmo assim; "refuse": não gera se não couber na cota
+    "safety_margin": 0.02,        # Fração da cota reservada para diferenças de contagem
+    "subscription_max_age": 60,   # Segundos em que a consulta da cota é reaproveitada
+    "reset_period_days": 30       # Intervalo usado para estimar as renovações seguintes à próxima
+}
+
+# ===== CONFIGURAÇÃO DO TTS LOCAL =====
+
+# Síntese local com o Piper (CPU), para prévias e como alternativa quando as APIs falham
+LOCAL_TTS_CONFIG = {
+    "model_path": os.getenv("PIPER_MODEL") or os.path.join("models", "pt_BR-faber-medium.onnx"),
+    "chunk_chars": 400,                       # Chunks curtos para distribuir entre os processos
+    "workers": max(1, (os.cpu_count() or 2) - 1),
+    "sentence_silence": 0.25,                 # Segundos de pausa entre chunks
+    "fallback": True                          # Usar o TTS local quando a API remota falhar
+}
+
+# ===== CONFIGURAÇÃO DOS TRABALHOS EM SEGUNDO PLANO =====
+
+# Fila local de trabalhos executados por processos independentes da sessão do Streamlit
+JOB_CONFIG = {
+    "directory": os.path.join(".cache", "jobs"),
+    "workers": 2,               # Processos de trabalho simultâneos
+    "poll_interval": 1.0,       # Segundos entre verificações da fila pelo processo de trabalho
+    "idle_timeout": 600,        # Segundos sem trabalhos até o processo de trabalho encerrar
+    "progress_interval": 0.5,   # Intervalo mínimo entre gravações do progresso em disco
+    "ui_refresh": 2.0,          # Segundos entre atualizações do painel de acompanhamento
+    "max_age_hours": 72         # Trabalhos concluídos mais antigos são removidos
+}
+
+# ===== CONFIGURAÇÃO DA LINHA DE COMANDO =====
+
+# Processamento em lote pelo cli.py
+CLI_CONFIG = {
+    "output_dir": "processados",
+    "workers": 2,               # Arquivos processados simultaneamente (um processo por arquivo)
+    "progress_interval": 2.0    # Segundos mínimos entre mensagens de progresso de um mesmo arquivo
+}
+
+# ===== CONFIGURAÇÃO DO SERVIÇO HTTP =====
+
+# Serviço assíncrono (service.py) para usar o processador a partir de outras ferramentas
+SERVICE_CONFIG = {
+    "host": os.getenv("SERVICE_HOST") or "127.0.0.1",
+    "port": int(os.getenv("SERVICE_PORT") or 8080),
+    "token": os.getenv("SERVICE_TOKEN") or "",   # Se definido, exigido no cabeçalho Authorization: Bearer
+    "max_jobs": 4,              # Requisições processadas ao mesmo tempo (threads do pool compartilhado)
+    "max_waiting": 16,          # Requisições aguardando vaga; acima disso, o serviço responde 503
+    "tts_workers": 3,           # Chunks de áudio sintetizados ao mesmo tempo por requisição
+    "queue_size": 64,           # Eventos/pedaços de áudio pendentes por requisição antes de pausar a geração
+    "max_upload_mb": 200
+}
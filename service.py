@@ -0,0 +1,340 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from config.settings import TEXT_MODELS, VISION_MODELS, PROMPT_TYPES, DEFAULT_PROMPT_TYPE, SERVICE_CONFIG, get_prompts
+from utils.audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from utils.document_pipeline import ProcessingCancelled, process_document
+from utils.api_handler import stream_in_chunks
+from utils.tts_handler import generate_tts_stream
+from utils.elevenlabs_handler import generate_elevenlabs_tts, POPULAR_VOICES
+from utils.elevenlabs_stream import StreamingTTSSession
+from utils.local_tts_handler import generate_local_tts
+from utils.ocr_router import ocr_available
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Marca o fim dos itens produzidos por uma tarefa bloqueante
+_END = object()
+
+class JobSlots:
+    """Limita as requisições processadas ao mesmo tempo e quantas podem aguardar por uma vaga."""
+
+    def __init__(self, max_jobs, max_waiting):
+        self.semaphore = asyncio.Semaphore(max_jobs)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.active = 0
+
+    async def acquire(self):
+        if self.waiting >= self.max_waiting:
+            raise web.HTTPServiceUnavailable(text=json.dumps({"error": "Serviço ocupado; tente novamente."}), content_type="application/json")
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+async def run_streaming(app, work):
+    """
+    Executa work(emit) no pool compartilhado e entrega, no loop, os itens passados a emit.
+
+    A fila é limitada: se o cliente consome devagar, emit bloqueia a thread de trabalho
+    (backpressure) em vez de acumular tudo na memória. Se o consumo parar (cliente
+    desconectado), a próxima chamada de emit interrompe o trabalho com ProcessingCancelled.
+    Erros do trabalho são entregues como ("error", mensagem).
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue(maxsize=SERVICE_CONFIG["queue_size"])
+    cancelled = threading.Event()
+
+    def emit(item):
+        if cancelled.is_set():
+            raise ProcessingCancelled()
+        asyncio.run_coroutine_threadsafe(items.put(item), loop).result()
+
+    def run():
+        try:
+            work(emit)
+        except ProcessingCancelled:
+            logger.info("Requisição interrompida: cliente desconectado")
+        except Exception as e:
+            logger.error(f"Erro na requisição: {str(e)}")
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(items.put(("error", str(e))), loop).result()
+        finally:
+            asyncio.run_coroutine_threadsafe(items.put(_END), loop).result()
+
+    future = loop.run_in_executor(app["executor"], run)
+    finished = False
+    try:
+        while True:
+            item = await items.get()
+            if item is _END:
+                finished = True
+                break
+            yield item
+    finally:
+        if not finished:
+            # Esvaziar a fila até o fim, para que a thread de trabalho não fique presa em emit
+            cancelled.set()
+            while await items.get() is not _END:
+                pass
+        await future
+
+def _bool(value):
+    return str(value).lower() in ("1", "true", "sim", "yes", "on")
+
+def _document_params(fields):
+    """Valida os campos da requisição e monta os parâmetros de process_document."""
+    prompt_type = fields.get("prompt_type") or DEFAULT_PROMPT_TYPE
+    text_model = fields.get("text_model") or list(TEXT_MODELS.keys())[0]
+    vision_model = fields.get("vision_model") or "Claude 3.5 Sonnet"
+    if prompt_type not in PROMPT_TYPES:
+        raise ValueError(f"prompt_type inválido: {prompt_type}")
+    if text_model not in TEXT_MODELS:
+        raise ValueError(f"text_model inválido: {text_model}")
+    if vision_model not in VISION_MODELS:
+        raise ValueError(f"vision_model inválido: {vision_model}")
+    ocr = _bool(fields.get("ocr", False))
+    if ocr and not ocr_available():
+        raise ValueError("OCR local indisponível neste servidor (pytesseract/Tesseract não instalados).")
+    text_prompt, vision_prompt = get_prompts(prompt_type)
+    return {
+        "prompt_type": prompt_type,
+        "text_model": text_model,
+        "vision_model": vision_model,
+        "prompt": fields.get("prompt") or text_prompt,
+        "vision_prompt": fields.get("vision_prompt") or vision_prompt,
+        "chunk_size": int(fields.get("chunk_size") or 500),
+        "pipeline": _bool(fields.get("pipeline", False)),
+        "ocr": ocr
+    }
+
+async def _read_process_request(request, upload_dir):
+    """Lê campos e PDFs (multipart) ou um JSON com "text"; os PDFs são gravados em upload_dir."""
+    if request.content_type == "application/json":
+        return await request.json(), []
+
+    fields, file_paths = {}, []
+    reader = await request.multipart()
+    async for part in reader:
+        if part.filename:
+            path = os.path.join(upload_dir, f"{len(file_paths):03d}_{os.path.basename(part.filename)}")
+            with open(path, "wb") as f:
+                while True:
+                    data = await part.read_chunk()
+                    if not data:
+                        break
+                    f.write(data)
+            file_paths.append(path)
+        else:
+            fields[part.name] = await part.text()
+    return fields, file_paths
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+async def handle_process(request):
+    """
+    POST /process: processa PDFs (multipart, campo "files") ou texto (JSON ou campo "text").
+
+    A resposta é um fluxo SSE com os eventos "status", "progress", "chunk" (cada pedaço
+    processado, na ordem, assim que fica pronto), "done" (texto completo) ou "error".
+    """
+    upload_dir = tempfile.mkdtemp(prefix="upload_")
+    try:
+        try:
+            fields, file_paths = await _read_process_request(request, upload_dir)
+            params = _document_params(fields)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+        text = (fields.get("text") or "").strip()
+        if not file_paths and not text:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "Envie PDFs no campo files ou um texto."}), content_type="application/json")
+
+        slots = request.app["slots"]
+        await slots.acquire()
+        try:
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+
+            def work(emit):
+                result = process_document(
+                    params,
+                    file_paths=file_paths,
+                    text=text,
+                    progress_callback=lambda current, total, message: emit(("progress", {"current": current, "total": total, "message": message})),
+                    status_callback=lambda message: emit(("status", {"message": message})),
+                    chunk_callback=lambda index, processed_chunk: emit(("chunk", {"index": index, "text": processed_chunk}))
+                )
+                emit(("done", {"text": result["text"]}))
+
+            try:
+                async with contextlib.aclosing(run_streaming(request.app, work)) as events:
+                    async for event, data in events:
+                        if event == "error":
+                            data = {"message": data}
+                        await response.write(_sse(event, data))
+            except ConnectionResetError:
+                return response
+            await response.write_eof()
+            return response
+        finally:
+            slots.release()
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+def _tts_work(params, tts_dir):
+    """Função bloqueante que sintetiza o áudio e o emite em pedaços à medida que fica pronto."""
+    service = params["service"]
+    text = params["text"]
+    output_format = params["output_format"]
+
+    def work(emit):
+        if service == "openai":
+            # O arquivo cresce na ordem do texto; cada trecho novo é enviado assim que o chunk fica pronto
+            output_path = os.path.join(tts_dir, "audio")
+            sent = [0]
+
+            def send_new(path, ready_chunks=None, total_chunks=None):
+                with open(path, "rb") as f:
+                    f.seek(sent[0])
+                    for data in iter(lambda: f.read(65536), b""):
+                        sent[0] += len(data)
+                        emit(data)
+
+            generate_tts_stream(text, output_path, params["voice"], params["model"], on_audio=send_new,
+                                max_workers=SERVICE_CONFIG["tts_workers"], output_format=output_format)
+            send_new(output_path)
+        elif service == "elevenlabs" and AUDIO_FORMATS[output_format]["elevenlabs"]:
+            # Com prompt_type, o texto passa antes pelo modelo e a resposta vai para a WebSocket
+            # à medida que é escrita; a narração começa antes de o modelo terminar
+            if params.get("process"):
+                process = params["process"]
+                text_stream = stream_in_chunks(TEXT_MODELS[process["text_model"]], process["prompt"], text, process["chunk_size"])
+            else:
+                text_stream = iter([text])
+            session = StreamingTTSSession(params["voice"], params["model"], output_format=output_format)
+            for data in session.stream(text_stream):
+                emit(data)
+        elif service == "elevenlabs":
+            emit(generate_elevenlabs_tts(text, params["voice"], params["model"], language="pt",
+                                         output_format=output_format, max_workers=SERVICE_CONFIG["tts_workers"]))
+        else:
+            emit(generate_local_tts(text, output_format=output_format, max_workers=SERVICE_CONFIG["tts_workers"]))
+    return work
+
+async def handle_tts(request):
+    """
+    POST /tts: JSON {"text", "service" (openai, elevenlabs ou local), "voice", "model", "output_format"}.
+
+    O áudio é devolvido com transferência em partes (chunked), à medida que é gerado.
+    Erros anteriores ao primeiro pedaço de áudio são respondidos com status 502.
+    Na ElevenLabs, "prompt_type" (com "text_model" e "chunk_size" opcionais) processa o texto
+    com o modelo e narra a resposta ao vivo, enquanto ela é escrita.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Corpo JSON inválido."}), content_type="application/json")
+    service = body.get("service", "openai")
+    output_format = body.get("output_format", DEFAULT_AUDIO_FORMAT)
+    text = (body.get("text") or "").strip()
+    if service not in ("openai", "elevenlabs", "local") or output_format not in AUDIO_FORMATS or not text:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "Informe text, service (openai, elevenlabs ou local) e um output_format válido."}), content_type="application/json")
+    defaults = {"openai": ("alloy", "tts-1"), "elevenlabs": ("Rachel", "eleven_flash_v2_5"), "local": (None, None)}[service]
+    voice = body.get("voice") or defaults[0]
+    params = {
+        "service": service,
+        "text": text,
+        # Na ElevenLabs, aceita o nome de uma voz popular ou o ID da voz
+        "voice": POPULAR_VOICES.get(voice, voice) if service == "elevenlabs" else voice,
+        "model": body.get("model") or defaults[1],
+        "output_format": output_format
+    }
+    if body.get("prompt_type"):
+        if service != "elevenlabs" or not AUDIO_FORMATS[output_format]["elevenlabs"]:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "prompt_type só é aceito na narração ao vivo da ElevenLabs (service elevenlabs, formato nativo)."}), content_type="application/json")
+        try:
+            document_params = _document_params(body)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+        params["process"] = {key: document_params[key] for key in ("text_model", "prompt", "chunk_size")}
+
+    tts_dir = tempfile.mkdtemp(prefix="tts_")
+    slots = request.app["slots"]
+    await slots.acquire()
+    try:
+        response = None
+        try:
+            async with contextlib.aclosing(run_streaming(request.app, _tts_work(params, tts_dir))) as chunks:
+                async for item in chunks:
+                    if isinstance(item, tuple):
+                        _, message = item
+                        if response is None:
+                            raise web.HTTPBadGateway(text=json.dumps({"error": message}), content_type="application/json")
+                        # Os cabeçalhos já foram enviados: encerrar a conexão sinaliza o áudio incompleto
+                        logger.error(f"Áudio interrompido: {message}")
+                        request.transport.close()
+                        return response
+                    if response is None:
+                        response = web.StreamResponse(headers={"Content-Type": AUDIO_FORMATS[output_format]["mime"]})
+                        response.enable_chunked_encoding()
+                        await response.prepare(request)
+                    await response.write(item)
+        except ConnectionResetError:
+            return response
+        if response is None:
+            raise web.HTTPBadGateway(text=json.dumps({"error": "Nenhum áudio gerado."}), content_type="application/json")
+        await response.write_eof()
+        return response
+    finally:
+        slots.release()
+        shutil.rmtree(tts_dir, ignore_errors=True)
+
+async def handle_health(request):
+    slots = request.app["slots"]
+    return web.json_response({"status": "ok", "active": slots.active, "waiting": slots.waiting})
+
+@web.middleware
+async def auth_middleware(request, handler):
+    token = SERVICE_CONFIG["token"]
+    if token and request.path != "/health" and request.headers.get("Authorization") != f"Bearer {token}":
+        raise web.HTTPUnauthorized(text=json.dumps({"error": "Token inválido."}), content_type="application/json")
+    return await handler(request)
+
+async def _startup(app):
+    app["slots"] = JobSlots(SERVICE_CONFIG["max_jobs"], SERVICE_CONFIG["max_waiting"])
+
+async def _cleanup(app):
+    app["executor"].shutdown(wait=False, cancel_futures=True)
+
+def create_app():
+    """Aplicação aiohttp: todas as requisições compartilham um único pool de threads de trabalho."""
+    app = web.Application(middlewares=[auth_middleware], client_max_size=SERVICE_CONFIG["max_upload_mb"] * 1024 * 1024)
+    app["executor"] = ThreadPoolExecutor(max_workers=SERVICE_CONFIG["max_jobs"], thread_name_prefix="service-job")
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_cleanup)
+    app.add_routes([
+        web.get("/health", handle_health),
+        web.post("/process", handle_process),
+        web.post("/tts", handle_tts)
+    ])
+    return app
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(), host=SERVICE_CONFIG["host"], port=SERVICE_CONFIG["port"])
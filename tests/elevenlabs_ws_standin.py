@@ -0,0 +1,49 @@
+import base64
+import json
+import threading
+from websockets.sync.server import serve
+
+class ElevenLabsStandIn:
+    """
+    Servidor WebSocket local que imita o endpoint stream-input da ElevenLabs.
+
+    Cada mensagem com `flush` recebe como "áudio" o próprio texto, em bytes, o que permite
+    conferir a ordem dos pedaços; o texto vazio encerra a entrada e é respondido com isFinal.
+    Com silent=True o servidor nunca responde (para testar o tempo limite de recepção).
+    """
+
+    def __init__(self, silent=False):
+        self.silent = silent
+        self.messages = []
+        self.paths = []
+        self.api_keys = []
+
+    def _handler(self, websocket):
+        self.paths.append(websocket.request.path)
+        self.api_keys.append(websocket.request.headers.get("xi-api-key"))
+        for raw in websocket:
+            message = json.loads(raw)
+            self.messages.append(message)
+            if self.silent:
+                continue
+            if message.get("text") == "":
+                websocket.send(json.dumps({"audio": None, "isFinal": True}))
+                return
+            if message.get("flush"):
+                audio = base64.b64encode(message["text"].strip().encode("utf-8")).decode("ascii")
+                websocket.send(json.dumps({"audio": audio, "isFinal": None}))
+
+    @property
+    def url(self):
+        host, port = self.server.socket.getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def __enter__(self):
+        self.server = serve(self._handler, "127.0.0.1", 0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join(timeout=5)
@@ -0,0 +1,98 @@
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+import pytest
+from config.settings import ARTIFACT_CONFIG
+from utils import artifact_store
+from utils.artifact_store import save_artifact, new_artifact, writing_artifact, artifact_url
+
+@pytest.fixture(autouse=True)
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(ARTIFACT_CONFIG, "directory", str(tmp_path))
+    monkeypatch.setitem(ARTIFACT_CONFIG, "public_url", "")
+    # Porta livre escolhida pelo sistema na primeira chamada de ensure_server
+    if artifact_store._server is None:
+        monkeypatch.setitem(ARTIFACT_CONFIG, "port", 0)
+    return tmp_path
+
+def request(url, headers=None, method="GET"):
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=10)
+    path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+    connection.request(method, path, headers=headers or {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+@pytest.fixture
+def artifact():
+    return save_artifact(b"0123456789", "mp3", "aula 1.mp3")
+
+def test_full_download(artifact):
+    response, body = request(artifact_url(artifact))
+    assert response.status == 200
+    assert response.getheader("Content-Length") == "10"
+    assert response.getheader("Accept-Ranges") == "bytes"
+    assert response.getheader("Content-Type") == "audio/mpeg"
+    assert body == b"0123456789"
+
+@pytest.mark.parametrize("range_header, content_range, expected", [
+    ("bytes=2-5", "bytes 2-5/10", b"2345"),
+    ("bytes=7-", "bytes 7-9/10", b"789"),
+    ("bytes=-3", "bytes 7-9/10", b"789"),
+    ("bytes=8-100", "bytes 8-9/10", b"89"),
+    ("bytes=-50", "bytes 0-9/10", b"0123456789"),
+])
+def test_range_requests(artifact, range_header, content_range, expected):
+    response, body = request(artifact_url(artifact), {"Range": range_header})
+    assert response.status == 206
+    assert response.getheader("Content-Range") == content_range
+    assert response.getheader("Content-Length") == str(len(expected))
+    assert body == expected
+
+@pytest.mark.parametrize("range_header", ["bytes=10-", "bytes=5-2", "bytes=-", "items=0-1"])
+def test_unsatisfiable_ranges(artifact, range_header):
+    response, body = request(artifact_url(artifact), {"Range": range_header})
+    assert response.status == 416
+    assert response.getheader("Content-Range") == "bytes */10"
+    assert body == b""
+
+def test_head_sends_headers_only(artifact):
+    response, body = request(artifact_url(artifact), method="HEAD")
+    assert response.status == 200
+    assert response.getheader("Content-Length") == "10"
+    assert body == b""
+
+def test_download_name_is_sanitized(artifact):
+    response, _ = request(artifact_url(artifact, download=True))
+    assert response.getheader("Content-Disposition") == 'attachment; filename="aula_1.mp3"'
+
+@pytest.mark.parametrize("path", ["/nao-existe.mp3", "/../settings.py", f"/{'0' * 32}.mp3"])
+def test_unknown_or_invalid_ids_are_not_found(artifact, path):
+    base = artifact_url(artifact).rsplit("/", 1)[0]
+    response, _ = request(base + path)
+    assert response.status == 404
+
+def test_growing_artifact_is_streamed_until_finished():
+    artifact = new_artifact("mp3")
+    with open(artifact["path"], "wb") as f:
+        f.write(b"AAAA")
+    marker = writing_artifact(artifact)
+    marker.__enter__()
+
+    def writer():
+        for _ in range(3):
+            time.sleep(0.2)
+            with open(artifact["path"], "ab") as f:
+                f.write(b"BBBB")
+        marker.__exit__(None, None, None)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    response, body = request(artifact_url(artifact), {"Range": "bytes=0-"})
+    thread.join()
+    assert response.status == 200
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert body == b"AAAA" + b"BBBB" * 3
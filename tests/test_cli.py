@@ -0,0 +1,61 @@
+import os
+import pytest
+import cli
+from cli import find_inputs, output_names, is_done, process_file
+
+PARAMS = {"document": {"prompt_type": "resumo"}, "tts": None}
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "aula.txt"
+    path.write_text("Texto da aula.", encoding="utf-8")
+    return str(path)
+
+@pytest.fixture
+def finished(source, tmp_path, monkeypatch):
+    # Processa sem chamar as APIs: o pipeline devolve o próprio texto
+    monkeypatch.setattr(cli, "process_document", lambda params, text=None, **kwargs: {"text": text})
+    output_dir = tmp_path / "saida"
+    output_dir.mkdir()
+    result = process_file(source, "aula", PARAMS, str(output_dir))
+    return str(output_dir), result
+
+def test_output_names_suffix_repeated_stems():
+    paths = ["/a/aula.pdf", "/b/aula.pdf", "/c/aula.txt", "/a/outra.pdf"]
+    assert output_names(paths) == {
+        "/a/aula.pdf": "aula",
+        "/b/aula.pdf": "aula_2",
+        "/c/aula.txt": "aula_3",
+        "/a/outra.pdf": "outra"
+    }
+
+def test_find_inputs_expands_directories_and_globs(tmp_path):
+    for name in ["b.pdf", "a.txt", "imagem.png"]:
+        (tmp_path / name).write_bytes(b"x")
+    found = find_inputs([str(tmp_path), str(tmp_path / "*.pdf")])
+    assert found == [str(tmp_path / "a.txt"), str(tmp_path / "b.pdf")]
+
+def test_finished_file_is_done(source, finished):
+    output_dir, result = finished
+    assert open(result["text_path"], encoding="utf-8").read() == "Texto da aula."
+    assert is_done(source, "aula", PARAMS, output_dir)
+    assert not [name for name in os.listdir(output_dir) if name.endswith(".tmp")]
+
+def test_changed_content_or_options_redo_the_file(source, finished):
+    output_dir, _ = finished
+    assert not is_done(source, "aula", dict(PARAMS, document={"prompt_type": "outro"}), output_dir)
+    with open(source, "a", encoding="utf-8") as f:
+        f.write(" Mais texto.")
+    assert not is_done(source, "aula", PARAMS, output_dir)
+
+def test_missing_output_or_marker_redo_the_file(source, finished):
+    output_dir, result = finished
+    os.remove(result["text_path"])
+    assert not is_done(source, "aula", PARAMS, output_dir)
+    assert not is_done(source, "outra", PARAMS, output_dir)
+
+def test_corrupted_marker_is_not_done(source, finished):
+    output_dir, _ = finished
+    with open(os.path.join(output_dir, "aula.done.json"), "w", encoding="utf-8") as f:
+        f.write("{incompleto")
+    assert not is_done(source, "aula", PARAMS, output_dir)
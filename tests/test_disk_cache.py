@@ -0,0 +1,54 @@
+import os
+import time
+from utils.disk_cache import DiskCache, make_key
+
+def test_make_key_is_stable_and_order_independent_for_dicts():
+    assert make_key("a", {"x": 1, "y": 2}) == make_key("a", {"y": 2, "x": 1})
+    assert make_key("a", 1) != make_key("a", "1")
+
+def test_set_get_and_json(tmp_path):
+    cache = DiskCache(str(tmp_path), 10_000)
+    cache.set("ab12", b"dados")
+    cache.set_json("cd34", {"result": "análise"})
+    assert cache.get("ab12") == b"dados"
+    assert cache.get_json("cd34") == {"result": "análise"}
+    assert cache.contains("ab12")
+    assert cache.get("ef56") is None
+
+def test_overwrite_replaces_size(tmp_path):
+    cache = DiskCache(str(tmp_path), 10_000)
+    cache.set("ab12", b"x" * 100)
+    cache.set("ab12", b"x" * 40)
+    assert cache.total_bytes == 40
+    cache.delete("ab12")
+    assert cache.total_bytes == 0
+    assert not cache.contains("ab12")
+
+def test_temporary_files_are_not_entries(tmp_path):
+    os.makedirs(tmp_path / "ab")
+    (tmp_path / "ab" / "escrita.tmp").write_bytes(b"x" * 500)
+    cache = DiskCache(str(tmp_path), 10_000)
+    assert cache.total_bytes == 0
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), 1000)
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.set(key, b"x" * 300)
+        # mtime distinto para cada entrada
+        past = time.time() - 100 + i
+        os.utime(cache._path(key), (past, past))
+    cache.get("aa01")
+    cache.set("dd04", b"x" * 300)
+    assert cache.contains("aa01") and cache.contains("dd04")
+    assert not cache.contains("bb02")
+    assert cache.total_bytes <= 900
+
+def test_eviction_recounts_entries_removed_by_other_processes(tmp_path):
+    cache = DiskCache(str(tmp_path), 1000)
+    cache.set("aa01", b"x" * 600)
+    other = DiskCache(str(tmp_path), 1000)
+    other.delete("aa01")
+    # O total deste processo está desatualizado; a recontagem evita remover entradas à toa
+    cache.set("bb02", b"x" * 500)
+    assert cache.contains("bb02")
+    assert cache.total_bytes == 500
@@ -0,0 +1,40 @@
+import threading
+import time
+import pytest
+from config.settings import TEXT_MODELS
+from utils import document_pipeline
+from utils.document_pipeline import process_document, ProcessingCancelled
+
+PARAMS = {
+    "text_model": next(iter(TEXT_MODELS)),
+    "prompt": "Resuma.",
+    "narration": {"service": "OpenAI", "voice": "alloy", "model": "tts-1"}
+}
+
+def test_cancel_stops_queued_narration(monkeypatch):
+    started = []
+    lock = threading.Lock()
+
+    def fake_tts(text, voice, model):
+        with lock:
+            started.append((time.monotonic(), text))
+        time.sleep(0.1)
+        return b""
+
+    def fake_process_in_chunks(model, prompt, text, chunk_callback=None, **kwargs):
+        # Entrega vários trechos ao narrador e é cancelado antes de terminar
+        for i in range(10):
+            chunk_callback(i, f"Trecho {i}.")
+        raise ProcessingCancelled()
+
+    monkeypatch.setattr(document_pipeline, "generate_tts", fake_tts)
+    monkeypatch.setattr(document_pipeline, "process_in_chunks", fake_process_in_chunks)
+
+    with pytest.raises(ProcessingCancelled):
+        process_document(PARAMS, text="Texto de entrada.")
+    cancelled_at = time.monotonic()
+    time.sleep(0.5)
+
+    # No máximo o trecho que já estava em síntese termina; nenhum outro começa depois do cancelamento
+    assert len(started) <= 1
+    assert all(moment <= cancelled_at for moment, _ in started)
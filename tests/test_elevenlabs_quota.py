@@ -0,0 +1,71 @@
+import pytest
+from config.settings import ELEVENLABS_QUOTA_CONFIG, AUDIO_CACHE_CONFIG
+from utils import elevenlabs_handler
+from utils.elevenlabs_quota import plan_characters, describe_plan
+from utils.document_pipeline import make_narrator
+
+def subscription(remaining, limit, next_reset=None):
+    return {"character_count": limit - remaining, "character_limit": limit, "remaining": remaining, "next_reset": next_reset, "tier": "free"}
+
+@pytest.fixture(autouse=True)
+def no_margin(monkeypatch):
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "safety_margin", 0)
+
+def test_plan_fits_current_quota():
+    plan = plan_characters([100, 0, 200], subscription(1000, 1000))
+    assert plan["fits"]
+    assert plan["billable_characters"] == 300
+    assert plan["cached_chunks"] == 1
+
+def test_plan_splits_across_renewals():
+    plan = plan_characters([400, 400, 400], subscription(500, 1000, next_reset=1_700_000_000))
+    assert not plan["fits"]
+    assert [(w["start_chunk"], w["end_chunk"]) for w in plan["windows"]] == [(0, 1), (1, 3)]
+    assert plan["windows"][1]["available_at"] == 1_700_000_000
+
+@pytest.mark.parametrize("costs, quota, oversized, first_end", [
+    ([100, 5000, 100], subscription(1000, 1000), 1, 1),
+    ([100, 100], subscription(0, 0), 0, 0)
+])
+def test_chunk_larger_than_full_quota_does_not_fit(costs, quota, oversized, first_end):
+    plan = plan_characters(costs, quota)
+    assert not plan["fits"]
+    assert plan["oversized_chunk"] == oversized
+    assert plan["windows"][0]["end_chunk"] == first_end
+    assert "excede a cota total" in describe_plan(plan)
+
+@pytest.fixture
+def elevenlabs(monkeypatch):
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "enabled", True)
+    monkeypatch.setitem(AUDIO_CACHE_CONFIG, "enabled", False)
+    monkeypatch.setattr(elevenlabs_handler, "ELEVENLABS_API_KEY", "chave")
+    monkeypatch.setattr(elevenlabs_handler, "get_elevenlabs_client", lambda *args: None)
+    monkeypatch.setattr(elevenlabs_handler, "get_subscription", lambda api_key: subscription(0, 0))
+    synthesized = []
+    monkeypatch.setattr(elevenlabs_handler, "_convert_chunk", lambda client, chunk, *args: synthesized.append(chunk) or b"")
+    return synthesized
+
+def test_zero_limit_only_warns_under_warn_policy(elevenlabs, monkeypatch):
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "policy", "warn")
+    elevenlabs_handler.generate_elevenlabs_tts("Uma frase.", "voz123")
+    assert elevenlabs == ["Uma frase."]
+
+def test_zero_limit_is_refused_under_refuse_policy(elevenlabs, monkeypatch):
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "policy", "refuse")
+    with pytest.raises(ValueError, match="Cota insuficiente"):
+        elevenlabs_handler.generate_elevenlabs_tts("Uma frase.", "voz123")
+    assert elevenlabs == []
+
+def test_narration_checks_quota_once(elevenlabs, monkeypatch):
+    calls = []
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "policy", "refuse")
+    monkeypatch.setattr(elevenlabs_handler, "get_subscription", lambda api_key: calls.append(api_key) or subscription(30, 1000))
+
+    narrator = make_narrator({"service": "ElevenLabs", "voice": "voz123", "model": "eleven_flash_v2_5"})
+    for text in ["Primeira frase.", "Segunda frase!", "Terceira frase."]:
+        narrator.submit(text)
+    # A cota consultada no início é descontada localmente: o terceiro trecho já não cabe
+    with pytest.raises(Exception, match="trecho 3"):
+        narrator.finish()
+    assert calls == ["chave"]
+    assert elevenlabs == ["Primeira frase.", "Segunda frase!"]
@@ -0,0 +1,52 @@
+import pytest
+from config.settings import ELEVENLABS_STREAM_CONFIG
+from utils import api_handler
+from utils.api_handler import stream_in_chunks
+from utils.elevenlabs_stream import StreamingTTSSession
+from elevenlabs_ws_standin import ElevenLabsStandIn
+
+def test_audio_chunks_follow_sentence_order():
+    pieces = ["Primeira fra", "se. Segunda", " frase! Terceira sem ponto"]
+    with ElevenLabsStandIn() as standin:
+        session = StreamingTTSSession("voz123", "eleven_flash_v2_5", base_url=standin.url, api_key="chave")
+        audio = list(session.stream(iter(pieces)))
+
+    assert audio == [b"Primeira frase.", b"Segunda frase!", b"Terceira sem ponto"]
+    assert standin.paths[0].startswith("/v1/text-to-speech/voz123/stream-input?")
+    assert "model_id=eleven_flash_v2_5" in standin.paths[0]
+    assert standin.api_keys == ["chave"]
+    assert session.audio_bytes == sum(len(chunk) for chunk in audio)
+
+def test_trailing_text_is_flushed_before_end_of_input():
+    with ElevenLabsStandIn() as standin:
+        session = StreamingTTSSession("voz123", base_url=standin.url, api_key="chave")
+        list(session.stream(iter(["Uma frase. ", "Resto sem pontuação"])))
+
+    # Mensagem inicial (configurações), frases com flush e, por fim, o texto vazio
+    assert standin.messages[0]["text"] == " " and "voice_settings" in standin.messages[0]
+    sent = standin.messages[1:-1]
+    assert [message["text"].strip() for message in sent] == ["Uma frase.", "Resto sem pontuação"]
+    assert all(message.get("flush") for message in sent)
+    assert standin.messages[-1] == {"text": ""}
+
+def test_silent_server_hits_receive_timeout(monkeypatch):
+    monkeypatch.setitem(ELEVENLABS_STREAM_CONFIG, "receive_timeout", 0.5)
+    with ElevenLabsStandIn(silent=True) as standin:
+        session = StreamingTTSSession("voz123", base_url=standin.url, api_key="chave")
+        with pytest.raises(TimeoutError):
+            list(session.stream(iter(["Sem resposta."])))
+
+def test_model_tokens_stream_into_the_session(monkeypatch):
+    def fake_stream_chunk(model, prompt, chunk, thinking=None):
+        # Resposta do modelo em tokens pequenos, cortando as frases no meio
+        answer = f"Resumo de {chunk.split()[0]}. Fim do pedaço."
+        for i in range(0, len(answer), 4):
+            yield answer[i:i + 4]
+
+    monkeypatch.setattr(api_handler, "stream_chunk", fake_stream_chunk)
+    text = "um dois três quatro"
+    with ElevenLabsStandIn() as standin:
+        session = StreamingTTSSession("voz123", base_url=standin.url, api_key="chave")
+        audio = list(session.stream(stream_in_chunks("modelo", "Resuma.", text, chunk_size_words=2)))
+
+    assert [chunk.decode("utf-8") for chunk in audio] == ["Resumo de um.", "Fim do pedaço.", "Resumo de três.", "Fim do pedaço."]
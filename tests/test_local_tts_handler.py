@@ -0,0 +1,45 @@
+import pytest
+from config.settings import ELEVENLABS_QUOTA_CONFIG, AUDIO_CACHE_CONFIG
+from utils import elevenlabs_handler, local_tts_handler
+from utils.local_tts_handler import generate_with_fallback
+
+@pytest.fixture
+def local_tts(monkeypatch):
+    # Piper "instalado": registra os textos narrados localmente
+    narrated = []
+    monkeypatch.setattr(local_tts_handler, "local_tts_available", lambda model_path=None: True)
+    monkeypatch.setattr(local_tts_handler, "generate_local_tts", lambda text, callback=None, output_format="wav": narrated.append(text) or b"local")
+    return narrated
+
+def test_remote_api_failure_falls_back_to_local(local_tts):
+    def generate():
+        raise Exception("Erro na API da ElevenLabs: 429 Too Many Requests")
+
+    audio, audio_format = generate_with_fallback(generate, "Texto.", output_format="mp3")
+    assert audio == b"local"
+    assert local_tts == ["Texto."]
+
+def test_invalid_input_is_not_narrated_locally(local_tts):
+    def generate():
+        raise ValueError("Texto vazio fornecido para geração de áudio")
+
+    with pytest.raises(ValueError):
+        generate_with_fallback(generate, "")
+    assert local_tts == []
+
+def test_quota_refusal_is_not_narrated_locally(local_tts, monkeypatch):
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "enabled", True)
+    monkeypatch.setitem(ELEVENLABS_QUOTA_CONFIG, "policy", "refuse")
+    monkeypatch.setitem(AUDIO_CACHE_CONFIG, "enabled", False)
+    monkeypatch.setattr(elevenlabs_handler, "ELEVENLABS_API_KEY", "chave")
+    monkeypatch.setattr(elevenlabs_handler, "get_subscription", lambda api_key: {
+        "character_count": 9990, "character_limit": 10000, "remaining": 10, "next_reset": None, "tier": "free"
+    })
+    synthesized = []
+    monkeypatch.setattr(elevenlabs_handler, "_convert_chunk", lambda *args: synthesized.append(args) or b"audio")
+
+    text = "Uma frase longa o bastante para passar da cota restante."
+    with pytest.raises(ValueError, match="Cota insuficiente"):
+        generate_with_fallback(lambda: elevenlabs_handler.generate_elevenlabs_tts(text, "voz123"), text)
+    assert local_tts == []
+    assert synthesized == []
@@ -0,0 +1,73 @@
+import io
+import struct
+from utils.mp3_splicer import Mp3Splicer, concat_mp3, parse_frame_header
+
+# MPEG-1 Layer III, 128 kbps, 44,1 kHz, estéreo: 417 bytes por quadro
+HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+FRAME_LENGTH = 417
+
+def audio_frame(fill):
+    return HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+def info_frame():
+    frame = bytearray(audio_frame(0))
+    frame[36:40] = b"Info"
+    return bytes(frame)
+
+def id3_tag(payload=b"x" * 20):
+    size = len(payload)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + payload
+
+def segment(fills):
+    return id3_tag() + info_frame() + b"".join(audio_frame(fill) for fill in fills)
+
+def frames_of(data):
+    frames = []
+    pos = 0
+    while pos < len(data):
+        header = parse_frame_header(data, pos)
+        assert header is not None
+        frames.append(data[pos:pos + header["length"]])
+        pos += header["length"]
+    return frames
+
+def test_parse_frame_header():
+    header = parse_frame_header(audio_frame(1))
+    assert header["sample_rate"] == 44100
+    assert header["length"] == FRAME_LENGTH
+    assert header["samples"] == 1152
+    assert parse_frame_header(b"\x00" * 4) is None
+
+def test_concat_keeps_only_audio_frames_in_order():
+    output = concat_mp3([segment([1, 2]), segment([3]), id3_tag() + audio_frame(4) + b"TAG" + b"\x00" * 125])
+    frames = frames_of(output)
+    # Um cabeçalho Xing/Info novo seguido dos quadros de áudio de todos os segmentos
+    assert frames[1:] == [audio_frame(fill) for fill in (1, 2, 3, 4)]
+    assert b"Info" in frames[0][:40]
+
+def test_xing_header_counts_frames_and_bytes():
+    output = concat_mp3([segment([1, 2, 3]), segment([4, 5])])
+    header = frames_of(output)[0]
+    offset = 4 + 32
+    flags, total_frames, total_bytes = struct.unpack(">III", header[offset + 4:offset + 16])
+    assert flags == 0x0F
+    assert total_frames == 5
+    assert total_bytes == len(output)
+    toc = header[offset + 16:offset + 116]
+    assert list(toc) == sorted(toc)
+
+def test_feed_accepts_arbitrary_pieces_and_drops_partial_frames():
+    data = segment([1, 2, 3]) + audio_frame(9)[:100]
+    output = io.BytesIO()
+    splicer = Mp3Splicer(output)
+    splicer.start_segment()
+    for i in range(0, len(data), 37):
+        splicer.feed(data[i:i + 37])
+    splicer.finish()
+    assert frames_of(output.getvalue())[1:] == [audio_frame(fill) for fill in (1, 2, 3)]
+    assert abs(splicer.duration - 3 * 1152 / 44100) < 1e-9
+
+def test_empty_input_produces_empty_output():
+    assert concat_mp3([]) == b""
+    assert concat_mp3([id3_tag()]) == b""
@@ -0,0 +1,88 @@
+import random
+import pytest
+from utils.text_segmenter import (
+    split_sentences, split_long_sentence, pack_sentences, pack_sentences_stable,
+    split_text_into_stable_chunks, pop_complete_sentences
+)
+
+def make_sentences(count, seed=1):
+    rng = random.Random(seed)
+    words = "neurologia cérebro paciente exame sintoma diagnóstico tratamento lesão córtex memória".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 30))).capitalize() + "." for _ in range(count)]
+
+def test_stable_chunks_respect_limit_and_keep_text():
+    sentences = make_sentences(300)
+    chunks = pack_sentences_stable(sentences, 1000)
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert " ".join(chunks) == " ".join(sentences)
+
+def test_edit_near_start_keeps_later_chunks():
+    sentences = make_sentences(300)
+    original = pack_sentences_stable(sentences, 1000)
+    edited = pack_sentences_stable(sentences[:3] + ["Uma frase nova inserida no começo do texto."] + sentences[3:], 1000)
+    # Só os chunks perto da edição mudam; o restante reaproveita o cache de áudio
+    assert original[-1] == edited[-1]
+    assert len(set(original) - set(edited)) <= 2
+
+@pytest.mark.parametrize("limit", [4096, 3000, 1000])
+def test_stable_chunks_stay_close_to_greedy_count(limit):
+    sentences = make_sentences(1200)
+    stable = pack_sentences_stable(sentences, limit)
+    greedy = pack_sentences(sentences, limit)
+    # Fronteiras estáveis custam poucas requisições a mais que o empacotamento guloso
+    assert len(stable) <= 1.2 * len(greedy)
+    assert sum(map(len, stable)) / len(stable) >= 0.8 * limit
+
+def test_edits_anywhere_change_few_chunks():
+    sentences = make_sentences(1200)
+    original = pack_sentences_stable(sentences, 3000)
+    for position in range(0, 1200, 97):
+        edited = pack_sentences_stable(sentences[:position] + ["Uma frase nova no meio do texto."] + sentences[position:], 3000)
+        assert len(set(edited) - set(original)) <= 6
+
+def test_stable_chunks_split_long_sentences():
+    long_sentence = ", ".join(["uma oração sem ponto final"] * 80) + "."
+    chunks = split_text_into_stable_chunks(long_sentence, 300)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 for chunk in chunks)
+
+def test_stable_chunks_are_deterministic():
+    text = " ".join(make_sentences(100, seed=7))
+    assert split_text_into_stable_chunks(text, 800) == split_text_into_stable_chunks(text, 800)
+    assert split_sentences(text) == make_sentences(100, seed=7)
+
+@pytest.mark.parametrize("text, expected", [
+    ("O Dr. Silva chegou. Ele examinou o paciente.", ["O Dr. Silva chegou.", "Ele examinou o paciente."]),
+    ("Veja a fig. 3 e o cap. 2. Depois, leia.", ["Veja a fig. 3 e o cap. 2.", "Depois, leia."]),
+    ("Segundo J. Silva, funciona. Ótimo resultado.", ["Segundo J. Silva, funciona.", "Ótimo resultado."]),
+    ("Era tarde. É sempre assim. Última frase", ["Era tarde.", "É sempre assim.", "Última frase"]),
+    ("Ele perguntou: vem? — Vou, respondeu.", ["Ele perguntou: vem?", "— Vou, respondeu."]),
+    ("Ela disse \"basta.\" Então saiu.", ["Ela disse \"basta.\"", "Então saiu."]),
+    ("Pensou... Depois decidiu!", ["Pensou...", "Depois decidiu!"]),
+    ("o valor é 3.5 mm. em média", ["o valor é 3.5 mm. em média"]),
+])
+def test_split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+def test_split_long_sentence_prefers_strongest_pause():
+    sentence = "primeira parte longa o bastante; segunda parte, com vírgula, e mais texto até o fim"
+    pieces = split_long_sentence(sentence, 50)
+    assert pieces[0] == "primeira parte longa o bastante;"
+    assert all(len(piece) <= 50 for piece in pieces)
+    assert " ".join(pieces) == sentence
+
+def test_split_long_sentence_without_pauses_cuts_at_limit():
+    pieces = split_long_sentence("x" * 25, 10)
+    assert pieces == ["x" * 10, "x" * 10, "x" * 5]
+
+def test_pack_sentences_is_greedy_and_respects_limit():
+    sentences = ["Aaaa.", "Bbbb.", "Cccc.", "Dddd."]
+    assert pack_sentences(sentences, 11) == ["Aaaa. Bbbb.", "Cccc. Dddd."]
+    assert pack_sentences(sentences, 5) == sentences
+    assert pack_sentences([], 10) == []
+
+def test_pop_complete_sentences_keeps_open_sentence():
+    assert pop_complete_sentences("Uma frase. Outra em and") == ("Uma frase.", "Outra em and")
+    # O ponto pode ser de abreviação enquanto a próxima frase não começar
+    assert pop_complete_sentences("Falou com o Dr. ") == ("", "Falou com o Dr. ")
+    assert pop_complete_sentences("Primeira. Segunda! Ter") == ("Primeira. Segunda!", "Ter")
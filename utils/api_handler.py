@@ -1,19 +1,30 @@
 import requests
 import json
-import base64
-import io
-from PIL import Image
+import logging
 import anthropic
-from config.settings import OPENROUTER_API_KEY, ANTHROPIC_API_KEY, VISION_MODELS, CLAUDE_37_SONNET_CONFIG
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from config.settings import OPENROUTER_API_KEY, ANTHROPIC_API_KEY, VISION_MODELS, VISION_BATCH_CONFIG, VISION_CACHE_CONFIG
+from utils.image_encoder import preprocess_images, summarize_timings
+from utils.vision_cache import encode_images_cached, get_analysis, set_analysis, thinking_settings
 
-def process_chunk(model, prompt, chunk):
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=4)
+def get_anthropic_client(api_key=ANTHROPIC_API_KEY):
+    """Cliente da Anthropic reaproveitado entre chamadas (mantém o pool de conexões HTTP)."""
+    return anthropic.Anthropic(api_key=api_key)
+
+def process_chunk(model, prompt, chunk, thinking=None):
     # Verificar se é um modelo Claude (não contém "/")
     if "/" not in model and model.startswith("claude"):
         # Usar a API da Anthropic diretamente para modelos Claude
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+        client = get_anthropic_client()
         
         # Verificar se é o Claude 3.7 Sonnet para usar pensamento estendido
-        if model == CLAUDE_37_SONNET_CONFIG["model_id"] and CLAUDE_37_SONNET_CONFIG["extended_thinking"]:
+        if thinking_settings(model, thinking)["extended_thinking"]:
             message = client.messages.create(
                 model=model,
                 max_tokens=1600,
@@ -92,7 +103,68 @@ def process_chunk(model, prompt, chunk):
         
         return response_data["choices"][0]["message"]["content"]
 
-def process_in_chunks(model, prompt, text, chunk_size_words=500, progress_callback=None):
+def stream_chunk(model, prompt, chunk, thinking=None):
+    """
+    Processa um pedaço de texto devolvendo a resposta do modelo aos poucos, à medida que é gerada.
+
+    Usado na narração ao vivo, em que o TTS começa antes de o modelo terminar de escrever.
+    O pensamento estendido do Claude 3.7 não é incluído, pois não deve ser narrado.
+
+    Yields:
+        str: Trechos de texto da resposta, na ordem
+    """
+    if "/" not in model and model.startswith("claude"):
+        client = get_anthropic_client()
+        
+        options = {"temperature": 0.7}
+        if thinking_settings(model, thinking)["extended_thinking"]:
+            options = {"temperature": 1, "thinking": {"type": "enabled", "budget_tokens": 1024}}
+        
+        with client.messages.stream(
+            model=model,
+            max_tokens=1600,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"{prompt}\n\n{chunk}"
+                }
+            ],
+            **options
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+    else:
+        url = "https://openrouter.ai/api/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": f"{prompt}\n\n{chunk}"}
+            ],
+            "stream": True
+        }
+        with requests.post(url, headers=headers, data=json.dumps(payload), stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(f"Erro na API: {response.status_code} - {response.text}")
+            
+            # Server-sent events: linhas "data: {...}" até "data: [DONE]"; linhas com ":" são comentários
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if "error" in event:
+                    raise Exception(f"Erro na API: {json.dumps(event['error'])}")
+                delta = event["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+def process_in_chunks(model, prompt, text, chunk_size_words=500, progress_callback=None, chunk_callback=None, thinking=None):
     words = text.split()
     chunks = [" ".join(words[i:i + chunk_size_words]) for i in range(0, len(words), chunk_size_words)]
     total_chunks = len(chunks)
@@ -102,8 +174,11 @@ def process_in_chunks(model, prompt, text, chunk_size_words=500, progress_callba
         if progress_callback:
             progress_callback(i + 1, total_chunks, f"Processando pedaço {i + 1} de {total_chunks} ({len(chunk.split())} palavras)")
         try:
-            processed_chunk = process_chunk(model, prompt, chunk)
+            processed_chunk = process_chunk(model, prompt, chunk, thinking)
             processed_chunks.append(processed_chunk)
+            # Permite que etapas seguintes (ex.: TTS) comecem antes do fim do processamento
+            if chunk_callback:
+                chunk_callback(i + 1, processed_chunk)
         except Exception as e:
             if progress_callback:
                 progress_callback(i + 1, total_chunks, f"Erro no pedaço {i + 1}: {str(e)}")
@@ -111,37 +186,67 @@ def process_in_chunks(model, prompt, text, chunk_size_words=500, progress_callba
     
     return "\n\n".join(processed_chunks)
 
-def resize_image(image, max_long_edge=1568):
-    """Redimensiona a imagem para não exceder 1568px no lado mais longo, mantendo a proporção."""
-    width, height = image.size
-    if max(width, height) > max_long_edge:
-        if width > height:
-            new_width = max_long_edge
-            new_height = int((new_width / width) * height)
-        else:
-            new_height = max_long_edge
-            new_width = int((new_height / height) * width)
-        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    return image
+def stream_in_chunks(model, prompt, text, chunk_size_words=500, thinking=None):
+    """
+    Processa o texto em pedaços, como process_in_chunks, devolvendo a resposta aos poucos.
+
+    Os trechos de stream_chunk de cada pedaço são repassados assim que chegam, na ordem,
+    para alimentar a narração ao vivo (ver elevenlabs_stream.StreamingTTSSession).
 
-def process_images(model, prompt, images, progress_callback=None):
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    Yields:
+        str: Trechos de texto da resposta; os pedaços são separados por uma linha em branco
+    """
+    words = text.split()
+    chunks = [" ".join(words[i:i + chunk_size_words]) for i in range(0, len(words), chunk_size_words)]
+    for i, chunk in enumerate(chunks):
+        if i > 0:
+            yield "\n\n"
+        yield from stream_chunk(model, prompt, chunk, thinking)
+
+def batch_images(encoded_images, max_images=None, max_bytes=None):
+    """
+    Agrupa imagens codificadas em lotes limitados por quantidade e tamanho, preservando a ordem.
+    
+    Args:
+        encoded_images (list): Imagens no formato retornado por preprocess_image
+        max_images (int): Máximo de imagens por requisição
+        max_bytes (int): Máximo de bytes (base64) por requisição
+        
+    Returns:
+        list: Lista de lotes, cada um com os índices das imagens
+    """
+    max_images = max_images or VISION_BATCH_CONFIG["max_images_per_batch"]
+    max_bytes = max_bytes or VISION_BATCH_CONFIG["max_batch_bytes"]
+    
+    batches = []
+    current_batch = []
+    current_bytes = 0
+    for i, encoded in enumerate(encoded_images):
+        size = len(encoded["data"])
+        if current_batch and (len(current_batch) >= max_images or current_bytes + size > max_bytes):
+            batches.append(current_batch)
+            current_batch = []
+            current_bytes = 0
+        current_batch.append(i)
+        current_bytes += size
+    
+    if current_batch:
+        batches.append(current_batch)
     
+    return batches
+
+def analyze_image_batch(client, model, prompt, encoded_images, indices, thinking=None):
+    """Envia um lote de imagens em uma única mensagem e retorna a análise (com o pensamento estendido, se houver)."""
     # Preparar o conteúdo da mensagem no formato correto
     content = []
-    for i, img in enumerate(images):
-        resized_img = resize_image(img)
-        buffered = io.BytesIO()
-        resized_img.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        
+    for i in indices:
         # Adicionar a imagem como um item de conteúdo
         content.append({
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
-                "data": img_base64
+                "media_type": encoded_images[i]["media_type"],
+                "data": encoded_images[i]["data"]
             }
         })
         
@@ -157,14 +262,8 @@ def process_images(model, prompt, images, progress_callback=None):
         "text": prompt
     })
     
-    if progress_callback:
-        progress_callback(1, 1, "Enviando imagens para análise de visão via Anthropic SDK...")
-    
     # Verificar se é o modelo Claude 3.7 Sonnet para usar pensamento estendido
-    if model == CLAUDE_37_SONNET_CONFIG["model_id"] and CLAUDE_37_SONNET_CONFIG["extended_thinking"]:
-        if progress_callback:
-            progress_callback(1, 1, f"Utilizando pensamento estendido com Claude 3.7 Sonnet (limite: {CLAUDE_37_SONNET_CONFIG['thinking_tokens_limit']} tokens)...")
-        
+    if thinking_settings(model, thinking)["extended_thinking"]:
         message = client.messages.create(
             model=model,
             max_tokens=1600,
@@ -195,8 +294,6 @@ def process_images(model, prompt, images, progress_callback=None):
         
         # Adicionar o pensamento estendido ao final, se disponível
         if thinking_content:
-            if progress_callback:
-                progress_callback(1, 1, "Pensamento estendido detectado e incluído na resposta.")
             return result + thinking_content
         return result
     else:
@@ -218,4 +315,107 @@ def process_images(model, prompt, images, progress_callback=None):
         if block.type == "text":
             result += block.text
     
-    return result
\ No newline at end of file
+    return result
+
+def _images_label(indices):
+    """Rótulo de um grupo de imagens, usado ao juntar as análises."""
+    if len(indices) == 1:
+        return f"Imagem {indices[0] + 1}"
+    if indices[-1] - indices[0] == len(indices) - 1:
+        return f"Imagens {indices[0] + 1} a {indices[-1] + 1}"
+    return "Imagens " + ", ".join(str(i + 1) for i in indices)
+
+def process_images(model, prompt, images, progress_callback=None, executor=None, thinking=None):
+    """
+    Analisa imagens com o modelo de visão, em lotes simultâneos, reaproveitando o cache de visão.
+
+    Args:
+        model (str): ID do modelo de visão
+        prompt (str): Prompt de visão
+        images (list): Imagens (PIL), na ordem das páginas
+        progress_callback (function): Callback (current, total, message), chamado na thread chamadora
+        executor (ThreadPoolExecutor): Pool compartilhado para os lotes (ex.: o orçamento comum a
+            vários documentos); por padrão, um pool próprio com VISION_BATCH_CONFIG["max_concurrency"]
+        thinking (dict): Pensamento estendido desta requisição (ver vision_cache.thinking_settings)
+
+    Returns:
+        str: Análises das imagens, na ordem
+    """
+    client = get_anthropic_client()
+    use_cache = VISION_CACHE_CONFIG["enabled"]
+    
+    # Análises prontas, indexadas pela primeira imagem de cada grupo: {índice: (índices, análise)}
+    segments = {}
+    if use_cache:
+        hashes, encoded_images, timings = encode_images_cached(images)
+        # Figuras que já foram analisadas isoladamente (ex.: imagens que se repetem entre documentos)
+        for i, h in enumerate(hashes):
+            cached = get_analysis([h], prompt, model, thinking)
+            if cached is not None:
+                segments[i] = ([i], cached)
+    else:
+        hashes = None
+        encoded_images, timings = preprocess_images(images)
+    
+    timings_summary = summarize_timings(timings)
+    logger.info(timings_summary)
+    for i, image_timings in enumerate(timings):
+        logger.debug(f"Imagem {i + 1}: {image_timings}")
+    
+    pending = [i for i in range(len(images)) if i not in segments]
+    batches = [[pending[j] for j in batch] for batch in batch_images([encoded_images[i] for i in pending])]
+    
+    if use_cache:
+        # Lotes idênticos a lotes já analisados
+        for indices in list(batches):
+            cached = get_analysis([hashes[i] for i in indices], prompt, model, thinking)
+            if cached is not None:
+                segments[indices[0]] = (indices, cached)
+                batches.remove(indices)
+    
+    total_batches = len(batches)
+    if segments:
+        logger.info(f"{sum(len(indices) for indices, _ in segments.values())} imagens reaproveitadas do cache de visão")
+    
+    # Sem lotes (tudo veio do cache de visão) não há progresso a relatar
+    if progress_callback and total_batches:
+        progress_callback(0, total_batches, timings_summary)
+        if segments:
+            progress_callback(0, total_batches, f"{sum(len(indices) for indices, _ in segments.values())} imagens reaproveitadas do cache de visão.")
+        progress_callback(0, total_batches, f"Enviando {len(images)} imagens em {total_batches} lote(s) para análise de visão via Anthropic SDK...")
+        thinking_options = thinking_settings(model, thinking)
+        if thinking_options["extended_thinking"]:
+            progress_callback(0, total_batches, f"Utilizando pensamento estendido com Claude 3.7 Sonnet (limite: {thinking_options['thinking_tokens_limit']} tokens)...")
+    
+    # Os lotes são enviados simultaneamente; o progresso é reportado na thread chamadora
+    completed = 0
+    with nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=VISION_BATCH_CONFIG["max_concurrency"]) as executor:
+        futures = {
+            executor.submit(analyze_image_batch, client, model, prompt, encoded_images, indices, thinking): b
+            for b, indices in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            b = futures[future]
+            indices = batches[b]
+            completed += 1
+            try:
+                result = future.result()
+                segments[indices[0]] = (indices, result)
+                if use_cache:
+                    set_analysis([hashes[i] for i in indices], prompt, model, result, thinking)
+                if progress_callback:
+                    progress_callback(completed, total_batches, f"Lote {b + 1} de {total_batches} analisado ({_images_label(indices).lower()})")
+            except Exception as e:
+                if progress_callback:
+                    progress_callback(completed, total_batches, f"Erro no lote {b + 1}: {str(e)}")
+                segments[indices[0]] = (indices, f"[Erro no lote de {_images_label(indices).lower()}: {str(e)}]")
+    
+    ordered = [segments[first] for first in sorted(segments)]
+    if len(ordered) == 1:
+        return ordered[0][1]
+    
+    # Juntar as análises na ordem das imagens (e, portanto, das páginas)
+    return "\n\n".join(
+        f"{_images_label(indices)}:\n{result}"
+        for indices, result in ordered
+    )
\ No newline at end of file
@@ -0,0 +1,278 @@
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+from config.settings import ARTIFACT_CONFIG
+from utils.audio_formats import AUDIO_FORMATS
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Tipo MIME por extensão dos arquivos de áudio gerados
+MIME_TYPES = {audio_format["extension"]: audio_format["mime"] for audio_format in AUDIO_FORMATS.values()}
+
+# Identificadores aleatórios (não adivinháveis) com extensão; qualquer outro caminho é recusado pelo servidor
+_ARTIFACT_ID = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]+$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.\-]")
+
+_server = None
+_server_lock = threading.Lock()
+_last_cleanup = 0.0
+
+def _directory():
+    directory = os.path.abspath(ARTIFACT_CONFIG["directory"])
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def new_artifact(extension, download_name=None):
+    """
+    Reserva um arquivo para um novo artefato de áudio, que pode ser gravado progressivamente.
+
+    Args:
+        extension (str): Extensão do arquivo (mp3, ogg, aac, pcm)
+        download_name (str): Nome sugerido ao baixar o arquivo
+
+    Returns:
+        dict: Referência leve ao artefato (id, caminho, tipo MIME e nome para download)
+    """
+    _cleanup_if_due()
+    artifact_id = f"{uuid.uuid4().hex}.{extension}"
+    return {
+        "id": artifact_id,
+        "path": os.path.join(_directory(), artifact_id),
+        "mime": MIME_TYPES.get(extension, "application/octet-stream"),
+        "download_name": download_name or f"audio.{extension}"
+    }
+
+def save_artifact(data, extension, download_name=None):
+    """Grava bytes de áudio em um novo artefato e devolve a referência a ele."""
+    artifact = new_artifact(extension, download_name)
+    with open(artifact["path"], "wb") as f:
+        f.write(data)
+    return artifact
+
+@contextmanager
+def writing_artifact(artifact):
+    """
+    Marca o artefato como em gravação enquanto o bloco executa.
+
+    Durante a gravação o servidor entrega o arquivo em uma resposta sem tamanho definido
+    (Transfer-Encoding: chunked) que acompanha o crescimento do arquivo, de modo que o
+    player toca o áudio até o fim mesmo que tenha sido aberto após o primeiro trecho.
+    """
+    marker = _writing_marker(artifact["path"])
+    open(marker, "w").close()
+    try:
+        yield artifact
+    finally:
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+
+def _writing_marker(path):
+    return f"{path}.writing"
+
+def artifact_exists(artifact):
+    return bool(artifact) and os.path.exists(artifact["path"])
+
+def artifact_url(artifact, download=False):
+    """URL do artefato no servidor local de áudio (iniciado na primeira chamada)."""
+    base_url = ensure_server()
+    url = f"{base_url}/{artifact['id']}"
+    if download:
+        url += f"?download={quote(artifact['download_name'])}"
+    return url
+
+def cleanup_artifacts(max_age_hours=None):
+    """Remove artefatos mais antigos que max_age_hours."""
+    max_age_hours = max_age_hours if max_age_hours is not None else ARTIFACT_CONFIG["max_age_hours"]
+    limit = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(_directory()):
+        path = os.path.join(_directory(), name)
+        try:
+            # Marcadores de gravação abandonados (processo interrompido) também são removidos
+            if _ARTIFACT_ID.match(name.removesuffix(".writing")) and os.path.getmtime(path) < limit:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"{removed} artefatos de áudio antigos removidos")
+    return removed
+
+def _cleanup_if_due():
+    # A limpeza roda no máximo uma vez por hora, ao criar novos artefatos
+    global _last_cleanup
+    if time.time() - _last_cleanup > 3600:
+        _last_cleanup = time.time()
+        cleanup_artifacts()
+
+class _ArtifactHandler(BaseHTTPRequestHandler):
+    """Serve os artefatos com suporte a requisições parciais (Range), usadas pelos players para avançar no áudio."""
+
+    # HTTP/1.1 para as respostas chunked dos artefatos ainda em gravação
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        parsed = urlparse(self.path)
+        artifact_id = parsed.path.lstrip("/")
+        if not _ARTIFACT_ID.match(artifact_id):
+            self.send_error(404)
+            return
+        path = os.path.join(_directory(), artifact_id)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+
+        with f:
+            if os.path.exists(_writing_marker(path)):
+                self._serve_growing(f, path, artifact_id, parsed, send_body)
+                return
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            status = 200
+            range_header = self.headers.get("Range")
+            if range_header:
+                match = _RANGE.match(range_header.strip())
+                if not match or not (match.group(1) or match.group(2)):
+                    self._send_unsatisfiable(size)
+                    return
+                if match.group(1):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(int(match.group(2)), size - 1)
+                else:
+                    # Sufixo: os últimos N bytes
+                    start = max(0, size - int(match.group(2)))
+                if start >= size or start > end:
+                    self._send_unsatisfiable(size)
+                    return
+                status = 206
+
+            length = end - start + 1 if size else 0
+            self.send_response(status)
+            self.send_header("Content-Type", MIME_TYPES.get(artifact_id.rsplit(".", 1)[1], "application/octet-stream"))
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Cache-Control", "no-cache")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self._send_download_header(parsed)
+            self.end_headers()
+
+            if not send_body:
+                return
+            f.seek(start)
+            remaining = length
+            try:
+                while remaining > 0:
+                    data = f.read(min(65536, remaining))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    remaining -= len(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # O player costuma abandonar a conexão ao avançar no áudio
+                self.close_connection = True
+
+    def _serve_growing(self, f, path, artifact_id, parsed, send_body):
+        # Enquanto o arquivo é gravado, o Range é ignorado e o áudio segue desde o início até o
+        # marcador de gravação sumir; o player recebe cada trecho assim que ele chega ao disco
+        self.send_response(200)
+        self.send_header("Content-Type", MIME_TYPES.get(artifact_id.rsplit(".", 1)[1], "application/octet-stream"))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Accept-Ranges", "none")
+        self.send_header("Cache-Control", "no-cache")
+        self._send_download_header(parsed)
+        self.end_headers()
+        if not send_body:
+            return
+
+        idle_since = time.time()
+        try:
+            while True:
+                data = f.read(65536)
+                if data:
+                    self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                    idle_since = time.time()
+                    continue
+                if not os.path.exists(_writing_marker(path)):
+                    # Gravação concluída: envia o que foi escrito depois da última leitura
+                    data = f.read()
+                    if data:
+                        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                    break
+                if time.time() - idle_since > ARTIFACT_CONFIG["stream_idle_timeout"]:
+                    logger.warning(f"Artefato {artifact_id} parou de crescer; encerrando a resposta")
+                    break
+                time.sleep(0.2)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_download_header(self, parsed):
+        download = parse_qs(parsed.query).get("download")
+        if download:
+            filename = _SAFE_NAME.sub("_", download[0])
+            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+
+    def _send_unsatisfiable(self, size):
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+def ensure_server():
+    """
+    Inicia (uma vez por processo) o servidor HTTP local dos artefatos e devolve a URL base.
+
+    O servidor não tem autenticação: quem alcança a porta baixa qualquer artefato cujo ID
+    conheça. Por isso o padrão é escutar apenas em 127.0.0.1, o que só funciona quando o
+    navegador roda na mesma máquina; para acesso remoto, publique o servidor por um proxy
+    reverso com autenticação e defina ARTIFACT_CONFIG["public_url"].
+
+    Se a porta configurada estiver ocupada, o servidor escuta em uma porta livre escolhida
+    pelo sistema (a URL devolvida já usa essa porta).
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            host, port = ARTIFACT_CONFIG["host"], ARTIFACT_CONFIG["port"]
+            try:
+                _server = ThreadingHTTPServer((host, port), _ArtifactHandler)
+            except OSError as e:
+                _server = ThreadingHTTPServer((host, 0), _ArtifactHandler)
+                logger.warning(f"Porta {port} do servidor de áudio indisponível ({str(e)}); usando a porta {_server.server_address[1]}")
+                if ARTIFACT_CONFIG["public_url"]:
+                    logger.error(f"ARTIFACT_PUBLIC_URL aponta para a porta {port}, que não é deste servidor; os links de áudio podem não funcionar")
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="artifact-server", daemon=True).start()
+            logger.info(f"Servidor de áudio iniciado em {host}:{_server.server_address[1]}")
+            if host not in ("127.0.0.1", "localhost", "::1"):
+                logger.warning(f"Servidor de áudio acessível em {host}, sem autenticação; mantenha-o atrás de um proxy com controle de acesso")
+
+    if ARTIFACT_CONFIG["public_url"]:
+        return ARTIFACT_CONFIG["public_url"].rstrip("/")
+    host = ARTIFACT_CONFIG["host"]
+    if host in ("", "0.0.0.0"):
+        host = "localhost"
+    return f"http://{host}:{_server.server_address[1]}"
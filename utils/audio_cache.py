@@ -0,0 +1,44 @@
+import logging
+import re
+from config.settings import AUDIO_CACHE_CONFIG
+from utils.disk_cache import DiskCache, make_key
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+_cache = None
+
+def get_cache():
+    """Retorna o cache de áudio compartilhado pelo processo."""
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(AUDIO_CACHE_CONFIG["directory"], AUDIO_CACHE_CONFIG["max_bytes"])
+    return _cache
+
+def normalize_chunk_text(text):
+    """Normaliza o texto do chunk para que diferenças só de espaçamento não invalidem o cache."""
+    return re.sub(r"\s+", " ", text).strip()
+
+def audio_cache_key(provider, model, voice_id, voice_settings, text, output_format="mp3"):
+    """Chave do áudio de um chunk: provedor, modelo, voz, configurações de voz, formato e texto normalizado."""
+    return make_key("audio", provider, model, voice_id, voice_settings or {}, output_format, normalize_chunk_text(text))
+
+def synthesize_cached(provider, model, voice_id, voice_settings, text, synthesize, output_format="mp3"):
+    """
+    Retorna o áudio do chunk a partir do cache ou chama `synthesize(text)` e guarda o resultado.
+
+    Returns:
+        tuple: (áudio em bytes, True se veio do cache)
+    """
+    if not AUDIO_CACHE_CONFIG["enabled"]:
+        return synthesize(text), False
+
+    key = audio_cache_key(provider, model, voice_id, voice_settings, text, output_format)
+    audio_bytes = get_cache().get(key)
+    if audio_bytes is not None:
+        logger.info(f"Áudio do chunk reaproveitado do cache ({len(audio_bytes)} bytes)")
+        return audio_bytes, True
+
+    audio_bytes = synthesize(text)
+    get_cache().set(key, audio_bytes)
+    return audio_bytes, False
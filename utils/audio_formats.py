@@ -0,0 +1,185 @@
+import io
+import logging
+import shutil
+import subprocess
+import threading
+import wave
+from utils.mp3_splicer import concat_mp3
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Formatos de saída do TTS. "openai" e "elevenlabs" indicam o formato nativo de cada provedor;
+# quando não há formato nativo, o áudio é pedido em PCM e convertido localmente com o ffmpeg.
+AUDIO_FORMATS = {
+    "mp3": {
+        "name": "MP3 (padrão do provedor)",
+        "mime": "audio/mpeg",
+        "extension": "mp3",
+        "openai": "mp3",
+        "elevenlabs": "mp3_44100_128",
+        "ffmpeg": ["-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3"]
+    },
+    "mp3_64": {
+        "name": "MP3 64 kbps",
+        "mime": "audio/mpeg",
+        "extension": "mp3",
+        "openai": None,
+        "elevenlabs": "mp3_44100_64",
+        "ffmpeg": ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"]
+    },
+    "mp3_32": {
+        "name": "MP3 32 kbps",
+        "mime": "audio/mpeg",
+        "extension": "mp3",
+        "openai": None,
+        "elevenlabs": "mp3_22050_32",
+        "ffmpeg": ["-c:a", "libmp3lame", "-ar", "22050", "-b:a", "32k", "-f", "mp3"]
+    },
+    "opus_32": {
+        "name": "Opus 32 kbps (recomendado para audiobooks)",
+        "mime": "audio/ogg",
+        "extension": "ogg",
+        "openai": None,
+        "elevenlabs": None,
+        "ffmpeg": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"]
+    },
+    "opus_24": {
+        "name": "Opus 24 kbps",
+        "mime": "audio/ogg",
+        "extension": "ogg",
+        "openai": None,
+        "elevenlabs": None,
+        "ffmpeg": ["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"]
+    },
+    "aac_64": {
+        "name": "AAC 64 kbps",
+        "mime": "audio/aac",
+        "extension": "aac",
+        "openai": None,
+        "elevenlabs": None,
+        "ffmpeg": ["-c:a", "aac", "-b:a", "64k", "-f", "adts"]
+    },
+    "wav": {
+        "name": "WAV (sem compressão)",
+        "mime": "audio/wav",
+        "extension": "wav",
+        "openai": None,
+        "elevenlabs": None,
+        "ffmpeg": ["-f", "wav"]
+    },
+    "pcm": {
+        "name": "PCM 16 bits, 24 kHz, mono (bruto)",
+        "mime": "audio/L16",
+        "extension": "pcm",
+        "openai": "pcm",
+        "elevenlabs": "pcm_24000",
+        "ffmpeg": ["-ar", "24000", "-f", "s16le"]
+    }
+}
+
+DEFAULT_AUDIO_FORMAT = "mp3"
+
+# Formato intermediário pedido aos provedores quando é preciso converter (PCM 16 bits, 24 kHz, mono)
+PCM_SOURCE = {"openai": "pcm", "elevenlabs": "pcm_24000"}
+PCM_SAMPLE_RATE = 24000
+
+# Formatos gerados a partir do PCM sem o ffmpeg
+LOCAL_FORMATS = {"wav"}
+
+def ffmpeg_available():
+    """Indica se o ffmpeg está instalado (necessário apenas para formatos convertidos localmente)."""
+    return shutil.which("ffmpeg") is not None
+
+def provider_format(output_format, provider):
+    """
+    Formato a pedir ao provedor para obter o formato de saída desejado.
+
+    Returns:
+        tuple: (formato nativo do provedor, True se for preciso converter localmente)
+    """
+    if output_format not in AUDIO_FORMATS:
+        raise ValueError(f"Formato de áudio desconhecido: {output_format}")
+    native = AUDIO_FORMATS[output_format][provider]
+    if native:
+        return native, False
+    if output_format not in LOCAL_FORMATS and not ffmpeg_available():
+        raise ValueError(f"O formato {AUDIO_FORMATS[output_format]['name']} exige o ffmpeg instalado.")
+    return PCM_SOURCE[provider], True
+
+def is_mp3(source_format):
+    return source_format.startswith("mp3")
+
+def join_audio(parts, source_format):
+    """Junta os chunks de áudio: MP3 quadro a quadro, PCM por concatenação simples."""
+    if is_mp3(source_format):
+        return concat_mp3(parts)
+    return b"".join(parts)
+
+class StreamingTranscoder:
+    """
+    Converte PCM para o formato de saída com o ffmpeg, gravando o resultado à medida que é produzido.
+
+    Os dados de entrada são escritos no stdin do ffmpeg e uma thread copia o stdout para o
+    arquivo de saída, sem acumular o áudio inteiro em memória.
+    """
+
+    def __init__(self, output_format, output, sample_rate=PCM_SAMPLE_RATE):
+        self.output = output
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+             *AUDIO_FORMATS[output_format]["ffmpeg"], "pipe:1"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self.stderr = b""
+        self.reader = threading.Thread(target=self._copy_output, name="ffmpeg-reader", daemon=True)
+        self.reader.start()
+
+    def _copy_output(self):
+        for data in iter(lambda: self.process.stdout.read(65536), b""):
+            self.output.write(data)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+    def close(self):
+        """Finaliza a conversão e aguarda o ffmpeg gravar o restante da saída."""
+        self.process.stdin.close()
+        self.reader.join()
+        self.stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise Exception(f"Erro na conversão de áudio com ffmpeg: {self.stderr.decode('utf-8', 'ignore')}")
+
+class WavWriter:
+    """Grava PCM em um arquivo WAV, com a mesma interface do StreamingTranscoder (não usa o ffmpeg)."""
+
+    def __init__(self, output, sample_rate=PCM_SAMPLE_RATE):
+        self.wav = wave.open(output, "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(sample_rate)
+
+    def write(self, data):
+        self.wav.writeframesraw(data)
+
+    def close(self):
+        """Atualiza o cabeçalho com o tamanho final (a saída precisa aceitar `seek`)."""
+        self.wav.close()
+
+def open_transcoder(output_format, output, sample_rate=PCM_SAMPLE_RATE):
+    """Conversor de PCM para o formato de saída, gravando em `output` à medida que recebe os dados."""
+    if output_format == "wav":
+        return WavWriter(output, sample_rate)
+    return StreamingTranscoder(output_format, output, sample_rate)
+
+def transcode(pcm_bytes, output_format, sample_rate=PCM_SAMPLE_RATE):
+    """Converte áudio PCM (16 bits, mono; 24 kHz por padrão) para o formato de saída."""
+    output = io.BytesIO()
+    transcoder = open_transcoder(output_format, output, sample_rate)
+    try:
+        transcoder.write(pcm_bytes)
+    finally:
+        transcoder.close()
+    return output.getvalue()
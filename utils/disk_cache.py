@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+def make_key(*parts):
+    """Gera uma chave estável (SHA-256) a partir de partes serializáveis em JSON."""
+    serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """
+    Cache em disco com remoção LRU por tamanho total.
+
+    Cada entrada é um arquivo; a data de modificação é atualizada a cada leitura e,
+    quando o diretório passa de `max_bytes`, as entradas usadas há mais tempo são removidas.
+    As escritas são atômicas, então vários processos podem compartilhar o mesmo diretório.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                # Arquivos temporários de escritas em andamento (deste ou de outro processo) não são entradas
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        """Retorna os bytes armazenados para a chave, ou None."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def contains(self, key):
+        """Indica se há uma entrada para a chave, sem lê-la nem alterar sua posição no LRU."""
+        return os.path.exists(self._path(key))
+
+    def set(self, key, data):
+        """Armazena bytes para a chave, removendo entradas antigas se o limite for excedido."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        old_size = self._size(path)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f"Erro ao gravar no cache {self.directory}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self.lock:
+            # Sobrescrever uma chave troca o tamanho antigo pelo novo
+            self.total_bytes += len(data) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def get_json(self, key):
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+
+    def set_json(self, key, value):
+        self.set(key, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def delete(self, key):
+        path = self._path(key)
+        size = self._size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            self.total_bytes = max(0, self.total_bytes - size)
+
+    def _size(self, path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def _evict(self):
+        # Remove as entradas menos usadas até ficar em 90% do limite. O total é recontado no
+        # disco, pois outros processos também gravam e removem entradas no mesmo diretório
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            self.total_bytes = total
+            return
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self.total_bytes = total
+        logger.info(f"Cache {self.directory} reduzido para {total} bytes")
@@ -0,0 +1,273 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import TEXT_MODELS, VISION_MODELS, MULTI_DOCUMENT_CONFIG
+from utils.api_handler import process_in_chunks, process_images
+from utils.pdf_processor import extract_from_pdf
+from utils.pipeline import run_pdf_pipeline, BackgroundNarrator
+from utils.image_filter import screen_images
+from utils.tts_handler import generate_tts
+from utils.elevenlabs_handler import generate_elevenlabs_tts, get_quota_budget
+from utils.local_tts_handler import generate_local_tts, generate_with_fallback
+from utils.audio_formats import DEFAULT_AUDIO_FORMAT
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+class ProcessingCancelled(BaseException):
+    """
+    Interrompe o processamento a partir de um callback (trabalho cancelado, cliente desconectado).
+
+    Não deriva de Exception para atravessar os "except Exception" das etapas de processamento.
+    """
+    pass
+
+def make_narrator(narration):
+    """
+    Cria o narrador em segundo plano para a opção "Processar e narrar".
+
+    Args:
+        narration (dict): {"service": "OpenAI" ou "ElevenLabs", "voice": voz, "model": modelo}, ou None
+    """
+    if not narration:
+        return None
+    voice, model = narration["voice"], narration["model"]
+    if narration["service"] == "OpenAI":
+        return BackgroundNarrator(lambda text: generate_tts(text, voice, model))
+    # A cota é consultada uma vez por narração, não a cada trecho
+    quota = get_quota_budget()
+    return BackgroundNarrator(lambda text: generate_elevenlabs_tts(text, voice, model, language="pt", quota=quota))
+
+def process_document(params, file_paths=None, text="", images=None, progress_callback=None, status_callback=None, audio_path=None, chunk_callback=None, executor=None):
+    """
+    Processa um documento completo: extração, texto com o LLM, imagens com a visão e narração.
+
+    É a mesma sequência do botão "Processar" do aplicativo, sem dependência do Streamlit, para
+    que possa rodar tanto na sessão quanto em um processo de trabalho em segundo plano.
+
+    Args:
+        params (dict): Opções serializáveis em JSON:
+            "text_model"/"vision_model" (nomes em TEXT_MODELS/VISION_MODELS), "prompt", "vision_prompt",
+            "prompt_type", "chunk_size", "pipeline" (extrair e processar ao mesmo tempo), "ocr",
+            "thinking" (opções do Claude 3.7) e "narration" (ver make_narrator)
+        file_paths (list): PDFs a extrair (opcional)
+        text (str): Texto já extraído ou colado (usado quando não há PDFs)
+        images (list): Imagens já extraídas (usadas quando não há PDFs)
+        progress_callback (function): Callback (current, total, message)
+        status_callback (function): Recebe mensagens de status avulsas
+        audio_path (str): Arquivo MP3 da narração (obrigatório quando há narração)
+        chunk_callback (function): Chamada com (índice, texto processado) para cada pedaço, na ordem
+        executor (ThreadPoolExecutor): Pool compartilhado para as requisições aos modelos (ver process_documents)
+
+    Returns:
+        dict: {"text": texto processado, "audio_path": narração ou None, "narration_error": erro ou None}
+    """
+    def status(message):
+        logger.info(message)
+        if status_callback:
+            status_callback(message)
+
+    # Passado a cada chamada, sem alterar a configuração global: várias requisições podem rodar ao mesmo tempo
+    thinking = params.get("thinking")
+    text_model = TEXT_MODELS[params["text_model"]]
+    chunk_size = params.get("chunk_size", 500)
+    images = list(images or [])
+
+    narrator = make_narrator(params.get("narration"))
+    on_chunk = chunk_callback
+    if narrator:
+        def on_chunk(index, processed_chunk):
+            narrator.submit(processed_chunk)
+            if chunk_callback:
+                chunk_callback(index, processed_chunk)
+
+    try:
+        result = ""
+        input_text = text
+        if file_paths and params.get("pipeline"):
+            status(f"Modo pipeline: extraindo e processando {len(file_paths)} PDF(s) com o modelo {params['text_model']}...")
+            pipeline_result = run_pdf_pipeline(
+                text_model,
+                params["prompt"],
+                file_paths,
+                chunk_size_words=chunk_size,
+                progress_callback=progress_callback,
+                chunk_callback=on_chunk,
+                ocr=params.get("ocr", False),
+                executor=executor,
+                thinking=thinking
+            )
+            input_text = pipeline_result["source_text"]
+            images = pipeline_result["images"]
+            result += pipeline_result["text"]
+        else:
+            if file_paths:
+                texts = []
+                for file_path in file_paths:
+                    extracted = extract_from_pdf(file_path, ocr=params.get("ocr", False))
+                    texts.append(extracted["text"])
+                    images.extend(extracted["images"])
+                input_text = "\n\n".join(texts).strip()
+            if input_text:
+                status(f"Texto extraído. Total de palavras: {len(input_text.split())}. Dividindo em pedaços de {chunk_size} palavras.")
+                status(f"Processando texto com modelo {params['text_model']}...")
+                result += process_in_chunks(
+                    text_model,
+                    params["prompt"],
+                    input_text,
+                    chunk_size_words=chunk_size,
+                    progress_callback=progress_callback,
+                    chunk_callback=on_chunk,
+                    thinking=thinking
+                )
+
+        if images:
+            # Descartar páginas em branco e recortes sem conteúdo antes da visão
+            images, rejected_images = screen_images(images, params.get("prompt_type"))
+            if rejected_images:
+                status(f"{len(rejected_images)} imagens com pouca informação identificadas pelo filtro.")
+
+        if images:
+            status(f"Encontradas {len(images)} imagens. Analisando com {params['vision_model']}...")
+            if params["vision_model"] == "Claude 3.7 Sonnet":
+                status("Utilizando modelo com capacidades avançadas de raciocínio e análise de imagens.")
+            try:
+                vision_result = process_images(VISION_MODELS[params["vision_model"]], params["vision_prompt"], images, progress_callback=progress_callback, executor=executor, thinking=thinking)
+                result += f"\n\nAnálise das Imagens:\n{vision_result}"
+                if narrator:
+                    narrator.submit(f"Análise das Imagens:\n{vision_result}")
+            except Exception as e:
+                result += f"\n\nAnálise das Imagens: [Erro: {str(e)}]"
+
+        if input_text and ("Caso Clínico" in input_text or "Keypoints" in input_text):
+            result += "\n\nCasos Clínicos e Keypoints foram mantidos integralmente, conforme o original."
+
+        if narrator:
+            status(f"Aguardando a narração: {narrator.completed} de {narrator.submitted} trechos prontos.")
+    except BaseException:
+        # Cancelamento ou falha: os trechos ainda na fila não são sintetizados (nem cobrados)
+        if narrator:
+            narrator.executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    narration_error = None
+    if narrator:
+        try:
+            narrator.finish(audio_path)
+        except Exception as e:
+            narration_error = str(e)
+            audio_path = None
+
+    return {"text": result, "audio_path": audio_path if narrator else None, "narration_error": narration_error}
+
+def process_documents(params, file_paths, audio_paths=None, progress_callback=None, status_callback=None, document_callback=None, max_files=None, shared_workers=None):
+    """
+    Processa vários PDFs separadamente e ao mesmo tempo, cada um com o próprio resultado.
+
+    Cada documento passa por process_document em modo pipeline, em uma thread própria (até
+    max_files ao mesmo tempo). As requisições aos modelos de texto e de visão de todos os
+    documentos disputam um único pool de shared_workers threads, de modo que o total de
+    chamadas simultâneas às APIs não cresce com o número de arquivos. Os callbacks são
+    chamados sempre na thread chamadora.
+
+    Args:
+        params (dict): Opções de process_document, comuns a todos os documentos
+        file_paths (list): PDFs, um documento por arquivo
+        audio_paths (list): Arquivo da narração de cada documento (quando há narração)
+        progress_callback (function): Callback (índice do documento, current, total, message)
+        status_callback (function): Callback (índice do documento, mensagem)
+        document_callback (function): Chamada com (índice do documento, resultado) quando cada um termina
+        max_files (int): Documentos em andamento ao mesmo tempo (padrão em MULTI_DOCUMENT_CONFIG)
+        shared_workers (int): Requisições simultâneas aos modelos, somando todos os documentos
+
+    Returns:
+        list: Resultado de cada documento, na ordem de file_paths, como em process_document,
+              com "error" preenchido quando o documento falhou
+    """
+    max_files = max_files or MULTI_DOCUMENT_CONFIG["max_files"]
+    shared_workers = shared_workers or MULTI_DOCUMENT_CONFIG["shared_workers"]
+    params = dict(params, pipeline=True)
+    audio_paths = audio_paths or [None] * len(file_paths)
+    events = queue.Queue()
+    stopped = threading.Event()
+
+    def relay(i, event):
+        # Interrompe os demais documentos quando a thread chamadora desiste (ex.: cancelamento)
+        if stopped.is_set():
+            raise ProcessingCancelled()
+        events.put((i, event))
+
+    def run(i):
+        return process_document(
+            params,
+            file_paths=[file_paths[i]],
+            progress_callback=lambda current, total, message: relay(i, (current, total, message)),
+            status_callback=lambda message: relay(i, message),
+            audio_path=audio_paths[i],
+            executor=shared_executor
+        )
+
+    def dispatch(i, event):
+        if isinstance(event, tuple):
+            if progress_callback:
+                progress_callback(i, *event)
+        elif status_callback:
+            status_callback(i, event)
+
+    results = [None] * len(file_paths)
+    with ThreadPoolExecutor(max_workers=shared_workers, thread_name_prefix="shared-model") as shared_executor, \
+            ThreadPoolExecutor(max_workers=max_files, thread_name_prefix="document") as documents_executor:
+        futures = {documents_executor.submit(run, i): i for i in range(len(file_paths))}
+        try:
+            _relay_documents(futures, events, results, dispatch, document_callback)
+        except BaseException:
+            stopped.set()
+            raise
+    return results
+
+def _relay_documents(futures, events, results, dispatch, document_callback):
+    # O progresso chega pela fila e é repassado aqui, na thread chamadora
+    while futures:
+        try:
+            dispatch(*events.get(timeout=0.2))
+        except queue.Empty:
+            pass
+        for future in [future for future in futures if future.done()]:
+            i = futures.pop(future)
+            while not events.empty():
+                dispatch(*events.get_nowait())
+            try:
+                results[i] = dict(future.result(), error=None)
+            except Exception as e:
+                logger.error(f"Falha ao processar o documento {i + 1}: {str(e)}")
+                results[i] = {"text": "", "audio_path": None, "narration_error": None, "error": str(e)}
+            if document_callback:
+                document_callback(i, results[i])
+
+def synthesize_text(params, callback=None):
+    """
+    Gera o áudio de um texto com o serviço escolhido (usado pelos trabalhos de TTS em segundo plano).
+
+    Args:
+        params (dict): "service" ("OpenAI", "ElevenLabs" ou "Local"), "text", "voice", "model",
+            "output_format" e, para a ElevenLabs, "custom_settings" e "fit_to_quota"
+        callback (function): Callback (current, total, message)
+
+    Returns:
+        tuple: (áudio em bytes, formato efetivamente gerado)
+    """
+    text = params["text"]
+    output_format = params.get("output_format", DEFAULT_AUDIO_FORMAT)
+    if params["service"] == "Local":
+        return generate_local_tts(text, callback=callback, output_format=output_format), output_format
+    if params["service"] == "OpenAI":
+        generate = lambda: generate_tts(text, params["voice"], params["model"], callback=callback, output_format=output_format)
+    else:
+        generate = lambda: generate_elevenlabs_tts(
+            text, params["voice"], params["model"], callback=callback, language="pt",
+            custom_settings=params.get("custom_settings"), output_format=output_format,
+            fit_to_quota=params.get("fit_to_quota", False)
+        )
+    # Se a API falhar, o áudio é gerado com o TTS local (quando instalado)
+    return generate_with_fallback(generate, text, callback=callback, output_format=output_format)
@@ -2,7 +2,18 @@ import os
 import logging
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from config.settings import ELEVENLABS_MAX_CHARS, ELEVENLABS_CHUNK_CONFIG, ELEVENLABS_CONCURRENCY, ELEVENLABS_TIER, VOICES_CACHE_CONFIG, ELEVENLABS_QUOTA_CONFIG, AUDIO_CACHE_CONFIG
+from utils.audio_formats import DEFAULT_AUDIO_FORMAT, provider_format, join_audio, transcode
+from utils.audio_cache import synthesize_cached, audio_cache_key, get_cache as get_audio_cache
+from utils.elevenlabs_quota import get_subscription, invalidate_subscription, plan_characters, describe_plan, QuotaBudget
+from utils.text_segmenter import split_text_into_chunks, split_text_into_stable_chunks
 import io
+import hashlib
+import json
+import threading
+import time
 
 # Configuração de logging
 logger = logging.getLogger(__name__)
@@ -35,51 +46,283 @@ RECOMMENDED_SETTINGS_PT = {
     "use_speaker_boost": True
 }
 
+@lru_cache(maxsize=4)
+def get_elevenlabs_client(api_key=ELEVENLABS_API_KEY):
+    """Cliente da ElevenLabs reaproveitado entre chamadas (mantém o pool de conexões HTTP)."""
+    return ElevenLabs(api_key=api_key)
+
+def _fetch_voices():
+    """Consulta a API e formata a lista de vozes, com as populares primeiro."""
+    client = get_elevenlabs_client()
+    voices = client.voices.get_all()
+    
+    # Formatar as vozes para exibição
+    voice_list = []
+    for voice in voices.voices:
+        # Verificar se é uma voz popular
+        is_popular = voice.voice_id in POPULAR_VOICES.values()
+        
+        voice_list.append({
+            "id": voice.voice_id,
+            "name": voice.name,
+            "description": voice.description or "Sem descrição",
+            "preview_url": voice.preview_url,
+            "is_popular": is_popular
+        })
+    
+    # Ordenar para que as vozes populares apareçam primeiro
+    voice_list.sort(key=lambda x: (not x["is_popular"], x["name"]))
+    return voice_list
+
+# Cache das vozes compartilhado pelo processo (e persistido em disco), para que os reruns do
+# Streamlit não consultem a API a cada interação
+_voices_cache = {"voices": None, "fetched_at": 0.0}
+_voices_lock = threading.Lock()
+_voices_refreshing = threading.Event()
+
+def _voices_account():
+    # As vozes dependem da conta; o arquivo em disco só vale para a mesma chave
+    return hashlib.sha256(ELEVENLABS_API_KEY.encode("utf-8")).hexdigest()
+
+def _load_voices_from_disk():
+    try:
+        with open(VOICES_CACHE_CONFIG["path"], "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("account") == _voices_account():
+            return entry["voices"], entry["fetched_at"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None, 0.0
+
+def _store_voices(voices):
+    fetched_at = time.time()
+    with _voices_lock:
+        _voices_cache["voices"] = voices
+        _voices_cache["fetched_at"] = fetched_at
+    path = VOICES_CACHE_CONFIG["path"]
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"account": _voices_account(), "fetched_at": fetched_at, "voices": voices}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar o cache de vozes: {str(e)}")
+
+def _refresh_voices_in_background():
+    # Apenas uma atualização por vez; as demais chamadas continuam usando a lista atual
+    with _voices_lock:
+        if _voices_refreshing.is_set():
+            return
+        _voices_refreshing.set()
+    
+    def refresh():
+        try:
+            _store_voices(_fetch_voices())
+            logger.info("Lista de vozes da ElevenLabs atualizada em segundo plano")
+        except Exception as e:
+            logger.error(f"Erro ao atualizar vozes da ElevenLabs: {str(e)}")
+        finally:
+            _voices_refreshing.clear()
+    
+    threading.Thread(target=refresh, name="elevenlabs-voices", daemon=True).start()
+
+def invalidate_voices_cache():
+    """Descarta as vozes em cache (memória e disco); a próxima listagem consulta a API."""
+    with _voices_lock:
+        _voices_cache["voices"] = None
+        _voices_cache["fetched_at"] = 0.0
+    try:
+        os.remove(VOICES_CACHE_CONFIG["path"])
+    except OSError:
+        pass
+
 # Função para listar vozes disponíveis
-def list_elevenlabs_voices():
-    """Retorna uma lista de vozes disponíveis na ElevenLabs."""
+def list_elevenlabs_voices(force_refresh=False):
+    """
+    Retorna uma lista de vozes disponíveis na ElevenLabs.
+    
+    A lista fica em cache por VOICES_CACHE_CONFIG["ttl_seconds"]. Depois disso, a lista
+    anterior continua sendo devolvida imediatamente enquanto uma nova é buscada em segundo
+    plano. A API só é consultada de forma síncrona na primeira vez (sem cache em disco) ou
+    com force_refresh.
+    """
     if not ELEVENLABS_API_KEY:
         logger.error("ELEVENLABS_API_KEY não configurada")
         return []
     
+    if not force_refresh:
+        with _voices_lock:
+            voices, fetched_at = _voices_cache["voices"], _voices_cache["fetched_at"]
+        if voices is None:
+            voices, fetched_at = _load_voices_from_disk()
+            if voices is not None:
+                with _voices_lock:
+                    _voices_cache["voices"] = voices
+                    _voices_cache["fetched_at"] = fetched_at
+        if voices is not None:
+            if time.time() - fetched_at > VOICES_CACHE_CONFIG["ttl_seconds"]:
+                _refresh_voices_in_background()
+            return voices
+    
     try:
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-        voices = client.voices.get_all()
-        
-        # Formatar as vozes para exibição
-        voice_list = []
-        for voice in voices.voices:
-            # Verificar se é uma voz popular
-            is_popular = voice.voice_id in POPULAR_VOICES.values()
-            
-            voice_list.append({
-                "id": voice.voice_id,
-                "name": voice.name,
-                "description": voice.description or "Sem descrição",
-                "preview_url": voice.preview_url,
-                "is_popular": is_popular
-            })
-        
-        # Ordenar para que as vozes populares apareçam primeiro
-        voice_list.sort(key=lambda x: (not x["is_popular"], x["name"]))
-        
-        return voice_list
+        voices = _fetch_voices()
+        _store_voices(voices)
+        return voices
     except Exception as e:
         logger.error(f"Erro ao listar vozes da ElevenLabs: {str(e)}")
         return []
 
+def _convert_chunk(client, text, voice_id, model_id, settings, output_format, previous_text=None, next_text=None):
+    """Sintetiza um chunk com a API da ElevenLabs e devolve o áudio em bytes."""
+    audio = client.text_to_speech.convert(
+        text=text,
+        voice_id=voice_id,
+        model_id=model_id,
+        output_format=output_format,
+        voice_settings=settings,
+        previous_text=previous_text,
+        next_text=next_text
+    )
+    
+    # Verificar se o resultado é um gerador e convertê-lo para bytes
+    if hasattr(audio, '__iter__') and not isinstance(audio, (bytes, str)):
+        buffer = io.BytesIO()
+        for data in audio:
+            buffer.write(data)
+        audio_bytes = buffer.getvalue()
+    elif not isinstance(audio, bytes):
+        # Outro tipo, tentar converter para bytes
+        buffer = io.BytesIO()
+        buffer.write(audio)
+        audio_bytes = buffer.getvalue()
+    else:
+        # Já é bytes
+        audio_bytes = audio
+    
+    if not audio_bytes:
+        raise ValueError("Resposta da API vazia.")
+    return audio_bytes
+
+def split_elevenlabs_chunks(text, model_id):
+    """
+    Divide o texto em chunks de frases completas, dentro do limite de caracteres do modelo.
+
+    Com o cache de áudio ligado, as fronteiras são estáveis a edições (ver
+    text_segmenter.pack_sentences_stable). Como o texto vizinho faz parte da chave do cache,
+    uma edição invalida os chunks do trecho editado e os dois vizinhos; os demais são
+    reaproveitados. Sem o cache, o empacotamento guloso gera o menor número de requisições.
+    """
+    max_chars = ELEVENLABS_MAX_CHARS.get(model_id, ELEVENLABS_MAX_CHARS["default"])
+    limit = min(ELEVENLABS_CHUNK_CONFIG["chunk_chars"], max_chars)
+    if AUDIO_CACHE_CONFIG["enabled"]:
+        return split_text_into_stable_chunks(text, limit)
+    return split_text_into_chunks(text, limit)
+
+def _chunk_context(chunks, i):
+    """Texto vizinho do chunk, enviado à API para manter a entonação contínua entre as partes."""
+    context_chars = ELEVENLABS_CHUNK_CONFIG["context_chars"]
+    previous_text = chunks[i - 1][-context_chars:] if i > 0 else None
+    next_text = chunks[i + 1][:context_chars] if i + 1 < len(chunks) else None
+    return previous_text, next_text
+
+def _voice_settings(custom_settings, language):
+    # Configurações de voz - usar configurações personalizadas se fornecidas
+    if custom_settings:
+        return custom_settings
+    # Usar configurações recomendadas para português ou padrão
+    return RECOMMENDED_SETTINGS_PT.copy() if language == "pt" else {
+        "stability": 0.7,
+        "similarity_boost": 0.8,
+        "style": 0.4,
+        "use_speaker_boost": True
+    }
+
+def _chunk_cache_settings(settings, chunks, i):
+    # O contexto influencia a entonação, por isso faz parte da chave do cache
+    previous_text, next_text = _chunk_context(chunks, i)
+    return dict(settings, previous_text=previous_text, next_text=next_text)
+
+def _chunk_costs(chunks, voice_id, model_id, settings, native_format):
+    """Caracteres cobrados por chunk: o texto enviado, ou zero se o áudio já estiver em cache."""
+    costs = []
+    for i, chunk in enumerate(chunks):
+        cached = False
+        if AUDIO_CACHE_CONFIG["enabled"]:
+            key = audio_cache_key("elevenlabs", model_id, voice_id, _chunk_cache_settings(settings, chunks, i), chunk, native_format)
+            cached = get_audio_cache().contains(key)
+        costs.append(0 if cached else len(chunk))
+    return costs
+
+def _fetch_subscription():
+    try:
+        return get_subscription(ELEVENLABS_API_KEY)
+    except Exception as e:
+        logger.warning(f"Não foi possível consultar a cota da ElevenLabs: {str(e)}")
+        return None
+
+def _plan_chunks(chunks, voice_id, model_id, settings, native_format, quota=None):
+    costs = _chunk_costs(chunks, voice_id, model_id, settings, native_format)
+    if quota is not None:
+        return quota.plan(costs)
+    return plan_characters(costs, _fetch_subscription())
+
+def get_quota_budget():
+    """
+    Consulta a cota uma única vez para uma narração em várias partes (ver QuotaBudget).
+
+    Returns:
+        QuotaBudget ou None: None quando a verificação da cota está desligada
+    """
+    if not ELEVENLABS_QUOTA_CONFIG["enabled"]:
+        return None
+    return QuotaBudget(_fetch_subscription())
+
+def plan_elevenlabs_tts(text, voice_id, model_id="eleven_flash_v2_5", language="pt", custom_settings=None, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Calcula, antes de gerar qualquer áudio, quantos caracteres serão cobrados e se cabem na cota.
+
+    Os caracteres são contados nos chunks exatamente como serão enviados (após a normalização
+    de espaços), descontando os que já estão no cache de áudio. Se a cota atual não for
+    suficiente, o plano divide os chunks em partes para as próximas renovações da cota.
+
+    Returns:
+        dict: Plano de plan_characters, com "description" (resumo legível)
+    """
+    native_format, _ = provider_format(output_format, "elevenlabs")
+    settings = _voice_settings(custom_settings, language)
+    chunks = split_elevenlabs_chunks(text, model_id)
+    plan = _plan_chunks(chunks, voice_id, model_id, settings, native_format)
+    plan["description"] = describe_plan(plan)
+    return plan
+
 # Função para gerar áudio com ElevenLabs
-def generate_elevenlabs_tts(text, voice_id, model_id="eleven_flash_v2_5", callback=None, language="pt", custom_settings=None):
+def generate_elevenlabs_tts(text, voice_id, model_id="eleven_flash_v2_5", callback=None, language="pt", custom_settings=None, output_format=DEFAULT_AUDIO_FORMAT, max_workers=None, fit_to_quota=False, quota=None):
     """
     Gera áudio a partir de texto usando a API da ElevenLabs.
     
+    O texto é dividido em chunks de frases completas, sintetizados em paralelo (até o limite
+    de requisições simultâneas do plano) e unidos na ordem original. Cada chunk recebe o
+    texto vizinho em previous_text/next_text para que a entonação continue entre as partes.
+    
+    Antes de qualquer chamada de síntese, os caracteres cobrados são comparados com a cota
+    da assinatura; conforme ELEVENLABS_QUOTA_CONFIG["policy"], a geração é recusada ("refuse")
+    ou apenas avisada ("warn") quando não cabe.
+    
     Args:
         text (str): Texto para converter em áudio
         voice_id (str): ID da voz a ser usada
         model_id (str): ID do modelo a ser usado
-        callback (function): Função de callback para atualizar o progresso
+        callback (function): Callback (current, total, message), chamado sempre na thread chamadora
         language (str): Idioma do texto (para ajustar configurações)
         custom_settings (dict): Configurações personalizadas de voz
+        output_format (str): Formato de saída (chave de AUDIO_FORMATS); formatos sem suporte nativo
+            na API são pedidos em PCM e convertidos com o ffmpeg
+        max_workers (int): Chunks sintetizados ao mesmo tempo (padrão definido pelo plano em ELEVENLABS_CONCURRENCY)
+        fit_to_quota (bool): Gera apenas os chunks que cabem na cota atual; o restante pode ser
+            gerado depois da renovação, reaproveitando o cache
+        quota (QuotaBudget): Cota já consultada, compartilhada entre as partes de uma narração
+            (ver get_quota_budget); sem ela, a assinatura é consultada nesta chamada
     
     Returns:
         bytes: Áudio em formato de bytes
@@ -90,74 +333,102 @@ def generate_elevenlabs_tts(text, voice_id, model_id="eleven_flash_v2_5", callba
     if not text.strip():
         raise ValueError("Texto vazio fornecido para geração de áudio")
     
+    native_format, needs_transcode = provider_format(output_format, "elevenlabs")
+    settings = _voice_settings(custom_settings, language)
+    
+    all_chunks = split_elevenlabs_chunks(text, model_id)
+    if not all_chunks:
+        raise ValueError("Nenhum chunk válido gerado a partir do texto.")
+    chunks = all_chunks
+    
+    # Verificação da cota antes de gerar qualquer áudio
+    if ELEVENLABS_QUOTA_CONFIG["enabled"]:
+        plan = _plan_chunks(all_chunks, voice_id, model_id, settings, native_format, quota)
+        description = describe_plan(plan)
+        logger.info(description)
+        if not plan["fits"]:
+            if fit_to_quota:
+                chunks = all_chunks[:plan["windows"][0]["end_chunk"]]
+                if not chunks:
+                    raise ValueError(f"Cota insuficiente na ElevenLabs. {description}")
+            elif ELEVENLABS_QUOTA_CONFIG["policy"] == "refuse":
+                raise ValueError(f"Cota insuficiente na ElevenLabs. {description}")
+            else:
+                logger.warning(f"O texto excede a cota restante da ElevenLabs. {description}")
+        if callback:
+            callback(0, len(chunks), description)
+    
     try:
         # Atualizar progresso se callback fornecido
         if callback:
             callback(0, 1, "Iniciando geração de áudio com ElevenLabs...")
         
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+        client = get_elevenlabs_client()
         
-        # Configurações de voz - usar configurações personalizadas se fornecidas
-        if custom_settings:
-            settings = custom_settings
-        else:
-            # Usar configurações recomendadas para português ou padrão
-            settings = RECOMMENDED_SETTINGS_PT.copy() if language == "pt" else {
-                "stability": 0.7,
-                "similarity_boost": 0.8,
-                "style": 0.4,
-                "use_speaker_boost": True
-            }
+        max_workers = max_workers or ELEVENLABS_CONCURRENCY.get(ELEVENLABS_TIER, ELEVENLABS_CONCURRENCY["default"])
         
-        # Atualizar progresso
-        if callback:
-            callback(0.2, 1, "Enviando texto para a API da ElevenLabs...")
-            
         # Registrar informações sobre a geração
         logger.info(f"Gerando áudio com voz ID: {voice_id}, modelo: {model_id}")
         logger.info(f"Configurações de voz: estabilidade={settings['stability']}, fidelidade={settings['similarity_boost']}")
+        logger.info(f"Texto dividido em {len(chunks)} chunks ({max_workers} simultâneos)")
         
-        # Gerar áudio
-        audio = client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id=model_id,
-            output_format="mp3_44100_128",
-            voice_settings=settings
-        )
-        
-        # Atualizar progresso
         if callback:
-            callback(0.5, 1, "Áudio gerado, processando resultado...")
+            callback(0, len(chunks), f"Enviando {len(chunks)} chunks para a API da ElevenLabs ({max_workers} simultâneos)...")
         
-        # Verificar se o resultado é um gerador e convertê-lo para bytes
-        if hasattr(audio, '__iter__') and not isinstance(audio, (bytes, str)):
-            # É um gerador, precisamos consumir e concatenar
-            logger.info("Resultado da API é um gerador, convertendo para bytes...")
-            buffer = io.BytesIO()
-            
-            # Consumir o gerador e escrever no buffer
-            total_chunks = 100  # Valor estimado para progresso
-            for i, chunk in enumerate(audio):
-                buffer.write(chunk)
+        def synthesize(i):
+            # O contexto vem do texto completo, para que a parte restante reaproveite o cache depois
+            previous_text, next_text = _chunk_context(all_chunks, i)
+            return synthesize_cached(
+                "elevenlabs", model_id, voice_id, _chunk_cache_settings(settings, all_chunks, i), chunks[i],
+                lambda chunk: _convert_chunk(client, chunk, voice_id, model_id, settings, native_format, previous_text, next_text),
+                output_format=native_format
+            )
+        
+        # Os chunks são sintetizados em paralelo; o áudio final é montado na ordem original
+        audio_parts = [None] * len(chunks)
+        completed = 0
+        billed = 0
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="elevenlabs")
+        try:
+            futures = {executor.submit(synthesize, i): i for i in range(len(chunks))}
+            for future in as_completed(futures):
+                i = futures[future]
+                completed += 1
+                try:
+                    audio_parts[i], from_cache = future.result()
+                except Exception as e:
+                    error_message = f"Falha ao processar chunk {i+1}/{len(chunks)}: {str(e)}"
+                    logger.error(error_message)
+                    if callback:
+                        callback(completed, len(chunks), error_message)
+                    raise Exception(error_message)
+                
+                if not from_cache:
+                    billed += len(chunks[i])
+                origin = "reaproveitado do cache" if from_cache else "processado"
+                message = f"Chunk {i+1}/{len(chunks)} {origin}: {len(audio_parts[i])} bytes ({completed}/{len(chunks)} concluídos)"
+                logger.info(message)
                 if callback:
-                    progress = 0.5 + (0.4 * (i % total_chunks) / total_chunks)
-                    callback(progress, 1, f"Processando chunk de áudio {i+1}...")
-            
-            audio_bytes = buffer.getvalue()
-            logger.info(f"Gerador convertido para bytes: {len(audio_bytes)} bytes")
-        elif not isinstance(audio, bytes):
-            # Outro tipo, tentar converter para bytes
-            buffer = io.BytesIO()
-            buffer.write(audio)
-            audio_bytes = buffer.getvalue()
-        else:
-            # Já é bytes
-            audio_bytes = audio
+                    callback(completed, len(chunks), message)
+        finally:
+            # Em caso de erro, os chunks que ainda não começaram são cancelados
+            executor.shutdown(wait=True, cancel_futures=True)
+            if quota is not None:
+                # A cota da narração é descontada localmente, sem nova consulta à API
+                quota.charge(billed)
+            else:
+                invalidate_subscription(ELEVENLABS_API_KEY)
+        
+        # MP3: quadros unidos com um único cabeçalho e a duração correta; PCM: concatenação simples
+        audio_bytes = join_audio(audio_parts, native_format)
+        if needs_transcode:
+            if callback:
+                callback(len(chunks), len(chunks), f"Convertendo áudio para {output_format}...")
+            audio_bytes = transcode(audio_bytes, output_format)
         
         # Atualizar progresso final
         if callback:
-            callback(1, 1, "Áudio processado com sucesso!")
+            callback(len(chunks), len(chunks), "Áudio processado com sucesso!")
         
         return audio_bytes
     
@@ -182,7 +453,7 @@ def clone_voice(name, description, audio_file_path):
         raise ValueError("ELEVENLABS_API_KEY não configurada em .env")
     
     try:
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+        client = get_elevenlabs_client()
         
         # Abrir o arquivo de áudio
         with open(audio_file_path, "rb") as audio_file:
@@ -193,6 +464,8 @@ def clone_voice(name, description, audio_file_path):
                 files=[audio_file]
             )
             
+            # A nova voz deve aparecer na próxima listagem
+            invalidate_voices_cache()
             return voice.voice_id
     except Exception as e:
         logger.error(f"Erro ao clonar voz: {str(e)}")
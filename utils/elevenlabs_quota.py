@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from config.settings import ELEVENLABS_QUOTA_CONFIG
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+_subscription_cache = {}
+_subscription_lock = threading.Lock()
+
+def get_subscription(api_key, max_age=None):
+    """
+    Consulta a cota de caracteres da assinatura da ElevenLabs (reaproveitada por alguns segundos).
+
+    Returns:
+        dict: {"character_count", "character_limit", "remaining", "next_reset" (timestamp ou None), "tier"}
+    """
+    max_age = max_age if max_age is not None else ELEVENLABS_QUOTA_CONFIG["subscription_max_age"]
+    with _subscription_lock:
+        cached = _subscription_cache.get(api_key)
+        if cached and time.time() - cached[0] < max_age:
+            return cached[1]
+
+    # Importado aqui: elevenlabs_handler importa este módulo
+    from utils.elevenlabs_handler import get_elevenlabs_client
+    client = get_elevenlabs_client(api_key)
+    # SDKs mais novos expõem client.user.subscription.get(); os anteriores, client.user.get_subscription()
+    subscription_api = getattr(client.user, "subscription", None)
+    subscription = subscription_api.get() if subscription_api is not None else client.user.get_subscription()
+
+    result = {
+        "character_count": subscription.character_count,
+        "character_limit": subscription.character_limit,
+        "remaining": max(0, subscription.character_limit - subscription.character_count),
+        "next_reset": getattr(subscription, "next_character_count_reset_unix", None),
+        "tier": getattr(subscription, "tier", None)
+    }
+    with _subscription_lock:
+        _subscription_cache[api_key] = (time.time(), result)
+    return result
+
+def invalidate_subscription(api_key):
+    """Descarta a cota em cache, por exemplo depois de uma geração."""
+    with _subscription_lock:
+        _subscription_cache.pop(api_key, None)
+
+class QuotaBudget:
+    """
+    Cota consultada uma única vez e descontada localmente, para gerações em várias partes.
+
+    Na narração em segundo plano cada trecho é uma geração separada; com um QuotaBudget
+    compartilhado, a assinatura é consultada no início da narração e não a cada trecho.
+    """
+
+    def __init__(self, subscription):
+        """
+        Args:
+            subscription (dict): Resultado de get_subscription, ou None se a cota for desconhecida
+        """
+        self.subscription = subscription
+        self.lock = threading.Lock()
+
+    def plan(self, chunk_costs):
+        """Plano (ver plan_characters) com a cota que ainda resta nesta narração."""
+        with self.lock:
+            return plan_characters(chunk_costs, self.subscription)
+
+    def charge(self, characters):
+        """Desconta os caracteres efetivamente cobrados."""
+        with self.lock:
+            if self.subscription is None or not characters:
+                return
+            self.subscription = dict(
+                self.subscription,
+                character_count=self.subscription["character_count"] + characters,
+                remaining=max(0, self.subscription["remaining"] - characters)
+            )
+
+def plan_characters(chunk_costs, subscription):
+    """
+    Distribui os chunks entre a cota atual e as próximas renovações, sem dividir nenhum chunk.
+
+    Args:
+        chunk_costs (list): Caracteres cobrados por chunk, na ordem (0 para chunks já em cache)
+        subscription (dict): Resultado de get_subscription, ou None se a cota for desconhecida
+
+    Returns:
+        dict: Caracteres cobrados, se cabe na cota atual e as janelas de geração
+              ({"start_chunk", "end_chunk", "characters", "available_at"}; end_chunk exclusivo).
+              Um chunk maior que a cota total da assinatura (ex.: character_limit 0) não cabe
+              em nenhuma renovação: "oversized_chunk" traz o índice dele e o plano para ali,
+              com "fits" False; a política de ELEVENLABS_QUOTA_CONFIG decide o que fazer.
+    """
+    billable = sum(chunk_costs)
+    plan = {
+        "billable_characters": billable,
+        "total_chunks": len(chunk_costs),
+        "cached_chunks": sum(1 for cost in chunk_costs if cost == 0),
+        "remaining": subscription["remaining"] if subscription else None,
+        "fits": True,
+        "oversized_chunk": None,
+        "windows": [{"start_chunk": 0, "end_chunk": len(chunk_costs), "characters": billable, "available_at": None}]
+    }
+    if subscription is None:
+        return plan
+
+    # Margem de segurança para diferenças de contagem do lado da API
+    margin = 1 - ELEVENLABS_QUOTA_CONFIG["safety_margin"]
+    capacity = int(subscription["remaining"] * margin)
+    full_capacity = int(subscription["character_limit"] * margin)
+    period = ELEVENLABS_QUOTA_CONFIG["reset_period_days"] * 86400
+
+    windows = []
+    start, used = 0, 0
+    for i, cost in enumerate(chunk_costs):
+        if used + cost > capacity:
+            windows.append({"start_chunk": start, "end_chunk": i, "characters": used})
+            if cost > full_capacity:
+                plan["oversized_chunk"] = i
+                break
+            start, used, capacity = i, 0, full_capacity
+        used += cost
+    else:
+        windows.append({"start_chunk": start, "end_chunk": len(chunk_costs), "characters": used})
+
+    # A primeira janela usa a cota atual; as seguintes, as próximas renovações (estimadas a partir da primeira)
+    next_reset = subscription["next_reset"]
+    for k, window in enumerate(windows):
+        if k == 0:
+            window["available_at"] = None
+        elif next_reset:
+            window["available_at"] = next_reset + (k - 1) * period
+        else:
+            window["available_at"] = None
+
+    plan["windows"] = windows
+    plan["fits"] = len(windows) == 1 and plan["oversized_chunk"] is None
+    return plan
+
+def describe_plan(plan):
+    """Resumo legível do plano, para exibir antes da geração."""
+    lines = [f"Caracteres cobrados: {plan['billable_characters']} ({plan['cached_chunks']} de {plan['total_chunks']} chunks já em cache)."]
+    if plan["remaining"] is None:
+        lines.append("Não foi possível consultar a cota da assinatura.")
+        return " ".join(lines)
+
+    lines.append(f"Cota restante: {plan['remaining']} caracteres.")
+    if plan["fits"]:
+        return " ".join(lines)
+
+    first = plan["windows"][0]
+    if first["end_chunk"] == 0:
+        lines.append("A cota atual não cobre nenhum chunk.")
+    else:
+        lines.append(f"A cota atual cobre os chunks 1 a {first['end_chunk']} de {plan['total_chunks']}.")
+    for k, window in enumerate(plan["windows"][1:], start=1):
+        when = datetime.fromtimestamp(window["available_at"]).strftime("%d/%m/%Y") if window["available_at"] else "após a próxima renovação"
+        lines.append(f"Parte {k + 1}: chunks {window['start_chunk'] + 1} a {window['end_chunk']} ({window['characters']} caracteres), a partir de {when}.")
+    if plan["oversized_chunk"] is not None:
+        lines.append(f"O chunk {plan['oversized_chunk'] + 1} excede a cota total da assinatura e não cabe em nenhuma renovação.")
+    return " ".join(lines)
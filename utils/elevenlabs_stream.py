@@ -0,0 +1,128 @@
+import base64
+import json
+import logging
+import threading
+from urllib.parse import urlencode
+from websockets.sync.client import connect
+from config.settings import ELEVENLABS_STREAM_CONFIG
+from utils.audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from utils.elevenlabs_handler import ELEVENLABS_API_KEY, RECOMMENDED_SETTINGS_PT
+from utils.text_segmenter import pop_complete_sentences, split_long_sentence
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+class StreamingTTSSession:
+    """
+    Sessão de TTS com entrada em streaming pela WebSocket da ElevenLabs.
+
+    O texto chega aos poucos (por exemplo, a resposta de um modelo sendo gerada) e é enviado
+    à API sempre que uma frase se completa, com `flush` para que a síntese comece logo. O
+    áudio é devolvido em pedaços à medida que chega, enquanto o restante do texto ainda está
+    sendo escrito. O envio acontece em uma thread própria e a recepção na thread chamadora.
+    """
+
+    def __init__(self, voice_id, model_id="eleven_flash_v2_5", voice_settings=None, output_format=DEFAULT_AUDIO_FORMAT, base_url=None, api_key=None):
+        """
+        Args:
+            voice_id (str): ID da voz
+            model_id (str): ID do modelo
+            voice_settings (dict): Configurações de voz (padrão: recomendadas para português)
+            output_format (str): Formato de saída com suporte nativo na ElevenLabs (chave de AUDIO_FORMATS)
+            base_url (str): Endereço da WebSocket (padrão em ELEVENLABS_STREAM_CONFIG; útil para servidores locais de teste)
+            api_key (str): Chave da API (padrão: ELEVENLABS_API_KEY)
+        """
+        if output_format not in AUDIO_FORMATS or not AUDIO_FORMATS[output_format]["elevenlabs"]:
+            raise ValueError(f"Formato sem suporte nativo na ElevenLabs para streaming: {output_format}")
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.voice_settings = voice_settings or RECOMMENDED_SETTINGS_PT
+        self.native_format = AUDIO_FORMATS[output_format]["elevenlabs"]
+        self.base_url = (base_url or ELEVENLABS_STREAM_CONFIG["base_url"]).rstrip("/")
+        self.api_key = api_key if api_key is not None else ELEVENLABS_API_KEY
+        self.sent_chars = 0
+        self.audio_bytes = 0
+
+    @property
+    def url(self):
+        query = urlencode({"model_id": self.model_id, "output_format": self.native_format})
+        return f"{self.base_url}/v1/text-to-speech/{self.voice_id}/stream-input?{query}"
+
+    def _send_text(self, websocket, text, flush):
+        message = {"text": text + " "}
+        if flush:
+            message["flush"] = True
+        websocket.send(json.dumps(message))
+        self.sent_chars += len(text)
+
+    def _send_all(self, websocket, text_stream, errors):
+        # Envia as frases completas assim que se formam; o resto fica no buffer até a próxima
+        max_buffer = ELEVENLABS_STREAM_CONFIG["max_buffer_chars"]
+        buffer = ""
+        try:
+            for piece in text_stream:
+                if not piece:
+                    continue
+                buffer += piece
+                complete, buffer = pop_complete_sentences(buffer)
+                if complete:
+                    self._send_text(websocket, complete, flush=True)
+                if len(buffer) > max_buffer:
+                    # Frase longa demais sem pontuação final: enviar até a última pausa natural
+                    parts = split_long_sentence(buffer, max_buffer)
+                    self._send_text(websocket, " ".join(parts[:-1]), flush=True)
+                    buffer = parts[-1]
+            if buffer.strip():
+                self._send_text(websocket, buffer.strip(), flush=True)
+        except Exception as e:
+            logger.error(f"Erro ao enviar texto para a ElevenLabs: {str(e)}")
+            errors.append(e)
+        finally:
+            # Texto vazio encerra a entrada; a API termina de gerar e envia isFinal
+            try:
+                websocket.send(json.dumps({"text": ""}))
+            except Exception:
+                pass
+
+    def stream(self, text_stream):
+        """
+        Sintetiza o texto recebido aos poucos e devolve o áudio à medida que é gerado.
+
+        Args:
+            text_stream (iterable): Trechos de texto, na ordem (ex.: saída de api_handler.stream_chunk)
+
+        Yields:
+            bytes: Pedaços de áudio no formato de saída
+        """
+        errors = []
+        with connect(self.url, additional_headers={"xi-api-key": self.api_key}, open_timeout=ELEVENLABS_STREAM_CONFIG["receive_timeout"]) as websocket:
+            # Mensagem inicial: configurações de voz e quando a API deve começar a gerar
+            websocket.send(json.dumps({
+                "text": " ",
+                "voice_settings": self.voice_settings,
+                "generation_config": {"chunk_length_schedule": ELEVENLABS_STREAM_CONFIG["chunk_length_schedule"]}
+            }))
+
+            sender = threading.Thread(target=self._send_all, args=(websocket, text_stream, errors), name="elevenlabs-ws-send", daemon=True)
+            sender.start()
+            try:
+                while True:
+                    message = json.loads(websocket.recv(timeout=ELEVENLABS_STREAM_CONFIG["receive_timeout"]))
+                    if message.get("error"):
+                        raise Exception(f"Erro na WebSocket da ElevenLabs: {message.get('message') or message['error']}")
+                    if message.get("audio"):
+                        audio = base64.b64decode(message["audio"])
+                        self.audio_bytes += len(audio)
+                        yield audio
+                    if message.get("isFinal"):
+                        break
+            finally:
+                sender.join(timeout=1)
+
+        if errors:
+            raise Exception(f"Erro ao enviar texto para a ElevenLabs: {str(errors[0])}")
+        logger.info(f"Streaming concluído: {self.sent_chars} caracteres enviados, {self.audio_bytes} bytes de áudio")
+
+def stream_elevenlabs_tts(text_stream, voice_id, model_id="eleven_flash_v2_5", custom_settings=None, output_format=DEFAULT_AUDIO_FORMAT):
+    """Atalho para StreamingTTSSession(...).stream(text_stream)."""
+    return StreamingTTSSession(voice_id, model_id, custom_settings, output_format).stream(text_stream)
@@ -0,0 +1,158 @@
+import base64
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from config.settings import VISION_ENCODING_CONFIG
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Formatos aceitos pela API de visão da Anthropic
+MEDIA_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp"
+}
+
+def _target_size(size, max_long_edge):
+    width, height = size
+    if width > height:
+        new_width = max_long_edge
+        new_height = int((new_width / width) * height)
+    else:
+        new_height = max_long_edge
+        new_width = int((new_height / height) * width)
+    return new_width, new_height
+
+def resize_image(image, max_long_edge=1568):
+    """Redimensiona a imagem para não exceder 1568px no lado mais longo, mantendo a proporção."""
+    width, height = image.size
+    if max(width, height) > max_long_edge:
+        # reducing_gap faz o Pillow reduzir por fator inteiro (Image.reduce) antes do LANCZOS
+        return image.resize(_target_size(image.size, max_long_edge), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return image
+
+def is_line_art(image, max_colors=None):
+    """Indica se a imagem tem poucas cores (diagramas, tabelas, texto), onde o PNG sem perdas é mais compacto."""
+    max_colors = max_colors or VISION_ENCODING_CONFIG["line_art_max_colors"]
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((128, 128))
+    return thumbnail.getcolors(maxcolors=max_colors) is not None
+
+def _to_rgb(image):
+    """Converte para um modo aceito por JPEG/WebP, aplicando fundo branco em imagens com transparência."""
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return image.convert("RGB")
+
+def _save(image, image_format, **params):
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format, **params)
+    return buffered.getvalue()
+
+def _normalize_mode(image):
+    """Converte modos que o redimensionamento ou os codificadores não tratam bem (paleta, CMYK, 16 bits)."""
+    if image.mode in ("RGB", "L", "RGBA", "LA"):
+        return image
+    if image.mode == "1":
+        return image.convert("L")
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image.convert("RGB")
+
+def _encode(image, max_bytes):
+    """Escolhe o formato e a qualidade da imagem já redimensionada; retorna (formato, bytes)."""
+    if is_line_art(image):
+        data = _save(image, "PNG", optimize=True)
+        if len(data) <= max_bytes:
+            return "PNG", data
+
+    image_format = VISION_ENCODING_CONFIG["lossy_format"]
+    candidate = _to_rgb(image)
+    while True:
+        for quality in VISION_ENCODING_CONFIG["quality_steps"]:
+            data = _save(candidate, image_format, quality=quality)
+            if len(data) <= max_bytes:
+                return image_format, data
+        if min(candidate.size) <= 256:
+            break
+        # Nem a menor qualidade coube no orçamento: reduzir a resolução e tentar novamente
+        candidate = candidate.resize(
+            (int(candidate.width * 0.75), int(candidate.height * 0.75)),
+            Image.Resampling.LANCZOS
+        )
+
+    logger.warning(f"Imagem codificada excede o orçamento: {len(data)} bytes (limite {max_bytes})")
+    return image_format, data
+
+def preprocess_image(image, max_bytes=None, max_long_edge=1568):
+    """
+    Prepara uma imagem para a API de visão: redução rápida, conversão de cor e codificação.
+
+    Imagens com poucas cores usam PNG sem perdas; fotografias e exames usam o formato
+    com perdas configurado, reduzindo a qualidade (e, se preciso, a resolução) até caber
+    no orçamento de bytes por imagem. A imagem recebida não é alterada.
+
+    Args:
+        image (PIL.Image): Imagem original
+        max_bytes (int): Orçamento de bytes por imagem (antes do base64)
+        max_long_edge (int): Lado mais longo máximo, em pixels
+
+    Returns:
+        tuple: ({"media_type": tipo MIME, "data": imagem em base64}, tempos da preparação em ms)
+    """
+    max_bytes = max_bytes or VISION_ENCODING_CONFIG["max_image_bytes"]
+    timings = {"original_size": image.size}
+
+    start = time.perf_counter()
+    working = _normalize_mode(image)
+    timings["convert_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    working = resize_image(working, max_long_edge)
+    timings["resize_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    image_format, data = _encode(working, max_bytes)
+    timings["encode_ms"] = (time.perf_counter() - start) * 1000
+    timings["format"] = image_format
+    timings["bytes"] = len(data)
+
+    encoded = {
+        "media_type": MEDIA_TYPES[image_format],
+        "data": base64.b64encode(data).decode("utf-8")
+    }
+    return encoded, timings
+
+def preprocess_images(images, max_workers=None):
+    """
+    Prepara as imagens em paralelo, preservando a ordem.
+
+    Returns:
+        tuple: (lista de imagens codificadas, lista de tempos por imagem)
+    """
+    max_workers = max_workers or VISION_ENCODING_CONFIG["workers"]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-prep") as executor:
+        results = list(executor.map(preprocess_image, images))
+    return [encoded for encoded, _ in results], [timings for _, timings in results]
+
+def summarize_timings(timings):
+    """Resume os tempos de preparação das imagens em uma linha."""
+    prepared = [t for t in timings if not t.get("cached")]
+    total = {
+        step: sum(t.get(step, 0) for t in timings)
+        for step in ("hash_ms", "convert_ms", "resize_ms", "encode_ms")
+    }
+    return (
+        f"Preparação de {len(timings)} imagens ({len(timings) - len(prepared)} do cache): "
+        f"hash {total['hash_ms']:.0f} ms, conversão {total['convert_ms']:.0f} ms, "
+        f"redimensionamento {total['resize_ms']:.0f} ms, codificação {total['encode_ms']:.0f} ms, "
+        f"{sum(t.get('bytes', 0) for t in timings)} bytes"
+    )
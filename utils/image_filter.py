@@ -0,0 +1,70 @@
+import logging
+import numpy as np
+from config.settings import get_image_filter_settings
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+def image_metrics(image, sample_edge=256):
+    """
+    Calcula métricas baratas de conteúdo sobre uma miniatura em tons de cinza.
+
+    Returns:
+        dict: {"area": pixels da imagem original, "std": desvio padrão da intensidade,
+               "edge_density": fração de pixels com gradiente forte}
+    """
+    width, height = image.size
+    gray = image.convert("L")
+    gray.thumbnail((sample_edge, sample_edge))
+    pixels = np.asarray(gray, dtype=np.float32)
+
+    if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+        return {"area": width * height, "std": float(pixels.std()), "edge_density": 0.0}
+
+    # Gradientes horizontal e vertical recortados para a mesma forma
+    grad_x = np.abs(np.diff(pixels, axis=1))[:-1, :]
+    grad_y = np.abs(np.diff(pixels, axis=0))[:, :-1]
+    edges = np.maximum(grad_x, grad_y) > 32
+
+    return {
+        "area": width * height,
+        "std": float(pixels.std()),
+        "edge_density": float(edges.mean())
+    }
+
+def screen_images(images, prompt_type=None, settings=None):
+    """
+    Separa imagens em branco ou com pouca informação antes da análise de visão.
+
+    Args:
+        images (list): Imagens PIL na ordem do documento
+        prompt_type (str): Tipo de prompt, usado para escolher os limites
+        settings (dict): Limites explícitos (substituem os do tipo de prompt)
+
+    Returns:
+        tuple: (imagens a enviar, lista de {"index", "reason", "metrics"} das imagens descartadas ou sinalizadas)
+    """
+    settings = settings or get_image_filter_settings(prompt_type)
+    if not settings["enabled"]:
+        return list(images), []
+
+    kept = []
+    rejected = []
+    for i, image in enumerate(images):
+        metrics = image_metrics(image)
+        reason = None
+        if metrics["area"] < settings["min_area"]:
+            reason = f"área pequena ({metrics['area']} px)"
+        elif metrics["std"] < settings["min_std"]:
+            reason = f"pouca variação ({metrics['std']:.1f})"
+        elif metrics["edge_density"] < settings["min_edge_density"]:
+            reason = f"poucas bordas ({metrics['edge_density']:.4f})"
+
+        if reason:
+            rejected.append({"index": i, "reason": reason, "metrics": metrics})
+            logger.info(f"Imagem {i + 1} com pouca informação: {reason}")
+            if settings["action"] == "drop":
+                continue
+        kept.append(image)
+
+    return kept, rejected
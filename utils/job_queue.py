@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from config.settings import JOB_CONFIG
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Estados de um trabalho; os três últimos são finais
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINAL_STATUSES = (DONE, FAILED, CANCELLED)
+STATUS_LABELS = {
+    QUEUED: "Na fila",
+    RUNNING: "Em execução",
+    DONE: "Concluído",
+    FAILED: "Falhou",
+    CANCELLED: "Cancelado"
+}
+
+# Raiz do projeto, de onde os processos de trabalho são iniciados (python -m utils.job_worker)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Processos de trabalho iniciados por este processo (consultados para não deixar processos zumbis)
+_spawned = []
+
+def _directory():
+    directory = os.path.abspath(JOB_CONFIG["directory"])
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def job_dir(job_id):
+    return os.path.join(_directory(), job_id)
+
+def _workers_dir():
+    directory = os.path.join(_directory(), "_workers")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def _write_json(path, data):
+    # Gravação atômica: quem lê nunca encontra o arquivo pela metade
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _pid_alive(pid):
+    for process in list(_spawned):
+        if process.poll() is not None:
+            _spawned.remove(process)
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def submit_job(kind, params, files=None):
+    """
+    Registra um novo trabalho na fila.
+
+    Args:
+        kind (str): Tipo do trabalho ("document" ou "tts", ver utils.job_worker)
+        params (dict): Parâmetros serializáveis em JSON
+        files (list): Arquivos de entrada como (nome, bytes), copiados para o diretório do trabalho
+
+    Returns:
+        str: ID do trabalho
+    """
+    cleanup_jobs()
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    directory = job_dir(job_id)
+    inputs_dir = os.path.join(directory, "inputs")
+    os.makedirs(inputs_dir)
+
+    input_files = []
+    for i, (name, data) in enumerate(files or []):
+        # Prefixo numérico: mantém a ordem e evita colisões entre nomes iguais
+        path = os.path.join(inputs_dir, f"{i:03d}_{os.path.basename(name)}")
+        with open(path, "wb") as f:
+            f.write(data)
+        input_files.append(path)
+
+    _write_json(os.path.join(directory, "job.json"), {
+        "id": job_id,
+        "kind": kind,
+        "status": QUEUED,
+        "params": params,
+        "files": input_files,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "progress": {"current": 0, "total": 0, "message": "Na fila"},
+        "messages": [],
+        "result": None,
+        "error": None,
+        "worker_pid": None
+    })
+    logger.info(f"Trabalho {job_id} ({kind}) adicionado à fila")
+    return job_id
+
+def _read_job(job_id):
+    # Um trabalho em execução cujo processo de trabalho não existe mais é apresentado como falho.
+    # O arquivo não é alterado: apenas o processo que reservou o trabalho grava nele
+    path = os.path.join(job_dir(job_id), "job.json")
+    job = _read_json(path)
+    if job and job["status"] == RUNNING and not _pid_alive(job["worker_pid"]):
+        try:
+            # A última gravação do processo interrompido marca o fim do trabalho
+            finished_at = os.path.getmtime(path)
+        except OSError:
+            finished_at = time.time()
+        job.update(status=FAILED, error="O processo de trabalho foi interrompido.", finished_at=finished_at)
+    return job
+
+def get_job(job_id):
+    """
+    Estado atual de um trabalho, ou None se ele não existir.
+
+    Um trabalho em execução cujo processo de trabalho não existe mais é devolvido como falho.
+    """
+    return _read_job(job_id)
+
+def update_job(job_id, **changes):
+    """
+    Atualiza campos do trabalho.
+
+    A leitura seguida de gravação não é protegida por trava: só deve ser chamada pelo processo
+    que reservou o trabalho (ver _claim), que é então o único a gravar no arquivo.
+    """
+    path = os.path.join(job_dir(job_id), "job.json")
+    job = _read_json(path)
+    if job is None:
+        return None
+    job.update(changes)
+    _write_json(path, job)
+    return job
+
+def _job_ids():
+    # Diretórios iniciados por "_" (registro dos processos de trabalho) não são trabalhos
+    return [name for name in os.listdir(_directory()) if not name.startswith("_")]
+
+def list_jobs(limit=None):
+    """Trabalhos registrados, dos mais recentes para os mais antigos."""
+    jobs = [job for job in (get_job(job_id) for job_id in _job_ids()) if job]
+    jobs.sort(key=lambda job: job["created_at"], reverse=True)
+    return jobs[:limit] if limit else jobs
+
+def _claim(job_id):
+    # A criação exclusiva do arquivo garante que apenas um processo fique com o trabalho
+    try:
+        fd = os.open(os.path.join(job_dir(job_id), "claim"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+def claim_next_job():
+    """Reserva o trabalho mais antigo da fila para o processo atual e o marca como em execução."""
+    queued = []
+    for job_id in _job_ids():
+        job = _read_json(os.path.join(job_dir(job_id), "job.json"))
+        if job and job["status"] == QUEUED:
+            queued.append(job)
+    for job in sorted(queued, key=lambda job: job["created_at"]):
+        if _claim(job["id"]):
+            return update_job(job["id"], status=RUNNING, started_at=time.time(), worker_pid=os.getpid())
+    return None
+
+def cancel_job(job_id):
+    """
+    Pede o cancelamento de um trabalho.
+
+    Um trabalho ainda na fila é cancelado imediatamente; um em execução é interrompido pelo
+    processo de trabalho na próxima atualização de progresso.
+    """
+    job = get_job(job_id)
+    if job is None or job["status"] in FINAL_STATUSES:
+        return job
+    open(os.path.join(job_dir(job_id), "cancel"), "w").close()
+    if job["status"] == QUEUED and _claim(job_id):
+        return update_job(job_id, status=CANCELLED, finished_at=time.time())
+    return job
+
+def is_cancelled(job_id):
+    return os.path.exists(os.path.join(job_dir(job_id), "cancel"))
+
+def is_active(job):
+    return bool(job) and job["status"] not in FINAL_STATUSES
+
+def cleanup_jobs(max_age_hours=None):
+    """Remove os diretórios de trabalhos finalizados há mais de max_age_hours."""
+    max_age_hours = max_age_hours if max_age_hours is not None else JOB_CONFIG["max_age_hours"]
+    limit = time.time() - max_age_hours * 3600
+    removed = 0
+    for job_id in _job_ids():
+        job = _read_job(job_id)
+        if job and job["status"] in FINAL_STATUSES and (job["finished_at"] or 0) < limit:
+            shutil.rmtree(job_dir(job_id), ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"{removed} trabalhos antigos removidos")
+    return removed
+
+def register_worker():
+    """Registra o processo atual como processo de trabalho (ver ensure_workers)."""
+    path = os.path.join(_workers_dir(), f"{os.getpid()}.pid")
+    open(path, "w").close()
+    return path
+
+def running_workers():
+    """PIDs dos processos de trabalho ativos; registros de processos encerrados são descartados."""
+    pids = []
+    for name in os.listdir(_workers_dir()):
+        if not name.endswith(".pid"):
+            continue
+        pid = int(name.split(".")[0])
+        if _pid_alive(pid):
+            pids.append(pid)
+        else:
+            try:
+                os.remove(os.path.join(_workers_dir(), name))
+            except OSError:
+                pass
+    return pids
+
+def ensure_workers(count=None):
+    """
+    Garante que haja processos de trabalho ativos para consumir a fila.
+
+    Os processos são iniciados em uma sessão própria, de modo que continuam rodando se o
+    Streamlit for reiniciado ou a aba do navegador for fechada, e encerram sozinhos depois
+    de JOB_CONFIG["idle_timeout"] segundos sem trabalhos.
+    """
+    count = count or JOB_CONFIG["workers"]
+    missing = count - len(running_workers())
+    log_path = os.path.join(_workers_dir(), "worker.log")
+    for _ in range(max(0, missing)):
+        with open(log_path, "a") as log_file:
+            process = subprocess.Popen(
+                [sys.executable, "-m", "utils.job_worker"],
+                cwd=_PROJECT_ROOT,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        _spawned.append(process)
+        # Registra já aqui, para que chamadas seguintes não iniciem processos a mais
+        open(os.path.join(_workers_dir(), f"{process.pid}.pid"), "w").close()
+        logger.info(f"Processo de trabalho iniciado (PID {process.pid})")
+    return max(0, missing)
@@ -0,0 +1,113 @@
+import logging
+import os
+import time
+from config.settings import JOB_CONFIG
+from utils.audio_formats import AUDIO_FORMATS
+from utils.artifact_store import new_artifact, save_artifact
+from utils.document_pipeline import ProcessingCancelled, process_document, synthesize_text
+from utils.file_manager import save_processed_text
+from utils.job_queue import (
+    DONE, FAILED, CANCELLED,
+    claim_next_job, update_job, is_cancelled, job_dir, register_worker
+)
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+class JobReporter:
+    """Grava o progresso do trabalho em disco (com intervalo mínimo) e interrompe a execução quando ele é cancelado."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.messages = []
+        self._last_write = 0.0
+
+    def progress(self, current, total, message):
+        if is_cancelled(self.job_id):
+            raise ProcessingCancelled()
+        now = time.time()
+        if now - self._last_write >= JOB_CONFIG["progress_interval"] or current == total:
+            self._last_write = now
+            update_job(self.job_id, progress={"current": current, "total": total, "message": message})
+
+    def status(self, message):
+        if is_cancelled(self.job_id):
+            raise ProcessingCancelled()
+        self.messages.append(message)
+        update_job(self.job_id, messages=self.messages[-20:])
+
+def _run_document(job, reporter):
+    params = job["params"]
+    audio_artifact = new_artifact("mp3", "narracao.mp3") if params.get("narration") else None
+    result = process_document(
+        params,
+        file_paths=job["files"],
+        text=params.get("text", ""),
+        progress_callback=reporter.progress,
+        status_callback=reporter.status,
+        audio_path=audio_artifact["path"] if audio_artifact else None
+    )
+    # O texto fica no diretório do trabalho e, como no aplicativo, no arquivo de saída escolhido
+    text_path = os.path.join(job_dir(job["id"]), "result.txt")
+    save_processed_text(text_path, result["text"])
+    if params.get("output_file"):
+        save_processed_text(params["output_file"], result["text"])
+    return {
+        "text_path": text_path,
+        "audio": audio_artifact if result["audio_path"] else None,
+        "narration_error": result["narration_error"]
+    }
+
+def _run_tts(job, reporter):
+    audio_bytes, audio_format = synthesize_text(job["params"], callback=reporter.progress)
+    audio_info = AUDIO_FORMATS[audio_format]
+    name = job["params"].get("download_name", "audiobook")
+    artifact = save_artifact(audio_bytes, audio_info["extension"], f"{name}.{audio_info['extension']}")
+    return {"audio": artifact, "audio_format": audio_format}
+
+# Funções de execução por tipo de trabalho
+JOB_RUNNERS = {
+    "document": _run_document,
+    "tts": _run_tts
+}
+
+def run_job(job):
+    """Executa um trabalho já reservado e grava o resultado, o erro ou o cancelamento."""
+    job_id = job["id"]
+    logger.info(f"Executando o trabalho {job_id} ({job['kind']})")
+    reporter = JobReporter(job_id)
+    try:
+        runner = JOB_RUNNERS.get(job["kind"])
+        if runner is None:
+            raise ValueError(f"Tipo de trabalho desconhecido: {job['kind']}")
+        result = runner(job, reporter)
+        update_job(job_id, status=DONE, result=result, finished_at=time.time())
+        logger.info(f"Trabalho {job_id} concluído")
+    except ProcessingCancelled:
+        update_job(job_id, status=CANCELLED, finished_at=time.time())
+        logger.info(f"Trabalho {job_id} cancelado")
+    except Exception as e:
+        update_job(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        logger.error(f"Trabalho {job_id} falhou: {str(e)}")
+
+def main():
+    """Consome a fila até ficar JOB_CONFIG["idle_timeout"] segundos sem trabalhos."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    pid_file = register_worker()
+    idle_since = time.time()
+    try:
+        while time.time() - idle_since < JOB_CONFIG["idle_timeout"]:
+            job = claim_next_job()
+            if job is None:
+                time.sleep(JOB_CONFIG["poll_interval"])
+                continue
+            run_job(job)
+            idle_since = time.time()
+    finally:
+        try:
+            os.remove(pid_file)
+        except OSError:
+            pass
+
+if __name__ == "__main__":
+    main()
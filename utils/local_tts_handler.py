@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from config.settings import LOCAL_TTS_CONFIG
+from utils.audio_formats import AUDIO_FORMATS, LOCAL_FORMATS, ffmpeg_available, transcode
+from utils.text_segmenter import split_text_into_chunks
+
+try:
+    from piper.voice import PiperVoice
+except ImportError:  # TTS local é opcional
+    PiperVoice = None
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+def local_tts_available(model_path=None):
+    """Indica se o Piper está instalado e o modelo de voz existe."""
+    model_path = model_path or LOCAL_TTS_CONFIG["model_path"]
+    return PiperVoice is not None and os.path.exists(model_path)
+
+@lru_cache(maxsize=2)
+def _load_voice(model_path):
+    # Cada processo carrega o modelo uma única vez
+    return PiperVoice.load(model_path)
+
+def _synthesize_pcm(model_path, text):
+    """Sintetiza um chunk e devolve (PCM 16 bits mono, taxa de amostragem)."""
+    voice = _load_voice(model_path)
+    if hasattr(voice, "synthesize_stream_raw"):
+        # piper-tts 1.2
+        audio = b"".join(voice.synthesize_stream_raw(text))
+    else:
+        # piper-tts 1.3+: synthesize devolve pedaços de áudio por frase
+        audio = b"".join(chunk.audio_int16_bytes for chunk in voice.synthesize(text))
+    return audio, voice.config.sample_rate
+
+def _get_pool(model_path, max_workers):
+    """Pool de processos reaproveitado entre chamadas, para não recarregar o modelo a cada geração."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != (model_path, max_workers):
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_load_voice, initargs=(model_path,))
+            _pool_key = (model_path, max_workers)
+        return _pool
+
+def local_output_format(output_format):
+    """Formato efetivamente gerado: o pedido, se possível sem API; caso contrário, WAV."""
+    if output_format in LOCAL_FORMATS or ffmpeg_available():
+        return output_format
+    return "wav"
+
+def generate_local_tts(text, model_path=None, callback=None, output_format="wav", max_workers=None):
+    """
+    Gera áudio localmente, sem chamadas de rede, com o Piper (CPU).
+
+    O texto é dividido em frases agrupadas em chunks curtos, sintetizados em paralelo em
+    vários processos (um modelo carregado por processo) e unidos na ordem original, com uma
+    pequena pausa entre eles. Textos de um único chunk (prévias) são sintetizados no próprio
+    processo, sem o custo de iniciar o pool.
+
+    Args:
+        text (str): Texto para converter em áudio
+        model_path (str): Modelo de voz do Piper (.onnx, com o .onnx.json ao lado)
+        callback (function): Callback (current, total, message), chamado sempre na thread chamadora
+        output_format (str): Formato de saída (chave de AUDIO_FORMATS); apenas o WAV dispensa o ffmpeg
+        max_workers (int): Processos de síntese (padrão em LOCAL_TTS_CONFIG)
+
+    Returns:
+        bytes: Áudio no formato de saída
+    """
+    model_path = model_path or LOCAL_TTS_CONFIG["model_path"]
+    if PiperVoice is None:
+        raise ValueError("TTS local indisponível: instale o pacote piper-tts.")
+    if not os.path.exists(model_path):
+        raise ValueError(f"Modelo de voz do Piper não encontrado: {model_path}")
+    if output_format not in AUDIO_FORMATS:
+        raise ValueError(f"Formato de áudio desconhecido: {output_format}")
+    if output_format not in LOCAL_FORMATS and not ffmpeg_available():
+        raise ValueError(f"O formato {AUDIO_FORMATS[output_format]['name']} exige o ffmpeg instalado.")
+    if not text.strip():
+        raise ValueError("Texto vazio fornecido para geração de áudio.")
+
+    chunks = split_text_into_chunks(text, LOCAL_TTS_CONFIG["chunk_chars"])
+    max_workers = max_workers or LOCAL_TTS_CONFIG["workers"]
+    logger.info(f"TTS local: {len(chunks)} chunks ({min(max_workers, len(chunks))} processos)")
+
+    if callback:
+        callback(0, len(chunks), f"Sintetizando {len(chunks)} chunks localmente...")
+
+    audio_parts = [None] * len(chunks)
+    sample_rate = None
+    if len(chunks) == 1 or max_workers == 1:
+        for i, chunk in enumerate(chunks):
+            audio_parts[i], sample_rate = _synthesize_pcm(model_path, chunk)
+            if callback:
+                callback(i + 1, len(chunks), f"Chunk {i+1}/{len(chunks)} sintetizado localmente")
+    else:
+        pool = _get_pool(model_path, max_workers)
+        futures = {pool.submit(_synthesize_pcm, model_path, chunk): i for i, chunk in enumerate(chunks)}
+        completed = 0
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                completed += 1
+                try:
+                    audio_parts[i], sample_rate = future.result()
+                except Exception as e:
+                    error_message = f"Falha ao processar chunk {i+1}/{len(chunks)}: {str(e)}"
+                    logger.error(error_message)
+                    if callback:
+                        callback(completed, len(chunks), error_message)
+                    raise Exception(error_message)
+                if callback:
+                    callback(completed, len(chunks), f"Chunk {i+1}/{len(chunks)} sintetizado localmente ({completed}/{len(chunks)} concluídos)")
+        finally:
+            for future in futures:
+                future.cancel()
+
+    # Pausa curta entre chunks, já que cada um termina em fim de frase
+    silence = b"\x00\x00" * int(sample_rate * LOCAL_TTS_CONFIG["sentence_silence"])
+    return transcode(silence.join(audio_parts), output_format, sample_rate)
+
+def generate_with_fallback(generate, text, callback=None, output_format="mp3"):
+    """
+    Executa a geração remota e, se ela falhar, recorre ao TTS local.
+
+    Só falhas da API remota (conexão, erros da API, limite de requisições) levam ao TTS local.
+    ValueError (entrada inválida, chave não configurada ou cota insuficiente com a política
+    "refuse") é repassado: um pedido recusado não deve ser narrado com a voz local.
+
+    Args:
+        generate (function): Sem argumentos; chama a API remota e devolve o áudio
+        text (str): Texto a narrar localmente em caso de falha
+        callback (function): Callback (current, total, message)
+        output_format (str): Formato pedido à API remota
+
+    Returns:
+        tuple: (áudio em bytes, formato efetivamente gerado)
+    """
+    try:
+        return generate(), output_format
+    except ValueError:
+        raise
+    except Exception as e:
+        if not LOCAL_TTS_CONFIG["fallback"] or not local_tts_available():
+            raise
+        logger.warning(f"Falha no TTS remoto ({str(e)}); usando o TTS local")
+        if callback:
+            callback(0, 1, f"Falha no TTS remoto ({str(e)}). Gerando com o TTS local...")
+        fallback_format = local_output_format(output_format)
+        return generate_local_tts(text, callback=callback, output_format=fallback_format), fallback_format
@@ -0,0 +1,227 @@
+import io
+import logging
+import struct
+from array import array
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Tabelas do cabeçalho de quadro MPEG Layer III (saída da OpenAI e da ElevenLabs)
+BITRATES_KBPS = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],   # MPEG-1
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]         # MPEG-2 e MPEG-2.5
+}
+
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],   # MPEG-1
+    2: [22050, 24000, 16000],   # MPEG-2
+    0: [11025, 12000, 8000]     # MPEG-2.5
+}
+
+XING_FLAGS = 0x0F  # quadros + bytes + TOC + qualidade
+
+def parse_frame_header(data, offset=0):
+    """
+    Interpreta um cabeçalho de quadro MPEG Layer III.
+
+    Returns:
+        dict ou None: versão, índices, taxa de amostragem, canais e tamanho do quadro
+    """
+    if len(data) - offset < 4:
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    bitrate = BITRATES_KBPS[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    channel_mode = (b3 >> 6) & 0x03
+    mono = channel_mode == 3
+
+    return {
+        "version_bits": version_bits,
+        "bitrate_index": bitrate_index,
+        "sample_rate_index": sample_rate_index,
+        "sample_rate": sample_rate,
+        "channel_mode": channel_mode,
+        "samples": 1152 if mpeg1 else 576,
+        "side_info": (17 if mono else 32) if mpeg1 else (9 if mono else 17),
+        "length": (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+    }
+
+def _is_info_frame(frame, header):
+    """Indica se o quadro é um cabeçalho Xing/Info/VBRI, e não áudio."""
+    offset = 4 + header["side_info"]
+    return frame[offset:offset + 4] in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+
+def _id3v2_size(data, offset):
+    """Tamanho total de uma tag ID3v2 iniciada em offset, ou None se ainda faltam bytes."""
+    if len(data) - offset < 10:
+        return None
+    size = 0
+    for byte in data[offset + 6:offset + 10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[offset + 5] & 0x10 else 0
+    return 10 + size + footer
+
+class Mp3Splicer:
+    """
+    Junta vários MP3 em um único arquivo sem decodificar nem recodificar.
+
+    Cada segmento (um chunk de TTS) tem as tags ID3 e o quadro Xing/Info/VBRI removidos;
+    apenas os quadros de áudio são copiados. No início do arquivo é reservado um quadro
+    Xing, reescrito em `finish` com o total de quadros, bytes e a tabela de busca (TOC),
+    para que os players mostrem a duração correta e consigam avançar no áudio.
+    A saída precisa aceitar `seek`; os dados podem chegar em pedaços de qualquer tamanho.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.buffer = bytearray()
+        self.template = None
+        self.header_offset = None
+        self.header_length = 0
+        self.frame_offsets = array("Q")
+        self.audio_bytes = 0
+        self.bitrates = set()
+        self.first_frame_of_segment = True
+
+    def start_segment(self):
+        """Marca o início de um novo MP3 (o primeiro quadro pode ser um cabeçalho Xing/Info)."""
+        self._discard_partial()
+        self.first_frame_of_segment = True
+
+    def feed(self, data):
+        """Recebe bytes do segmento atual e grava os quadros de áudio completos."""
+        self.buffer.extend(data)
+        buf = self.buffer
+        pos = 0
+        while True:
+            if buf[pos:pos + 3] == b"ID3":
+                tag_size = _id3v2_size(buf, pos)
+                if tag_size is None or len(buf) - pos < tag_size:
+                    break
+                pos += tag_size
+                continue
+
+            header = parse_frame_header(buf, pos)
+            if header is None:
+                if len(buf) - pos < 4:
+                    break
+                if buf[pos:pos + 3] == b"TAG":
+                    # Tag ID3v1 no fim do segmento
+                    if len(buf) - pos < 128:
+                        break
+                    pos += 128
+                    continue
+                # Dados que não são quadros: avançar até o próximo byte de sincronismo
+                next_sync = buf.find(b"\xff", pos + 1)
+                pos = len(buf) if next_sync == -1 else next_sync
+                continue
+
+            if len(buf) - pos < header["length"]:
+                break
+
+            frame = bytes(buf[pos:pos + header["length"]])
+            pos += header["length"]
+            if self.first_frame_of_segment:
+                self.first_frame_of_segment = False
+                if _is_info_frame(frame, header):
+                    continue
+            self._write_frame(frame, header)
+
+        del buf[:pos]
+
+    def _write_frame(self, frame, header):
+        if self.template is None:
+            self.template = header
+            self.header_offset = self.output.tell()
+            placeholder = self._build_xing_frame(flags=0)
+            self.header_length = len(placeholder)
+            self.output.write(placeholder)
+        elif (header["version_bits"], header["sample_rate_index"]) != (self.template["version_bits"], self.template["sample_rate_index"]):
+            logger.warning("Segmentos MP3 com taxas de amostragem diferentes; a duração pode ficar incorreta.")
+
+        self.frame_offsets.append(self.audio_bytes)
+        self.audio_bytes += len(frame)
+        self.bitrates.add(header["bitrate_index"])
+        self.output.write(frame)
+
+    def _discard_partial(self):
+        if self.buffer:
+            logger.warning(f"Descartando {len(self.buffer)} bytes incompletos no fim do segmento MP3")
+            self.buffer.clear()
+
+    def _build_xing_frame(self, flags=XING_FLAGS):
+        """Monta um quadro Xing/Info com os mesmos parâmetros do áudio."""
+        template = self.template
+        required = 4 + template["side_info"] + 4 + 4 + 4 + 4 + 100 + 4
+        mpeg1 = template["version_bits"] == 3
+        bitrate_index = None
+        for index in range(1, 15):
+            bitrate = BITRATES_KBPS[1 if mpeg1 else 2][index] * 1000
+            length = (144 if mpeg1 else 72) * bitrate // template["sample_rate"]
+            if length >= required:
+                bitrate_index = index
+                break
+
+        header = bytes([
+            0xFF,
+            0xE0 | (template["version_bits"] << 3) | (1 << 1) | 0x01,  # Layer III, sem CRC
+            (bitrate_index << 4) | (template["sample_rate_index"] << 2),
+            template["channel_mode"] << 6
+        ])
+        frame = bytearray(length)
+        frame[0:4] = header
+
+        offset = 4 + template["side_info"]
+        tag = b"Xing" if len(self.bitrates) > 1 else b"Info"
+        frame[offset:offset + 8] = tag + struct.pack(">I", flags)
+        if flags:
+            total_frames = len(self.frame_offsets)
+            total_bytes = self.header_length + self.audio_bytes
+            toc = bytearray(100)
+            for i in range(100):
+                frame_index = min(total_frames - 1, i * total_frames // 100)
+                position = self.header_length + self.frame_offsets[frame_index]
+                toc[i] = min(255, position * 256 // total_bytes)
+            frame[offset + 8:offset + 16] = struct.pack(">II", total_frames, total_bytes)
+            frame[offset + 16:offset + 116] = toc
+            frame[offset + 116:offset + 120] = struct.pack(">I", 0)
+        return bytes(frame)
+
+    def finish(self):
+        """Grava o cabeçalho Xing definitivo no início do arquivo."""
+        self._discard_partial()
+        if self.template is None:
+            return
+        end = self.output.tell()
+        self.output.seek(self.header_offset)
+        self.output.write(self._build_xing_frame())
+        self.output.seek(end)
+
+    @property
+    def duration(self):
+        """Duração do áudio gravado, em segundos."""
+        if self.template is None:
+            return 0.0
+        return len(self.frame_offsets) * self.template["samples"] / self.template["sample_rate"]
+
+def concat_mp3(parts):
+    """Junta vários MP3 (bytes) em um único MP3 com cabeçalho e tabela de busca corretos."""
+    output = io.BytesIO()
+    splicer = Mp3Splicer(output)
+    for part in parts:
+        splicer.start_segment()
+        splicer.feed(part)
+    splicer.finish()
+    return output.getvalue()
@@ -0,0 +1,67 @@
+import logging
+import numpy as np
+from config.settings import OCR_CONFIG
+
+try:
+    import pytesseract
+except ImportError:  # OCR local é opcional
+    pytesseract = None
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+_available = None
+
+def ocr_available():
+    """Indica se o pytesseract e o executável do Tesseract estão instalados."""
+    global _available
+    if _available is None:
+        if pytesseract is None:
+            _available = False
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception as e:
+                logger.warning(f"Tesseract não encontrado: {str(e)}")
+                _available = False
+    return _available
+
+def classify_page(image):
+    """
+    Classifica uma página renderizada como texto ou figura usando OCR local.
+
+    A página é considerada de texto quando há palavras reconhecidas com boa confiança
+    e a maior parte da "tinta" (pixels escuros) está dentro das caixas dessas palavras.
+
+    Returns:
+        dict: {"kind": "text" ou "figure", "text": texto reconhecido, "words": palavras confiáveis,
+               "text_ink_ratio": fração da tinta dentro das palavras}
+    """
+    gray = image.convert("L")
+    data = pytesseract.image_to_data(gray, lang=OCR_CONFIG["language"], output_type=pytesseract.Output.DICT)
+
+    pixels = np.asarray(gray)
+    ink = pixels < 128
+    in_words = np.zeros_like(ink)
+    lines = {}
+    words = 0
+    for i, word in enumerate(data["text"]):
+        if not word.strip() or float(data["conf"][i]) < OCR_CONFIG["min_confidence"]:
+            continue
+        words += 1
+        left, top = data["left"][i], data["top"][i]
+        in_words[top:top + data["height"][i], left:left + data["width"][i]] = True
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(line_key, []).append(word.strip())
+
+    total_ink = int(ink.sum())
+    text_ink_ratio = float((ink & in_words).sum() / total_ink) if total_ink else 0.0
+    is_text = words >= OCR_CONFIG["min_words"] and text_ink_ratio >= OCR_CONFIG["min_text_ink_ratio"]
+
+    return {
+        "kind": "text" if is_text else "figure",
+        "text": "\n".join(" ".join(line) for _, line in sorted(lines.items())),
+        "words": words,
+        "text_ink_ratio": text_ink_ratio
+    }
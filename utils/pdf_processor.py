@@ -2,6 +2,11 @@ import pdfplumber
 from PIL import Image
 import io
 import os
+import logging
+from utils.ocr_router import classify_page, ocr_available
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
 
 def clamp_bbox(bbox, page_width, page_height):
     """Ajusta as coordenadas do bounding box para ficar dentro dos limites da página."""
@@ -12,20 +17,36 @@ def clamp_bbox(bbox, page_width, page_height):
     bottom = max(0, min(bottom, page_height))  # Corrigido 'custom' para 'bottom'
     return (x0, top, x1, bottom)
 
-def extract_from_pdf(file_path):
-    text = ""
-    tables_text = ""
-    images = []
-    
+def iter_pdf_pages(file_path, ocr=False):
+    """Extrai o PDF página a página, devolvendo cada página assim que é processada.
+
+    Cada item é um dicionário com o número da página, o texto (incluindo avisos
+    de erro de imagens), o texto das tabelas e as imagens encontradas. Com `ocr`,
+    páginas sem camada de texto que sejam predominantemente texto são lidas por
+    OCR local em vez de seguirem como imagem para a visão.
+    """
+    if ocr and not ocr_available():
+        # Sem o Tesseract, as páginas digitalizadas seguem como imagem para a visão
+        logger.warning("OCR local solicitado, mas o Tesseract não está disponível; páginas digitalizadas serão enviadas ao modelo de visão.")
+        ocr = False
     with pdfplumber.open(file_path) as pdf:
         for i, page in enumerate(pdf.pages):
+            text = ""
+            tables_text = ""
+            images = []
+            
             page_text = page.extract_text() or ""
             if page_text:
                 text += page_text + "\n"
             else:
                 page_img = page.to_image(resolution=300)
                 page_pil = page_img.original
-                images.append(page_pil)
+                page_kind = classify_page(page_pil) if ocr else None
+                if page_kind and page_kind["kind"] == "text":
+                    logger.info(f"Página {i + 1} lida por OCR local ({page_kind['words']} palavras)")
+                    text += page_kind["text"] + "\n"
+                else:
+                    images.append(page_pil)
             
             tables = page.extract_tables()
             for j, table in enumerate(tables):
@@ -48,6 +69,18 @@ def extract_from_pdf(file_path):
                         images.append(img_pil)
                 except ValueError as e:
                     text += f"Imagem {k + 1} (Página {i + 1}): [Erro ao extrair imagem: {str(e)}]\n"
+            
+            yield {"page_number": i + 1, "text": text, "tables_text": tables_text, "images": images}
+
+def extract_from_pdf(file_path, ocr=False):
+    text = ""
+    tables_text = ""
+    images = []
+    
+    for page in iter_pdf_pages(file_path, ocr=ocr):
+        text += page["text"]
+        tables_text += page["tables_text"]
+        images.extend(page["images"])
     
     return {"text": f"{text}\n\n{tables_text}".strip(), "images": images}
 
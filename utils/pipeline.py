@@ -0,0 +1,249 @@
+import collections
+import logging
+import queue
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import PIPELINE_CONFIG
+from utils.api_handler import process_chunk
+from utils.pdf_processor import iter_pdf_pages
+from utils.mp3_splicer import concat_mp3, Mp3Splicer
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+# Marcadores usados na fila entre a extração e o processamento
+_FILE_END = object()
+_PIPELINE_END = object()
+
+def iter_word_chunks(texts, chunk_size_words=500):
+    """Agrupa as palavras de uma sequência de textos em chunks, liberando cada chunk assim que fica completo."""
+    buffer = []
+    for text in texts:
+        buffer.extend(text.split())
+        while len(buffer) >= chunk_size_words:
+            yield " ".join(buffer[:chunk_size_words])
+            buffer = buffer[chunk_size_words:]
+
+    if buffer:
+        yield " ".join(buffer)
+
+def iter_processed_chunks(model, prompt, chunks, max_workers=None, max_pending=None, progress_callback=None, executor=None, thinking=None):
+    """
+    Processa chunks em paralelo e devolve os resultados na ordem original, conforme ficam prontos.
+
+    Args:
+        model (str): ID do modelo de texto
+        prompt (str): Prompt aplicado a cada chunk
+        chunks (iterable): Chunks de texto; pode ser um gerador lento (ex.: alimentado pela extração)
+        max_workers (int): Requisições simultâneas ao modelo
+        max_pending (int): Máximo de chunks em voo antes de parar de consumir `chunks`
+        progress_callback (function): Callback (current, total, message), sempre chamado na thread do consumidor
+        executor (ThreadPoolExecutor): Pool compartilhado com outros documentos (substitui max_workers)
+        thinking (dict): Pensamento estendido desta requisição (ver vision_cache.thinking_settings)
+
+    Yields:
+        tuple: (índice do chunk começando em 1, texto processado)
+    """
+    max_workers = max_workers or PIPELINE_CONFIG["llm_workers"]
+    max_pending = max_pending or PIPELINE_CONFIG["max_pending_chunks"]
+    pending = collections.deque()
+    submitted = 0
+    completed = 0
+
+    def run_chunk(chunk):
+        try:
+            return process_chunk(model, prompt, chunk, thinking), None
+        except Exception as e:
+            return None, e
+
+    def collect(index, future):
+        nonlocal completed
+        result, error = future.result()
+        completed += 1
+        if error is not None:
+            if progress_callback:
+                progress_callback(completed, submitted, f"Erro no pedaço {index}: {str(error)}")
+            return index, f"[Erro no pedaço {index}: {str(error)}]"
+        if progress_callback:
+            progress_callback(completed, submitted, f"Pedaço {index} de {submitted} processado")
+        return index, result
+
+    with nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk in chunks:
+            submitted += 1
+            pending.append((submitted, executor.submit(run_chunk, chunk)))
+            if progress_callback:
+                progress_callback(completed, submitted, f"Enviando pedaço {submitted} ({len(chunk.split())} palavras)")
+
+            # Entrega os resultados já prontos em ordem; bloqueia se houver chunks demais em voo
+            while pending and (pending[0][1].done() or len(pending) >= max_pending):
+                yield collect(*pending.popleft())
+
+        while pending:
+            yield collect(*pending.popleft())
+
+def run_pdf_pipeline(model, prompt, file_paths, chunk_size_words=500, progress_callback=None, chunk_callback=None, ocr=False, executor=None, thinking=None):
+    """
+    Extrai e processa PDFs simultaneamente.
+
+    Uma thread extrai as páginas para uma fila limitada enquanto os chunks já completos
+    são enviados ao modelo. Quando há chunks demais em voo, a extração pausa (backpressure),
+    de modo que o tempo total fica próximo de max(extração, LLM) em vez da soma.
+
+    Args:
+        model (str): ID do modelo de texto
+        prompt (str): Prompt aplicado a cada chunk
+        file_paths (list): Caminhos dos PDFs, processados na ordem fornecida
+        chunk_size_words (int): Tamanho do chunk em palavras
+        progress_callback (function): Callback (current, total, message)
+        chunk_callback (function): Chamada com (índice, texto processado) para cada chunk, em ordem
+        ocr (bool): Ler por OCR local as páginas digitalizadas com predominância de texto
+        executor (ThreadPoolExecutor): Pool compartilhado para as requisições ao modelo (opcional)
+        thinking (dict): Pensamento estendido desta requisição (ver vision_cache.thinking_settings)
+
+    Returns:
+        dict: {"text": texto processado, "source_text": texto extraído, "images": imagens extraídas}
+    """
+    page_queue = queue.Queue(maxsize=PIPELINE_CONFIG["page_queue_size"])
+    stop_event = threading.Event()
+    errors = []
+    images = []
+    source_texts = []
+
+    def put(item):
+        # Espera por espaço na fila, mas desiste se o consumidor tiver parado
+        while not stop_event.is_set():
+            try:
+                page_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for file_path in file_paths:
+                for page in iter_pdf_pages(file_path, ocr=ocr):
+                    if not put(page):
+                        return
+                if not put(_FILE_END):
+                    return
+        except Exception as e:
+            logger.error(f"Erro na extração do PDF: {str(e)}")
+            errors.append(e)
+        finally:
+            put(_PIPELINE_END)
+
+    def texts():
+        # As tabelas de cada arquivo entram no final do seu texto, como em extract_from_pdf
+        tables_text = ""
+        while True:
+            item = page_queue.get()
+            if item is _PIPELINE_END:
+                break
+            if item is _FILE_END:
+                source_texts.append(tables_text)
+                yield tables_text
+                tables_text = ""
+                continue
+            images.extend(item["images"])
+            tables_text += item["tables_text"]
+            source_texts.append(item["text"])
+            yield item["text"]
+
+    producer = threading.Thread(target=produce, name="pdf-extractor", daemon=True)
+    producer.start()
+
+    processed_chunks = []
+    try:
+        for _, processed_chunk in iter_processed_chunks(
+            model,
+            prompt,
+            iter_word_chunks(texts(), chunk_size_words),
+            progress_callback=progress_callback,
+            executor=executor,
+            thinking=thinking
+        ):
+            processed_chunks.append(processed_chunk)
+            if chunk_callback:
+                chunk_callback(len(processed_chunks), processed_chunk)
+    finally:
+        stop_event.set()
+        producer.join()
+
+    if errors:
+        raise Exception(f"Erro na extração do PDF: {str(errors[0])}")
+
+    return {
+        "text": "\n\n".join(processed_chunks),
+        "source_text": "\n".join(source_texts).strip(),
+        "images": images
+    }
+
+class BackgroundNarrator:
+    """
+    Narra textos em segundo plano, na ordem em que são entregues.
+
+    Cada texto recebido em `submit` vai direto para a etapa de TTS, de modo que a geração
+    de áudio acontece enquanto os próximos chunks ainda estão no LLM. Os callbacks do
+    Streamlit não podem ser chamados fora da thread do script, por isso o progresso é
+    exposto pelos atributos `submitted` e `completed`.
+    """
+
+    def __init__(self, synthesize, max_workers=1):
+        """
+        Args:
+            synthesize (function): Recebe um texto e devolve o áudio em bytes
+            max_workers (int): Sínteses simultâneas
+        """
+        self.synthesize = synthesize
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="narrator")
+        self.futures = []
+        self.completed = 0
+        self.lock = threading.Lock()
+
+    @property
+    def submitted(self):
+        return len(self.futures)
+
+    def submit(self, text):
+        """Agenda a narração de um texto; chunks com erro de processamento são ignorados."""
+        if not text or not text.strip() or text.startswith("[Erro no pedaço"):
+            return
+        self.futures.append(self.executor.submit(self._run, text))
+
+    def _result(self, i):
+        try:
+            return self.futures[i].result()
+        except Exception as e:
+            logger.error(f"Falha ao narrar o trecho {i + 1}: {str(e)}")
+            raise Exception(f"Falha ao narrar o trecho {i + 1}: {str(e)}")
+
+    def _run(self, text):
+        audio_bytes = self.synthesize(text)
+        with self.lock:
+            self.completed += 1
+        return audio_bytes
+
+    def finish(self, output_path=None):
+        """
+        Aguarda todas as narrações e une o MP3 na ordem de entrega.
+
+        Com output_path, cada trecho é gravado no arquivo assim que fica pronto e liberado
+        da memória, e o caminho é devolvido; sem ele, devolve os bytes do MP3.
+        """
+        try:
+            if output_path is None:
+                return concat_mp3([self._result(i) for i in range(len(self.futures))])
+            
+            with open(output_path, "wb") as output:
+                splicer = Mp3Splicer(output)
+                for i in range(len(self.futures)):
+                    splicer.start_segment()
+                    splicer.feed(self._result(i))
+                    self.futures[i] = None
+                splicer.finish()
+            return output_path
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,188 @@
+import bisect
+import hashlib
+import re
+
+# Abreviações comuns em português que terminam em ponto sem encerrar a frase
+ABBREVIATIONS = {
+    "sr", "sra", "srta", "srs", "sras", "dr", "dra", "drs", "dras", "prof", "profa", "profs",
+    "exmo", "exma", "revmo", "revma", "pe", "d", "sto", "sta", "s",
+    "p", "pp", "pág", "págs", "cap", "caps", "vol", "vols", "art", "arts", "fig", "figs",
+    "tab", "n", "nº", "núm", "ed", "eds", "cf", "obs", "ex", "aprox", "séc", "av",
+    "máx", "mín", "min", "seg", "vs", "et", "al", "op", "cit", "ibid",
+    "jan", "fev", "abr", "jun", "jul", "ago", "out", "nov", "dez"
+}
+
+# Final de frase candidato: pontuação terminal, fechamentos opcionais e espaço
+_BOUNDARY = re.compile(r'[.!?…]+["\'”’»)\]]*\s+')
+
+# Aberturas que podem preceder a primeira letra da frase seguinte (aspas, parênteses, travessão de diálogo)
+_OPENING = '"\'“‘«([—–- '
+
+# Pausas naturais para quebrar frases longas demais, da mais forte para a mais fraca
+_PAUSES = [
+    re.compile(r'[;:]\s+'),
+    re.compile(r'\s+[—–]\s+'),
+    re.compile(r',\s+'),
+    re.compile(r'\s+')
+]
+
+def _starts_sentence(text, position):
+    """Indica se o texto a partir de position começa com letra maiúscula (inclusive acentuada, como É ou Ó)."""
+    while position < len(text) and text[position] in _OPENING:
+        position += 1
+    return position < len(text) and (text[position].isupper() or text[position].isdigit())
+
+def _is_abbreviation(text, end):
+    """Indica se o ponto em text[end] encerra uma abreviação ou uma inicial (ex.: "Dr.", "J.")."""
+    if text[end] != ".":
+        return False
+    start = end
+    while start > 0 and not text[start - 1].isspace() and text[start - 1] not in _OPENING:
+        start -= 1
+    word = text[start:end]
+    if not word:
+        return False
+    if len(word) == 1 and word.isalpha():
+        return True
+    return word.lower().rstrip(".") in ABBREVIATIONS
+
+def split_sentences(text):
+    """
+    Divide o texto em frases, reconhecendo maiúsculas acentuadas, diálogos e abreviações do português.
+
+    Returns:
+        list: Frases sem espaços nas pontas
+    """
+    sentences = []
+    start = 0
+    for match in _BOUNDARY.finditer(text):
+        if not _starts_sentence(text, match.end()):
+            continue
+        # Um ponto isolado pode ser de abreviação; reticências e ?/! sempre encerram a frase
+        if text[match.start():match.start() + 2] != ".." and _is_abbreviation(text, match.start()):
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+
+    sentences.append(text[start:].strip())
+    return [s for s in sentences if s]
+
+def split_long_sentence(sentence, limit):
+    """Quebra uma frase maior que o limite nas pausas naturais mais fortes disponíveis."""
+    pieces = []
+    remaining = sentence
+    while len(remaining) > limit:
+        window = remaining[:limit + 1]
+        cut = None
+        for pause in _PAUSES:
+            # Última pausa dentro do limite, evitando pedaços muito curtos
+            positions = [m.end() for m in pause.finditer(window) if m.start() >= limit // 3]
+            if positions:
+                cut = positions[-1]
+                break
+        if cut is None:
+            cut = limit
+        piece = remaining[:cut].strip()
+        pieces.append(piece)
+        remaining = remaining[cut:].strip()
+
+    if remaining:
+        pieces.append(remaining)
+    return pieces
+
+def pack_sentences(sentences, limit):
+    """
+    Agrupa frases consecutivas em chunks de até `limit` caracteres (unidas por espaço).
+
+    O preenchimento guloso em ordem produz o menor número possível de chunks quando as
+    quebras só podem acontecer entre frases; frases maiores que o limite são quebradas em
+    pausas naturais (ponto e vírgula, dois-pontos, travessão, vírgula) antes do empacotamento.
+    """
+    units = []
+    for sentence in sentences:
+        units.extend(split_long_sentence(sentence, limit) if len(sentence) > limit else [sentence])
+
+    chunks = []
+    current_chunk = ""
+    for unit in units:
+        if not current_chunk:
+            current_chunk = unit
+        elif len(current_chunk) + 1 + len(unit) <= limit:
+            current_chunk += " " + unit
+        else:
+            chunks.append(current_chunk)
+            current_chunk = unit
+
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+def split_text_into_chunks(text, limit):
+    """Divide o texto em frases e as empacota em chunks próximos do limite do provedor."""
+    return pack_sentences(split_sentences(text), limit)
+
+def _anchor_rank(unit):
+    # Valor pseudoaleatório derivado só do conteúdo da frase (espaços normalizados)
+    digest = hashlib.sha1(re.sub(r"\s+", " ", unit).strip().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def pack_sentences_stable(sentences, limit, window=None):
+    """
+    Agrupa frases em chunks de até `limit` caracteres com fronteiras estáveis a edições.
+
+    No empacotamento guloso (pack_sentences) cada fronteira depende do tamanho de todo o texto
+    anterior: uma edição no início desloca todas as fronteiras seguintes e nenhum chunk
+    posterior reaproveita o cache de áudio. Aqui o texto é primeiro cortado em "âncoras":
+    frases cujo valor em _anchor_rank é o maior entre as frases a até `window` caracteres
+    de distância, para os dois lados. Isso depende só do texto vizinho, então uma edição
+    move no máximo as âncoras próximas dela. Cada trecho entre âncoras é então empacotado
+    de forma gulosa, quase no limite. Assim uma edição muda só os chunks do trecho onde ela
+    caiu, e o número de chunks fica perto do de pack_sentences (cerca de 85% de preenchimento
+    com a janela padrão).
+
+    Args:
+        sentences (list): Frases, na ordem
+        limit (int): Tamanho máximo de cada chunk
+        window (int): Distância mínima entre âncoras, em caracteres (padrão: duas vezes o limite)
+    """
+    window = window or 2 * limit
+    units = []
+    for sentence in sentences:
+        units.extend(split_long_sentence(sentence, limit) if len(sentence) > limit else [sentence])
+
+    ends = []
+    position = 0
+    for unit in units:
+        position += len(unit) + 1
+        ends.append(position)
+    ranks = [_anchor_rank(unit) for unit in units]
+
+    chunks = []
+    start = 0
+    for i, rank in enumerate(ranks):
+        first = bisect.bisect_left(ends, ends[i] - window)
+        last = bisect.bisect_right(ends, ends[i] + window)
+        if i == len(units) - 1 or all(rank > ranks[j] for j in range(first, last) if j != i):
+            chunks.extend(pack_sentences(units[start:i + 1], limit))
+            start = i + 1
+    return chunks
+
+def split_text_into_stable_chunks(text, limit, window=None):
+    """Divide o texto em frases e as empacota em chunks de fronteiras estáveis (ver pack_sentences_stable)."""
+    return pack_sentences_stable(split_sentences(text), limit, window)
+
+def pop_complete_sentences(text):
+    """
+    Separa, de um texto que ainda está sendo escrito, as frases já encerradas.
+
+    Uma frase só é considerada encerrada quando a seguinte já começou, pois o ponto final
+    sozinho pode ser de uma abreviação.
+
+    Returns:
+        tuple: (frases completas, texto restante ainda em aberto)
+    """
+    sentences = split_sentences(text)
+    if len(sentences) <= 1:
+        return "", text
+    start = text.rfind(sentences[-1])
+    return text[:start].strip(), text[start:]
@@ -1,11 +1,23 @@
 from openai import OpenAI
-from config.settings import OPENAI_API_KEY
+from config.settings import OPENAI_API_KEY, OPENAI_TTS_MAX_CHARS, TTS_CONCURRENCY, TTS_STREAM_CONFIG, AUDIO_CACHE_CONFIG
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from utils.mp3_splicer import Mp3Splicer
+from utils.text_segmenter import split_sentences, pack_sentences, pack_sentences_stable
+from utils.audio_cache import synthesize_cached, audio_cache_key, get_cache as get_audio_cache
+from utils.audio_formats import DEFAULT_AUDIO_FORMAT, provider_format, join_audio, is_mp3, transcode, open_transcoder
 import re
+import tempfile
 import logging
 
 # Configuração de logging
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=4)
+def get_openai_client(api_key=OPENAI_API_KEY):
+    """Cliente da OpenAI reaproveitado entre chunks e gerações (mantém o pool de conexões HTTP)."""
+    return OpenAI(api_key=api_key)
+
 def clean_text(text):
     """Limpa e prepara o texto para processamento."""
     if not text or not isinstance(text, str):
@@ -17,26 +29,26 @@ def clean_text(text):
 
 def split_into_sentences(text):
     """Divide o texto em sentenças de forma inteligente."""
-    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', text)
-    return [s.strip() for s in sentences if s.strip()]
+    return split_sentences(text)
 
-def generate_tts_chunk(text, voice="alloy", model="tts-1"):
-    """Gera áudio para um único chunk de texto."""
+def generate_tts_chunk(text, voice="alloy", model="tts-1", response_format="mp3"):
+    """Gera áudio para um único chunk de texto no formato nativo pedido à API (mp3 ou pcm)."""
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY não configurada em config/settings.py ou .env.")
     
     text = clean_text(text)
-    if len(text) > 4096:
-        raise ValueError(f"Texto excede limite de 4096 caracteres: {len(text)}")
+    if len(text) > OPENAI_TTS_MAX_CHARS:
+        raise ValueError(f"Texto excede limite de {OPENAI_TTS_MAX_CHARS} caracteres: {len(text)}")
     
     logger.info(f"Enviando chunk à API: '{text}' ({len(text)} caracteres)")
     
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = get_openai_client()
     try:
         response = client.audio.speech.create(
             model=model,
             voice=voice,
             input=text,
+            response_format=response_format,
         )
         audio_bytes = response.content
         if not audio_bytes:
@@ -50,65 +62,234 @@ def generate_tts_chunk(text, voice="alloy", model="tts-1"):
         logger.error(f"Erro na API para chunk: {str(e)}")
         raise Exception(f"Erro na API para chunk: {str(e)}")
 
-def generate_tts(text, voice="sky", model="tts-1", max_chunk_size=3000, callback=None):
-    """Gera áudio a partir de texto, processando todos os chunks e concatenando-os."""
+def stream_tts_chunk(text, voice="alloy", model="tts-1", block_size=16384, response_format="mp3"):
+    """Gera áudio para um único chunk de texto, devolvendo os bytes à medida que chegam da API."""
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY não configurada em config/settings.py ou .env.")
+    
+    text = clean_text(text)
+    if len(text) > OPENAI_TTS_MAX_CHARS:
+        raise ValueError(f"Texto excede limite de {OPENAI_TTS_MAX_CHARS} caracteres: {len(text)}")
+    
+    client = get_openai_client()
+    with client.audio.speech.with_streaming_response.create(
+        model=model,
+        voice=voice,
+        input=text,
+        response_format=response_format,
+    ) as response:
+        for data in response.iter_bytes(block_size):
+            yield data
+
+def synthesize_chunk(text, voice="alloy", model="tts-1", response_format="mp3"):
+    """Gera o áudio de um chunk, reaproveitando o cache quando o mesmo texto já foi sintetizado."""
+    return synthesize_cached(
+        "openai", model, voice, None, text,
+        lambda chunk: generate_tts_chunk(chunk, voice, model, response_format),
+        output_format=response_format
+    )
+
+def split_into_chunks(text, max_chunk_size=OPENAI_TTS_MAX_CHARS):
+    """
+    Agrupa as sentenças do texto em chunks de até max_chunk_size caracteres, quebrando em pausas naturais.
+
+    Com o cache de áudio ligado, as fronteiras dependem só do texto próximo (pack_sentences_stable):
+    ao editar um trecho e gerar de novo, os demais chunks continuam idênticos e saem do cache.
+    Sem o cache, o empacotamento guloso gera o menor número de requisições.
+    """
+    packer = pack_sentences_stable if AUDIO_CACHE_CONFIG["enabled"] else pack_sentences
+    return packer(split_into_sentences(text), max_chunk_size)
+
+def generate_tts(text, voice="sky", model="tts-1", max_chunk_size=OPENAI_TTS_MAX_CHARS, callback=None, max_workers=None, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Gera áudio a partir de texto, processando os chunks em paralelo e concatenando-os em ordem.
+    
+    Args:
+        text (str): Texto para converter em áudio
+        voice (str): Voz da OpenAI
+        model (str): Modelo TTS
+        max_chunk_size (int): Tamanho máximo de cada chunk em caracteres
+        callback (function): Callback (current, total, message), chamado sempre na thread chamadora
+        max_workers (int): Chunks sintetizados ao mesmo tempo (padrão definido por modelo em TTS_CONCURRENCY)
+        output_format (str): Formato de saída (chave de AUDIO_FORMATS); formatos sem suporte nativo
+            na API são pedidos em PCM e convertidos com o ffmpeg
+    
+    Returns:
+        bytes: Áudio no formato de saída (MP3 com os chunks unidos quadro a quadro, por padrão)
+    """
     if not text.strip():
         raise ValueError("Texto vazio fornecido para geração de áudio.")
     
+    native_format, needs_transcode = provider_format(output_format, "openai")
+    
     text = clean_text(text)
     logger.info(f"Texto total após limpeza: '{text[:100]}...' ({len(text)} caracteres)")
     
-    sentences = split_into_sentences(text)
-    chunks = []
-    current_chunk = ""
-    
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) + 1 <= max_chunk_size:
-            current_chunk += (" " + sentence if current_chunk else sentence)
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = sentence
-    
-    if current_chunk:
-        chunks.append(current_chunk)
+    chunks = split_into_chunks(text, max_chunk_size)
     
     if not chunks:
         raise ValueError("Nenhum chunk válido gerado a partir do texto.")
     
-    logger.info(f"Texto dividido em {len(chunks)} chunks para processamento")
+    max_workers = max_workers or TTS_CONCURRENCY.get(model, TTS_CONCURRENCY["default"])
+    logger.info(f"Texto dividido em {len(chunks)} chunks para processamento ({max_workers} simultâneos)")
     
-    # Processar todos os chunks e concatenar os resultados
-    all_audio_bytes = bytearray()
+    if callback:
+        callback(0, len(chunks), f"Enviando {len(chunks)} chunks para a API ({max_workers} simultâneos)")
     
-    for i, chunk in enumerate(chunks):
-        message = f"Processando chunk {i+1}/{len(chunks)} ({len(chunk)} caracteres)"
-        logger.info(message)
+    # Os chunks são sintetizados em paralelo; o áudio final é montado na ordem original
+    audio_parts = [None] * len(chunks)
+    completed = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+    try:
+        futures = {executor.submit(synthesize_chunk, chunk, voice, model, native_format): i for i, chunk in enumerate(chunks)}
         
-        # Chamar o callback se fornecido
+        for future in as_completed(futures):
+            i = futures[future]
+            completed += 1
+            try:
+                audio_parts[i], from_cache = future.result()
+                
+                origin = "reaproveitado do cache" if from_cache else "processado"
+                message = f"Chunk {i+1}/{len(chunks)} {origin}: {len(audio_parts[i])} bytes ({completed}/{len(chunks)} concluídos)"
+                logger.info(message)
+                
+                # Atualizar o callback com a mensagem de sucesso
+                if callback:
+                    callback(completed, len(chunks), message)
+                    
+            except Exception as e:
+                error_message = f"Falha ao processar chunk {i+1}/{len(chunks)}: {str(e)}"
+                logger.error(error_message)
+                
+                # Atualizar o callback com a mensagem de erro
+                if callback:
+                    callback(completed, len(chunks), error_message)
+                    
+                raise Exception(error_message)
+    finally:
+        # Em caso de erro, os chunks que ainda não começaram são cancelados
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    # Juntar os quadros MP3 com um único cabeçalho e tabela de busca (ou o PCM, por concatenação)
+    all_audio_bytes = join_audio(audio_parts, native_format)
+    if needs_transcode:
         if callback:
-            callback(i+1, len(chunks), message)
+            callback(len(chunks), len(chunks), f"Convertendo áudio para {output_format}...")
+        all_audio_bytes = transcode(all_audio_bytes, output_format)
+    
+    logger.info(f"Áudio final gerado (todos os chunks): {len(all_audio_bytes)} bytes.")
+    return all_audio_bytes
+
+def _stream_to_spool(text, voice, model, response_format="mp3"):
+    """Baixa o áudio de um chunk para um arquivo temporário que só vai para o disco quando cresce."""
+    spool = tempfile.SpooledTemporaryFile(max_size=TTS_STREAM_CONFIG["spool_max_memory"])
+    use_cache = AUDIO_CACHE_CONFIG["enabled"]
+    if use_cache:
+        key = audio_cache_key("openai", model, voice, None, text, response_format)
+        cached = get_audio_cache().get(key)
+        if cached is not None:
+            spool.write(cached)
+            spool.seek(0)
+            return spool
+    
+    for data in stream_tts_chunk(text, voice, model, response_format=response_format):
+        spool.write(data)
+    if spool.tell() == 0:
+        spool.close()
+        raise ValueError("Resposta da API vazia.")
+    spool.seek(0)
+    
+    if use_cache:
+        get_audio_cache().set(key, spool.read())
+        spool.seek(0)
+    return spool
+
+def generate_tts_stream(text, output_path, voice="alloy", model="tts-1", max_chunk_size=OPENAI_TTS_MAX_CHARS, callback=None, on_audio=None, max_workers=None, output_format=DEFAULT_AUDIO_FORMAT):
+    """
+    Gera áudio gravando-o progressivamente em disco, de modo que o início já pode ser ouvido.
+    
+    Cada chunk é recebido pela resposta em streaming da API em um arquivo temporário próprio
+    (em memória até um limite, depois em disco). Os chunks seguintes são sintetizados em
+    paralelo, mas só entram no arquivo final na ordem do texto, assim que o anterior estiver
+    completo. O tempo até o primeiro áudio é o de um chunk, e a memória não cresce com a duração.
+    Formatos convertidos localmente passam por um único processo do ffmpeg, alimentado com o
+    PCM de cada chunk à medida que fica pronto.
+    
+    Args:
+        text (str): Texto para converter em áudio
+        output_path (str): Arquivo de saída (sobrescrito)
+        voice (str): Voz da OpenAI
+        model (str): Modelo TTS
+        max_chunk_size (int): Tamanho máximo de cada chunk em caracteres
+        callback (function): Callback (current, total, message)
+        on_audio (function): Chamada com (output_path, chunks prontos, total) sempre que o arquivo cresce
+        max_workers (int): Chunks sintetizados ao mesmo tempo
+        output_format (str): Formato de saída (chave de AUDIO_FORMATS)
+    
+    Returns:
+        str: Caminho do arquivo gerado
+    """
+    if not text.strip():
+        raise ValueError("Texto vazio fornecido para geração de áudio.")
+    
+    native_format, needs_transcode = provider_format(output_format, "openai")
+    
+    text = clean_text(text)
+    chunks = split_into_chunks(text, max_chunk_size)
+    
+    if not chunks:
+        raise ValueError("Nenhum chunk válido gerado a partir do texto.")
+    
+    max_workers = max_workers or TTS_CONCURRENCY.get(model, TTS_CONCURRENCY["default"])
+    logger.info(f"Streaming de {len(chunks)} chunks para {output_path} ({max_workers} simultâneos)")
+    
+    if callback:
+        callback(0, len(chunks), f"Enviando {len(chunks)} chunks para a API ({max_workers} simultâneos)")
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-stream")
+    try:
+        futures = [executor.submit(_stream_to_spool, chunk, voice, model, native_format) for chunk in chunks]
         
-        try:
-            audio_bytes = generate_tts_chunk(chunk, voice, model)
-            all_audio_bytes.extend(audio_bytes)
-            
-            message = f"Chunk {i+1}/{len(chunks)} processado: {len(audio_bytes)} bytes"
-            logger.info(message)
-            
-            # Atualizar o callback com a mensagem de sucesso
-            if callback:
-                callback(i+1, len(chunks), message)
+        with open(output_path, "wb") as output:
+            splicer = Mp3Splicer(output) if is_mp3(native_format) else None
+            transcoder = open_transcoder(output_format, output) if needs_transcode else None
+            for i, future in enumerate(futures):
+                try:
+                    spool = future.result()
+                except Exception as e:
+                    error_message = f"Falha ao processar chunk {i+1}/{len(chunks)}: {str(e)}"
+                    logger.error(error_message)
+                    if callback:
+                        callback(i + 1, len(chunks), error_message)
+                    if transcoder:
+                        transcoder.close()
+                    raise Exception(error_message)
                 
-        except Exception as e:
-            error_message = f"Falha ao processar chunk {i+1}/{len(chunks)}: {str(e)}"
-            logger.error(error_message)
-            
-            # Atualizar o callback com a mensagem de erro
-            if callback:
-                callback(i+1, len(chunks), error_message)
+                if splicer:
+                    splicer.start_segment()
+                with spool:
+                    for data in iter(lambda: spool.read(65536), b""):
+                        if splicer:
+                            splicer.feed(data)
+                        elif transcoder:
+                            transcoder.write(data)
+                        else:
+                            output.write(data)
+                if i + 1 == len(chunks):
+                    # Cabeçalho com a duração total (ou fim da conversão) antes da última atualização do player
+                    if splicer:
+                        splicer.finish()
+                    if transcoder:
+                        transcoder.close()
+                output.flush()
                 
-            raise Exception(error_message)
+                message = f"Chunk {i+1}/{len(chunks)} disponível para reprodução"
+                logger.info(message)
+                if callback:
+                    callback(i + 1, len(chunks), message)
+                if on_audio:
+                    on_audio(output_path, i + 1, len(chunks))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
     
-    logger.info(f"Áudio final gerado (todos os chunks): {len(all_audio_bytes)} bytes.")
-    return bytes(all_audio_bytes)
\ No newline at end of file
+    return output_path
\ No newline at end of file
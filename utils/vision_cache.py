@@ -0,0 +1,83 @@
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import VISION_CACHE_CONFIG, VISION_ENCODING_CONFIG, CLAUDE_37_SONNET_CONFIG
+from utils.disk_cache import DiskCache, make_key
+from utils.image_encoder import preprocess_image
+
+# Configuração de logging
+logger = logging.getLogger(__name__)
+
+_cache = None
+
+def get_cache():
+    """Retorna o cache de visão compartilhado pelo processo."""
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(VISION_CACHE_CONFIG["directory"], VISION_CACHE_CONFIG["max_bytes"])
+    return _cache
+
+def image_hash(image):
+    """Hash do conteúdo da imagem (pixels, modo e dimensões)."""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def thinking_settings(model, thinking=None):
+    """
+    Configuração de pensamento estendido que influencia a resposta do modelo.
+
+    Args:
+        model (str): ID do modelo
+        thinking (dict): "extended_thinking" e "thinking_tokens_limit" escolhidos para a requisição;
+            sem ele, valem os padrões de CLAUDE_37_SONNET_CONFIG
+    """
+    thinking = dict(CLAUDE_37_SONNET_CONFIG, **(thinking or {}))
+    if model == CLAUDE_37_SONNET_CONFIG["model_id"] and thinking["extended_thinking"]:
+        return {"extended_thinking": True, "thinking_tokens_limit": thinking["thinking_tokens_limit"]}
+    return {"extended_thinking": False}
+
+def _encode_cached(image):
+    start = time.perf_counter()
+    h = image_hash(image)
+    hash_ms = (time.perf_counter() - start) * 1000
+
+    key = make_key("payload", h, VISION_ENCODING_CONFIG)
+    encoded = get_cache().get_json(key)
+    if encoded is not None:
+        return h, encoded, {"cached": True, "hash_ms": hash_ms}
+
+    encoded, timings = preprocess_image(image)
+    timings["hash_ms"] = hash_ms
+    get_cache().set_json(key, encoded)
+    return h, encoded, timings
+
+def encode_images_cached(images, max_workers=None):
+    """
+    Prepara as imagens em paralelo reaproveitando payloads já codificados.
+
+    Returns:
+        tuple: (hashes das imagens, imagens codificadas, tempos por imagem)
+    """
+    max_workers = max_workers or VISION_ENCODING_CONFIG["workers"]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-prep") as executor:
+        results = list(executor.map(_encode_cached, images))
+    return (
+        [h for h, _, _ in results],
+        [encoded for _, encoded, _ in results],
+        [timings for _, _, timings in results]
+    )
+
+def _analysis_key(hashes, prompt, model, thinking=None):
+    return make_key("analysis", list(hashes), prompt, model, thinking_settings(model, thinking))
+
+def get_analysis(hashes, prompt, model, thinking=None):
+    """Retorna a análise armazenada para o conjunto de imagens, ou None."""
+    entry = get_cache().get_json(_analysis_key(hashes, prompt, model, thinking))
+    return entry["result"] if entry else None
+
+def set_analysis(hashes, prompt, model, result, thinking=None):
+    """Armazena a análise de um conjunto de imagens (um lote ou uma única imagem)."""
+    get_cache().set_json(_analysis_key(hashes, prompt, model, thinking), {"result": result})